@@ -0,0 +1 @@
+from .playcounts import PlaycountMatrix, WindowMetrics, load_matrix
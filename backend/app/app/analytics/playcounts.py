@@ -0,0 +1,230 @@
+"""
+Vectorized playcount analytics.
+
+Recent playcounts are loaded once into a dense tracks x days matrix (int64, with
+a mask of the days each track has a playcount) and the growth metrics of any
+number of windows are computed from it with array operations, instead of with
+first_value/last_value window functions over track_playcount in every query.
+"""
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+import datetime
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app import crud
+
+
+class WindowMetrics(NamedTuple):
+    """
+    Growth of every track of a PlaycountMatrix over a lag_days window (the last
+    lag_days + 1 days of the matrix). Arrays are aligned with the matrix rows;
+    rows without two playcounts in the window have has_data False and hold
+    zeros/nan.
+    """
+
+    lag_days: int
+    has_data: np.ndarray  # bool
+    playcount: np.ndarray  # int64, latest playcount in the window
+    start_playcount: np.ndarray  # int64, first playcount in the window
+    chg: np.ndarray  # int64, playcount - start_playcount
+    days: np.ndarray  # int64, days between the two
+    growth_rate: np.ndarray  # float64, playcount / start_playcount - 1
+    avg_chg: np.ndarray  # float64, plays gained per day
+    acceleration: np.ndarray  # float64, plays/day of the 2nd half - of the 1st
+
+
+class PlaycountMatrix:
+    def __init__(
+        self,
+        track_ids: Sequence[str],
+        end: datetime.date,
+        values: np.ndarray,
+        mask: np.ndarray,
+    ):
+        """
+        Args:
+            track_ids: the track of each row.
+            end: the date of the last column, column j holds the playcounts of
+                end - (days - 1 - j).
+            values: (tracks x days) int64 playcounts, 0 where missing.
+            mask: (tracks x days) bool, True where a playcount exists.
+        """
+        if values.shape != mask.shape or values.shape[0] != len(track_ids):
+            raise ValueError("track_ids, values and mask don't line up!")
+        self.track_ids = list(track_ids)
+        self.end = end
+        self.values = values
+        self.mask = mask
+        self._filled: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @property
+    def days(self) -> int:
+        return self.values.shape[1]
+
+    @property
+    def start(self) -> datetime.date:
+        return self.end - datetime.timedelta(days=self.days - 1)
+
+    @classmethod
+    def from_rows(
+        cls,
+        track_ids: Sequence[str],
+        offsets: Sequence[int],
+        playcounts: Sequence[int],
+        *,
+        end: datetime.date,
+        days: int,
+    ) -> "PlaycountMatrix":
+        """
+        Build the matrix from parallel sequences of track id, day offset (from the
+        first day, end - (days - 1)) and playcount. Offsets outside [0, days) are
+        dropped and a repeated (track, day) keeps its last playcount.
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        playcounts = np.asarray(playcounts, dtype=np.int64)
+        ids, rows = np.unique(np.asarray(track_ids, dtype=object), return_inverse=True)
+        keep = (offsets >= 0) & (offsets < days)
+        values = np.zeros((len(ids), days), dtype=np.int64)
+        mask = np.zeros((len(ids), days), dtype=bool)
+        values[rows[keep], offsets[keep]] = playcounts[keep]
+        mask[rows[keep], offsets[keep]] = True
+        return cls(ids.tolist(), end, values, mask)
+
+    def filled(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The playcounts with missing days carried forward from the previous
+        playcount, and a mask of the days that have one (ie, from each track's
+        first playcount on).
+        """
+        if self._filled is None:
+            index = np.where(self.mask, np.arange(self.days), -1)
+            np.maximum.accumulate(index, axis=1, out=index)
+            seen = index >= 0
+            values = np.take_along_axis(self.values, np.maximum(index, 0), axis=1)
+            self._filled = (np.where(seen, values, 0), seen)
+        return self._filled
+
+    def deltas(self, lag_days: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rolling lag_days deltas: column j holds the plays gained between day j
+        and day j + lag_days (of the carried forward playcounts), with a mask of
+        the deltas where both days have a playcount.
+        """
+        if not 0 < lag_days < self.days:
+            raise ValueError(f"lag_days must be in [1, {self.days}), got {lag_days}")
+        values, seen = self.filled()
+        return (
+            values[:, lag_days:] - values[:, :-lag_days],
+            seen[:, lag_days:] & seen[:, :-lag_days],
+        )
+
+    def window(self, lag_days: int) -> WindowMetrics:
+        """
+        Growth over the last lag_days + 1 days, from each track's first to its
+        latest playcount in that window.
+        """
+        if not 0 < lag_days < self.days:
+            raise ValueError(f"lag_days must be in [1, {self.days}), got {lag_days}")
+        offset = self.days - lag_days - 1
+        mask = self.mask[:, offset:]
+        values = self.values[:, offset:]
+        rows = np.arange(mask.shape[0])
+
+        first = mask.argmax(axis=1)
+        last = mask.shape[1] - 1 - mask[:, ::-1].argmax(axis=1)
+        has_data = mask.any(axis=1) & (last > first)
+        start_playcount = np.where(has_data, values[rows, first], 0)
+        playcount = np.where(has_data, values[rows, last], 0)
+        chg = playcount - start_playcount
+        days = np.where(has_data, last - first, 0)
+
+        # Plays/day over each half of the span between the two playcounts, the
+        # midpoint taking the last playcount at or before it.
+        middle = first + days // 2
+        filled, _ = self.filled()
+        mid_playcount = filled[rows, offset + middle]
+        halves = has_data & (middle > first)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            growth_rate = np.where(
+                has_data & (start_playcount > 0),
+                playcount / start_playcount - 1,
+                np.nan,
+            )
+            avg_chg = np.where(has_data, chg / days, np.nan)
+            acceleration = np.where(
+                halves,
+                (playcount - mid_playcount) / (last - middle)
+                - (mid_playcount - start_playcount) / (middle - first),
+                np.nan,
+            )
+        return WindowMetrics(
+            lag_days=lag_days,
+            has_data=has_data,
+            playcount=playcount,
+            start_playcount=start_playcount,
+            chg=chg,
+            days=days,
+            growth_rate=growth_rate,
+            avg_chg=avg_chg,
+            acceleration=acceleration,
+        )
+
+    def windows(self, lag_days: Iterable[int]) -> Dict[int, WindowMetrics]:
+        """
+        The metrics of several windows, all computed from this one matrix.
+        """
+        return {lag: self.window(lag) for lag in lag_days}
+
+    def records(self, metrics: WindowMetrics) -> List[Dict[str, Any]]:
+        """
+        The rows of a window with data as dicts, eg, for crud.track_metric.
+        """
+        index = np.flatnonzero(metrics.has_data)
+        columns = dict(
+            playcount=metrics.playcount[index].tolist(),
+            start_playcount=metrics.start_playcount[index].tolist(),
+            chg=metrics.chg[index].tolist(),
+            days=metrics.days[index].tolist(),
+            growth_rate=_nan_to_none(metrics.growth_rate[index]),
+            avg_chg=metrics.avg_chg[index].tolist(),
+            acceleration=_nan_to_none(metrics.acceleration[index]),
+        )
+        return [
+            dict(
+                track_id=self.track_ids[i],
+                lag_days=metrics.lag_days,
+                date=self.end,
+                **{name: values[n] for name, values in columns.items()},
+            )
+            for n, i in enumerate(index.tolist())
+        ]
+
+
+def _nan_to_none(values: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(v) else v for v in values.tolist()]
+
+
+def load_matrix(
+    db: Session,
+    days: int,
+    *,
+    end: Optional[datetime.date] = None,
+    shard: int = 0,
+    shards: int = 1,
+) -> PlaycountMatrix:
+    """
+    Load the playcounts of the `days` days up to `end` (default: today) into a
+    PlaycountMatrix. shard/shards load a hash partition of the tracks (see
+    CRUDBase.seek), to bound the matrix size.
+    """
+    end = end or datetime.date.today()
+    since = end - datetime.timedelta(days=days - 1)
+    track_ids, offsets, playcounts = [], [], []
+    for row in crud.track_playcount.get_window(
+        db, since=since, end=end, shard=shard, shards=shards, stream=True
+    ):
+        track_ids.append(row.track_id)
+        offsets.append(row.day)
+        playcounts.append(row.playcount)
+    return PlaycountMatrix.from_rows(track_ids, offsets, playcounts, end=end, days=days)
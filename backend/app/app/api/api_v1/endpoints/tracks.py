@@ -1,13 +1,13 @@
 from typing import Any, List
-import datetime
 
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Response
 from fastapi.encoders import jsonable_encoder
 from pydantic.networks import EmailStr
 from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
 from app.api import deps
+from app.core.cache import rising_tracks_cache
 from app.core.config import settings
 from app.utils import send_new_account_email
 
@@ -49,58 +49,39 @@ def read_rising_tracks(
 ) -> Any:
     """
     Retrieve rising tracks.
+
+    Responses are cached per filter set until the next materialized view refresh
+    or playcount ingestion (see core/cache.py).
     """
     # TODO: Make order_by an enum or set.
+    filters = schemas.TrackRisingFilter(
+        lag_days=lag_days,
+        order_by=order_by,
+        min_growth_rate=min_growth_rate,
+        max_growth_rate=max_growth_rate,
+        min_playcount=min_playcount,
+        max_playcount=max_playcount,
+        min_chg=min_chg,
+        max_chg=max_chg,
+        min_probability=min_probability,
+        max_probability=max_probability,
+        min_musicai_score=min_musicai_score,
+        max_musicai_score=max_musicai_score,
+        skip=skip,
+        limit=limit,
+    ).dict()
 
-    tracks_rising_base = {
-        t.id: t
-        for t in crud.track.get_rising_tracks(
-            db,
-            lag_days=lag_days,
-            order_by=order_by,
-            min_growth_rate=min_growth_rate,
-            max_growth_rate=max_growth_rate,
-            min_playcount=min_playcount,
-            max_playcount=max_playcount,
-            min_chg=min_chg,
-            max_chg=max_chg,
-            min_probability=min_probability,
-            max_probability=max_probability,
-            min_musicai_score=min_musicai_score,
-            max_musicai_score=max_musicai_score,
-            skip=skip,
-            limit=limit,
-        )
-    }
-
-    tracks = {
-        t.id: t
-        for t in crud.track.get_tracks(db, track_ids=list(tracks_rising_base.keys()))
-    }
-
-    if len(tracks) != len(tracks_rising_base):
-        raise HTTPException(
-            status_code=400,
-            detail="Track rising base and tracks must be the same length!",
+    generation = rising_tracks_cache.generation()
+    content = rising_tracks_cache.get(filters, generation)
+    if content is None:
+        try:
+            tracks_rising = crud.track.get_rising_tracks_response(db, **filters)
+        except ValueError as err:
+            raise HTTPException(status_code=400, detail=str(err))
+        content = rising_tracks_cache.set(
+            filters, jsonable_encoder(tracks_rising), generation
         )
-
-    tracks_rising = []
-    for tid in tracks_rising_base.keys():
-        rising_base = tracks_rising_base[tid]
-        track = tracks[tid]
-        days_since_release = (datetime.date.today() - track.album.release_date).days
-        track_rising = schemas.TrackRising(
-            **rising_base.dict(),
-            track=track,
-            artists=track.artists,
-            album=track.album,
-            days_since_release=days_since_release
-        )
-        tracks_rising.append(track_rising)
-
-    # tracks_rising = sorted(tracks_rising, key=lambda t: t.growth_rate, reverse=True)
-
-    return tracks_rising
+    return Response(content=content, media_type="application/json")
 
 
 @router.get("/me", response_model=schemas.User)
@@ -17,10 +17,15 @@ from app import crud, models, schemas
 from app.api import deps
 from app.core.config import settings
 from app.utils import send_new_account_email
-from app import spotify
+from app.core.celery_app import celery_app
+from app.spotify.spotify_mux import spotify_mux
+from app.spotify.track_embedding.index import hit_index
 
 router = APIRouter()
 
+# Enqueued by name so the api doesn't import the task modules.
+USER_CANIDATE_TRACKS_TASK = "app.spotify.spotify_user.tasks.flow_user_canidate_tracks"
+
 
 @router.get("/", response_model=List[schemas.User])
 def read_users(
@@ -179,7 +184,6 @@ def create_user_playlist(
     """
     lag_period = 30
     days_since_release = 180
-    canidate_hit_limit = 3_000
     conn_timeout, read_timeout = 3, 10
     if not current_user.spotify_id:
         raise HTTPException(
@@ -187,13 +191,14 @@ def create_user_playlist(
         )
     # 1. Push user tracks to track_user table
     # 2. Collect spectrograms for user tracks
-    # 3. Calculate track distances between user track hit track pairs
-    # 4. Get canidate hit tracks (hit tracks with the smallest distance aren't in the user's library)
+    # 3. Embed user tracks
+    # 4. Get canidate hit tracks (hit tracks closest to the user's tracks that aren't
+    #    in their library)
 
     # Get recommended track ids
     rec_track_ids = [
         f'spotify:track:{rec["id"]}'
-        for rec in crud.user.get_track_recs_for_user(
+        for rec in hit_index.get_track_recs_for_user(
             db,
             spotify_id=current_user.spotify_id,
             lag_period=lag_period,
@@ -259,7 +264,7 @@ def create_user_playlist(
         )
         # TODO: add rec tracks to track_playlist association table.
         musicai_playlist = crud.musicai_playlist.update(db, db_obj=musicai_playlist)
-        playlist_tracks = spotify.spotify_mux.spotify_mux.playlist_tracks(
+        playlist_tracks = spotify_mux.playlist_tracks(
             musicai_playlist.playlist_id, token=spotify_token
         )
 
@@ -269,16 +274,15 @@ def create_user_playlist(
             playlist_id=musicai_playlist.playlist_id,
             playlist_url=musicai_playlist.playlist_url,
         )
-        spotify.spotify_user.update_user_canidate_tracks(
-            spotify_id=current_user.spotify_id,
-            tracks=top_tracks,
-            top_track=True,
-            source="top-tracks",
-            lag_period=lag_period,
-            days_since_release=days_since_release,
-            canidate_hit_limit=canidate_hit_limit,
-            skip=0,
-            wait_until_complete=False,
+        celery_app.send_task(
+            USER_CANIDATE_TRACKS_TASK,
+            kwargs=dict(
+                spotify_id=current_user.spotify_id,
+                tracks=top_tracks,
+                top_track=True,
+                source="top-tracks",
+            ),
+            ignore_result=True,
         )
         return user_playlist
 
@@ -286,24 +290,27 @@ def create_user_playlist(
     # WARNING: this process can take up to 10 minutes to return a playlist to the user.
     # 1. Push user tracks to track_user table
     # 2. Collect spectrograms for user tracks
-    # 3. Calculate track distances between user track hit track pairs
-    # 4. Get canidate hit tracks (hit tracks with the smallest distance that aren't in the user's library)
-    pushed_user_tracks = spotify.spotify_user.update_user_canidate_tracks(
-        current_user.spotify_id,
-        tracks=top_tracks,
-        top_track=True,
-        source="top-tracks",
-        wait_until_complete=True,
-    )
+    # 3. Embed user tracks
+    # 4. Get canidate hit tracks (hit tracks closest to the user's tracks that aren't
+    #    in their library)
+    pushed_user_tracks = celery_app.send_task(
+        USER_CANIDATE_TRACKS_TASK,
+        kwargs=dict(
+            spotify_id=current_user.spotify_id,
+            tracks=top_tracks,
+            top_track=True,
+            source="top-tracks",
+        ),
+    ).get()
     print("~" * 100)
-    print(f"PUSHED USER TRACKS: {len(pushed_user_tracks)}")
+    print(f"PUSHED USER TRACK EMBEDDINGS: {pushed_user_tracks}")
     print("~" * 100)
     print("\n")
 
     # Get recommended track ids
     rec_track_ids = [
         f'spotify:track:{rec["id"]}'
-        for rec in crud.user.get_track_recs_for_user(
+        for rec in hit_index.get_track_recs_for_user(
             db,
             spotify_id=current_user.spotify_id,
             lag_period=lag_period,
@@ -332,7 +339,7 @@ def create_user_playlist(
         timeout=(conn_timeout, read_timeout),
     )
     musicai_playlist = crud.musicai_playlist.update(db, db_obj=musicai_playlist)
-    playlist_tracks = spotify.spotify_mux.spotify_mux.playlist_tracks(
+    playlist_tracks = spotify_mux.playlist_tracks(
         musicai_playlist.playlist_id, token=spotify_token
     )
     user_playlist = schemas.UserPlaylist(
@@ -0,0 +1,117 @@
+"""
+Redis cache of pre-serialized api responses.
+
+Responses are stored as JSON, keyed by a namespace, the normalized request
+parameters and the namespace's generation. Bumping the generation (eg, once the
+data behind the responses is refreshed) invalidates every cached response at
+once; entries of older generations are never read again and expire on their
+own after `ttl` seconds. `claim_warm` debounces re-warming a cache whose data
+changes in bursts.
+
+Redis errors are logged and treated as a cache miss, so the api keeps serving
+(uncached) while Redis is unavailable.
+"""
+from typing import Any, Dict, Optional
+import hashlib
+import json
+
+from celery.utils.log import get_task_logger
+from redis import RedisError
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+
+
+logger = get_task_logger(__name__)
+
+
+class ResponseCache:
+    def __init__(self, namespace: str, ttl: int):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.generation_key = f"ResponseCache::{namespace}::generation"
+        self.warm_key = f"ResponseCache::{namespace}::warm"
+
+    @property
+    def redis(self):
+        return celery_app.backend.client
+
+    @staticmethod
+    def normalize(params: Dict[str, Any]) -> str:
+        """
+        A canonical string of the request parameters: keys sorted, and whole
+        floats written as ints (so 1e10 and 10000000000 share an entry).
+        """
+        params = {
+            name: int(value)
+            if isinstance(value, float) and value.is_integer()
+            else value
+            for name, value in params.items()
+        }
+        return json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+
+    def key(self, params: Dict[str, Any], generation: int) -> str:
+        digest = hashlib.sha1(self.normalize(params).encode("utf-8")).hexdigest()
+        return f"ResponseCache::{self.namespace}::{generation}::{digest}"
+
+    def generation(self) -> Optional[int]:
+        """
+        The current generation, or None if Redis is unavailable. Read it before
+        building a response and cache the response under it, so a response built
+        from data older than a concurrent bump is never cached as current.
+        """
+        try:
+            value = self.redis.get(self.generation_key)
+        except RedisError as err:
+            logger.warning(f"ERROR Reading {self.namespace} cache generation \n {err}")
+            return None
+        return int(value) if value else 0
+
+    def bump(self) -> int:
+        """
+        Invalidate the cached responses, returning the new generation.
+        """
+        return self.redis.incr(self.generation_key)
+
+    def claim_warm(self, delay: int) -> bool:
+        """
+        Whether the caller should schedule warming the cache `delay` seconds from
+        now: True for the first caller until then, so a burst of updates shares
+        one warm, and False while Redis is unavailable.
+        """
+        try:
+            return bool(self.redis.set(self.warm_key, 1, nx=True, ex=delay))
+        except RedisError as err:
+            logger.warning(f"ERROR Claiming {self.namespace} cache warm \n {err}")
+            return False
+
+    def get(self, params: Dict[str, Any], generation: Optional[int]) -> Optional[str]:
+        """
+        The cached JSON response for `params`, or None.
+        """
+        if generation is None:
+            return None
+        try:
+            payload = self.redis.get(self.key(params, generation))
+        except RedisError as err:
+            logger.warning(f"ERROR Reading {self.namespace} cache \n {err}")
+            return None
+        return payload.decode("utf-8") if payload is not None else None
+
+    def set(
+        self, params: Dict[str, Any], payload: Any, generation: Optional[int]
+    ) -> str:
+        """
+        Cache `payload` (jsonable) for `params` and return it serialized.
+        """
+        content = json.dumps(payload, separators=(",", ":"))
+        if generation is None:
+            return content
+        try:
+            self.redis.set(self.key(params, generation), content, ex=self.ttl)
+        except RedisError as err:
+            logger.warning(f"ERROR Writing {self.namespace} cache \n {err}")
+        return content
+
+
+rising_tracks_cache = ResponseCache("RisingTracks", settings.RISING_TRACKS_CACHE_TTL)
@@ -4,13 +4,14 @@ import pytz
 import datetime
 
 from .config import settings
+from app.spotify import TASK_MODULES
 
 
 celery_app = Celery(
     "worker",
     broker=settings.BROKER_URL,
     backend=settings.CELERY_RESULT_BACKEND,
-    include=["app.spotify"],
+    include=TASK_MODULES,
 )
 
 # celery_app.conf.task_routes = {"app.worker.test_celery": "main-queue"}
@@ -36,7 +37,7 @@ celery_app.broker_pool_limit = settings.BROKER_POOL_LIMIT
 celery_app.conf.timezone = "America/Los_Angeles"
 
 # Specify which modules to import tasks from.
-# celery_app.conf.include = ["app.spotify"]
+# celery_app.conf.include = TASK_MODULES
 
 
 def now_pst():
@@ -49,25 +50,34 @@ celery_app.conf.beat_schedule = {
         "task": "app.spotify.flow.flow_refresh_materialized_views",
         "schedule": crontab(minute=0, hour="0,8,12,16", nowfun=now_pst),
     },
+    "maintain-track-playcount-partitions-daily": {
+        "task": "app.spotify.track_playcount.tasks.maintain_track_playcount",
+        "schedule": crontab(minute=30, hour=3, nowfun=now_pst),
+    },
+    "compute-track-metrics-after-the-playcount-scrapes": {
+        "task": "app.spotify.track_playcount.tasks.compute_track_metrics",
+        "schedule": crontab(minute=30, hour="2,8", nowfun=now_pst),
+    },
     "update-artists-at-four-past-the-hour-twice-daily": {
         "task": "app.spotify.flow.flow_update_artists",
         "schedule": crontab(minute=4, hour="0,5", nowfun=now_pst),
-        "kwargs": dict(skip=0, limit=10_000),
+        "kwargs": dict(limit=10_000),
     },
-    "update-artists-with-offset-on-the-hour-twice-daily": {
+    # Keyset paginated flows continue after the previous run (see spotify/cursor.py)
+    "update-artists-continued-on-the-hour-twice-daily": {
         "task": "app.spotify.flow.flow_update_artists",
         "schedule": crontab(minute=0, hour="2,6", nowfun=now_pst),
-        "kwargs": dict(skip=10_000, limit=5_000),
+        "kwargs": dict(limit=5_000),
     },
     "update-tracks-at-twenty-before-the-hour-twice-daily": {
         "task": "app.spotify.flow.flow_update_tracks",
         "schedule": crontab(minute=40, hour="0,5", nowfun=now_pst),
-        "kwargs": dict(skip=0, limit=50_000),
+        "kwargs": dict(limit=50_000),
     },
-    "update-tracks-with-offset-at-twenty-before-the-hour-twice-daily": {
+    "update-tracks-continued-at-twenty-before-the-hour-twice-daily": {
         "task": "app.spotify.flow.flow_update_tracks",
         "schedule": crontab(minute=40, hour="2,6", nowfun=now_pst),
-        "kwargs": dict(skip=50_000, limit=50_000),
+        "kwargs": dict(limit=50_000),
     },
     "scrape-playlist-tracks-at-one-in-the-morning-every-tuesday": {
         "task": "app.spotify.flow.flow_scrape_playlists_tracks",
@@ -77,7 +87,7 @@ celery_app.conf.beat_schedule = {
     "scrape-album_playcounts-at-ten-past-the-hour-three-times-daily": {
         "task": "app.spotify.flow.flow_scrape_album_playcounts",
         "schedule": crontab(minute=10, hour="0,7,23", nowfun=now_pst),
-        "kwargs": dict(verified_artists=True, skip=0, limit=100_000),
+        "kwargs": dict(verified_artists=True, limit=100_000),
     },
     # TODO: schedule for non-rising tracks and longer lag days
     "scrape-spectrograms-every-third-hour-at-twenty-till-the-hour-daily": {
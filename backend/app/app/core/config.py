@@ -105,6 +105,11 @@ class Settings(BaseSettings):
     HOP_SIZE: Optional[int] = 256
     WINDOW_SIZE: Optional[int] = 512
     N_MELS: Optional[int] = 96
+    # Storage format of new spectrogram blobs (see parser/spectrogram_codec.py).
+    SPECTROGRAM_DTYPE: str = "float16"
+    SPECTROGRAM_COMPRESSION: str = "zstd"
+    SPECTROGRAM_COMPRESSION_LEVEL: int = 3
+    SPECTROGRAM_DOWNLOAD_WORKERS: int = 16
 
     AUDIO_DIR: Path = Path("/app/app/audio")
     MP3_DIR: Path = AUDIO_DIR / "mp3"
@@ -115,9 +120,88 @@ class Settings(BaseSettings):
 
     MODEL_ID: str
     MODEL_WEIGHTS: str
+    # Weights for other model ids are read from <MODEL_WEIGHTS_DIR>/<model_id>.pt
+    # (defaults to the directory of MODEL_WEIGHTS).
+    MODEL_WEIGHTS_DIR: Optional[str] = None
+    MODEL_CACHE_SIZE: int = 2
+    # Model ids a worker loads before forking its pool (shared copy-on-write).
+    MODEL_PRELOAD: List[str] = []
     MAX_BATCH_SIZE: Optional[int] = 2
     DISTANCE_TYPE: Optional[str] = "euclidean"
 
+    INFERENCE_BATCH_SIZE: int = 32
+    INFERENCE_MAX_BATCH_SIZE: int = 256
+    INFERENCE_TARGET_BATCH_SECONDS: float = 2.0
+    INFERENCE_PAGE_SIZE: int = 500
+    INFERENCE_TASK_SIZE: int = 5_000
+    INFERENCE_NUM_THREADS: Optional[int] = None
+    # "torchscript" (batch norm folded, traced, see ml/runtime.py) or "eager".
+    INFERENCE_RUNTIME: str = "torchscript"
+    INFERENCE_QUANTIZE: bool = False
+    # Unix socket of the host's inference server (ml/server.py), workers run
+    # inference in process when unset.
+    INFERENCE_SERVER_SOCKET: Optional[str] = None
+    INFERENCE_SERVER_MAX_BATCH_SIZE: int = 64
+    INFERENCE_SERVER_MAX_LATENCY_MS: float = 20.0
+    # Seconds a request may take on the server before it's failed, and seconds
+    # workers run inference locally after the server failed to answer.
+    INFERENCE_SERVER_TIMEOUT: float = 60.0
+    INFERENCE_SERVER_RETRY_INTERVAL: float = 30.0
+
+    # Keep-alive pool sizes for the Spotify/SpAPI http clients (see
+    # spotify/transport.py). Match HTTP_POOL_MAXSIZE to the worker concurrency.
+    HTTP_POOL_CONNECTIONS: int = 10
+    HTTP_POOL_MAXSIZE: int = 100
+
+    # Requests per second (and burst size) per credential, shared by all workers
+    # through Redis (see spotify/rate_limit.py).
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_MAX_WAIT: float = 60.0  # seconds
+    RATE_LIMIT_WEB_API: float = 10.0
+    RATE_LIMIT_WEB_API_BURST: float = 20.0
+    RATE_LIMIT_SPCLIENT: float = 20.0
+    RATE_LIMIT_SPCLIENT_BURST: float = 40.0
+    RATE_LIMIT_SPAPI: float = 50.0
+    RATE_LIMIT_SPAPI_BURST: float = 100.0
+
+    # Flows hand their ids to publish_batch tasks of DISPATCH_BATCH_SIZE ids (see
+    # spotify/dispatch.py), which publish each id's workflow. Progress of an
+    # unfinished dispatch is kept for DISPATCH_PROGRESS_TTL seconds so the next
+    # run can resume it.
+    DISPATCH_BATCH_SIZE: int = 100
+    DISPATCH_PROGRESS_TTL: int = 60 * 60 * 24
+
+    # track_playcount is partitioned by month; partitions are created this many
+    # months ahead. Playcounts older than the retention window are downsampled to
+    # one per track per week.
+    TRACK_PLAYCOUNT_PARTITIONS_AHEAD: int = 2
+    TRACK_PLAYCOUNT_RETENTION_DAYS: int = 90
+
+    # Windows (in days) of the track_metric rows computed by compute_track_metrics,
+    # over TRACK_METRIC_SHARDS hash partitions of the tracks (one playcount matrix
+    # in memory at a time, see analytics/playcounts.py).
+    TRACK_METRIC_LAG_DAYS: List[int] = [7, 14, 30]
+    TRACK_METRIC_SHARDS: int = 8
+
+    # Cached /tracks/rising-tracks responses (see core/cache.py) are dropped when
+    # the materialized views are refreshed, RISING_TRACKS_CACHE_WARM_DELAY seconds
+    # after new playcounts are pushed (once per burst), or after
+    # RISING_TRACKS_CACHE_TTL seconds. The filters in RISING_TRACKS_CACHE_WARM
+    # (overrides of the defaults) are cached again each time they're dropped.
+    RISING_TRACKS_CACHE_TTL: int = 60 * 60
+    RISING_TRACKS_CACHE_WARM_DELAY: int = 60 * 5
+    RISING_TRACKS_CACHE_WARM: List[Dict[str, Any]] = [
+        {},
+        {"lag_days": 14},
+        {"lag_days": 30},
+    ]
+
+    HIT_INDEX_MIN_PROBABILITY: float = 0.70
+    HIT_INDEX_SYNC_INTERVAL: int = 300  # seconds
+    HIT_INDEX_N_PROBE: int = 8
+    # A track queued for flow_tracks_embeddings isn't queued again for this long.
+    EMBEDDING_QUEUE_TTL: int = 60 * 60 * 24  # seconds
+
     class Config:
         case_sensitive = True
 
@@ -23,6 +23,9 @@ from .crud_track_prediction import track_prediction
 from .crud_ml_model import ml_model
 from .crud_track_user import track_user
 from .crud_track_distance import track_distance
+from .crud_track_embedding import track_embedding
+from .crud_track_growth import track_growth
+from .crud_track_metric import track_metric
 from .crud_musicai_playlist import musicai_playlist
 from .crud_materialized_view import materialized_view
 
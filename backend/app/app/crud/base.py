@@ -1,4 +1,15 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+from typing import (
+    Any,
+    Dict,
+    Generic,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
@@ -53,6 +64,55 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         else:
             return db.query(self.model).offset(skip).all()
 
+    def stream(
+        self, db: Session, stmt: Any, *, page_size: int = 1_000
+    ) -> Iterator[Any]:
+        """
+        Execute a statement through a server side cursor, yielding its rows while
+        only holding page_size of them in memory. The session must stay open until
+        the iterator is exhausted.
+        """
+        result = db.execute(stmt.execution_options(stream_results=True))
+        try:
+            while True:
+                rows = result.fetchmany(page_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            result.close()
+
+    def fetch(self, db: Session, stmt: Any, *, stream: bool = False) -> Any:
+        """
+        Execute a statement, returning all rows, or an iterator from `self.stream`
+        when stream=True.
+        """
+        if stream:
+            return self.stream(db, stmt)
+        return db.execute(stmt).fetchall()
+
+    @staticmethod
+    def seek(
+        column: str, after_id: Optional[str] = None, shard: int = 0, shards: int = 1,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Keyset (seek) pagination and hash sharding for raw sql queries over the id
+        `column`: returns the conditions to append to the where clause and their
+        bind params. With after_id set a page holds the ids after it (the query
+        should then order by `column`), and with shards > 1 only the ids where
+        mod(hashtext(id), shards) == shard.
+        """
+        conditions, params = "", {}
+        if after_id is not None:
+            conditions += f" and {column} > :after_id"
+            params["after_id"] = after_id
+        if shards > 1:
+            conditions += (
+                f" and mod(abs(hashtext({column})::bigint), :shards) = :shard"
+            )
+            params.update(shards=shards, shard=shard)
+        return conditions, params
+
     def get_multi_by_ids(self, db: Session, *, ids: List[str]) -> List[ModelType]:
         """
         Retrieve a list of db objects in the db given a set of ids.
@@ -137,11 +137,20 @@ class CRUDAlbum(CRUDBase[Album, AlbumCreate, AlbumUpdate]):
         verified_artists: bool = True,
         skip: int = 0,
         limit: int = 10_000,
+        after_id: Optional[str] = None,
+        shard: int = 0,
+        shards: int = 1,
+        stream: bool = False,
     ) -> List[Any]:
         """
         Retrieve unique album ids missing track playcounts for the current date.
+
+        Albums come newest first, or with after_id (keyset pagination) in id order
+        after it. See CRUDBase.seek for shard/shards.
         """
-        stmt = """
+        conditions, params = self.seek("al.id", after_id, shard=shard, shards=shards)
+        order_by = "al.id" if after_id is not None else "max(al.release_date) desc"
+        stmt = f"""
             with track_plays_today as (
                 select track_id
                 from track_playcount tp
@@ -176,9 +185,9 @@ class CRUDAlbum(CRUDBase[Album, AlbumCreate, AlbumUpdate]):
                         'lo-fi beats'
                     )
                     or ga.genre_id is null
-                )
+                ){conditions}
             group by al.id
-            order by max(al.release_date) desc
+            order by {order_by}
             limit :limit offset :skip
         """
         stmt = (
@@ -189,10 +198,11 @@ class CRUDAlbum(CRUDBase[Album, AlbumCreate, AlbumUpdate]):
                 verified_artists=verified_artists,
                 limit=limit,
                 skip=skip,
+                **params,
             )
             .columns(id=String)
         )
-        return db.execute(stmt).fetchall()
+        return self.fetch(db, stmt, stream=stream)
 
     def get_album_ids_by_verified_artists_missing_data(
         self,
@@ -202,13 +212,24 @@ class CRUDAlbum(CRUDBase[Album, AlbumCreate, AlbumUpdate]):
         max_date: Optional[date] = date.today(),
         skip: int = 0,
         limit: int = 10_000,
+        after_id: Optional[str] = None,
+        shard: int = 0,
+        shards: int = 1,
+        stream: bool = False,
     ) -> List[Any]:
         """
         Retrieve unique album ids by verified artists that don't have any blacklisted
         genres but are missing album metadata (i.e., cover image, label_id, etc.).
+
+        Albums come newest first, or with after_id (keyset pagination) in id order
+        after it. See CRUDBase.seek for shard/shards.
         """
         # TODO: move this function to crud_track_playcount.
-        stmt = """
+        conditions, params = self.seek("al.id", after_id, shard=shard, shards=shards)
+        order_by = (
+            "va.album_id" if after_id is not None else "max(va.release_date) desc"
+        )
+        stmt = f"""
             with verified_artists as (
                 select a.id artist_id,
                     a.name artist_name,
@@ -241,7 +262,7 @@ class CRUDAlbum(CRUDBase[Album, AlbumCreate, AlbumUpdate]):
                         'musica para ninos',
                         'focus beats',
                         'lo-fi beats'
-                    )
+                    ){conditions}
                 order by al.release_date desc, al.total_tracks desc
             ), exlude_track_ids as (
                 select tp.track_id,
@@ -256,7 +277,7 @@ class CRUDAlbum(CRUDBase[Album, AlbumCreate, AlbumUpdate]):
             join track t on t.album_id = va.album_id
             where t.id not in (select track_id id from exlude_track_ids)
             group by va.album_id
-            order by max(va.release_date) desc
+            order by {order_by}
             limit :limit offset :skip
         """
         stmt = (
@@ -266,10 +287,11 @@ class CRUDAlbum(CRUDBase[Album, AlbumCreate, AlbumUpdate]):
                 max_date=max_date.strftime("%Y-%m-%d"),
                 limit=limit,
                 skip=skip,
+                **params,
             )
             .columns(id=String)
         )
-        return db.execute(stmt).fetchall()
+        return self.fetch(db, stmt, stream=stream)
 
     def get_by_date_range(
         self,
@@ -100,27 +100,46 @@ class CRUDArtist(CRUDBase[Artist, ArtistCreate, ArtistUpdate]):
         return db_obj
 
     def get_artist_ids_missing_data(
-        self, db: Session, *, skip: int = 0, limit: int = 10_000
+        self,
+        db: Session,
+        *,
+        skip: int = 0,
+        limit: int = 10_000,
+        after_id: Optional[str] = None,
+        shard: int = 0,
+        shards: int = 1,
+        stream: bool = False,
     ) -> List[Any]:
         """
         Retrieve a list of artist ids that are missing data in the db. This includes
         artists that do not have information for links, genres, verified, or active.
+
+        Artists come newest release first, or with after_id (keyset pagination) in
+        id order after it. See CRUDBase.seek for shard/shards.
         """
-        stmt = """
+        conditions, params = self.seek("a.id", after_id, shard=shard, shards=shards)
+        order_by = "a.id" if after_id is not None else "max(alb.release_date) desc"
+        stmt = f"""
             select a.id id
             from artist a
             left join artist_link al on al.artist_id = a.id
             left join genre_artist ga on ga.artist_id = a.id
             join album_artist aa on aa.artist_id = a.id
             join album alb on alb.id = aa.album_id
-            where (al.link is null and ga.genre_id is null)
+            where (
+                (al.link is null and ga.genre_id is null)
                 or (a.verified is null or a.active is null)
+            ){conditions}
             group by a.id
-            order by max(alb.release_date) desc
+            order by {order_by}
             limit :limit offset :skip;
         """
-        stmt = text(stmt).bindparams(limit=limit, skip=skip,).columns(id=String)
-        return db.execute(stmt).fetchall()
+        stmt = (
+            text(stmt)
+            .bindparams(limit=limit, skip=skip, **params)
+            .columns(id=String)
+        )
+        return self.fetch(db, stmt, stream=stream)
 
 
 artist = CRUDArtist(Artist)
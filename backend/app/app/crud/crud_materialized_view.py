@@ -1,4 +1,5 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+from typing import Any, Dict, Generic, List, NamedTuple, Optional, Type, TypeVar, Union
+import time
 
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
@@ -18,6 +19,20 @@ UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 logger = get_task_logger(__name__)
 
 
+class MaterializedView(NamedTuple):
+    name: str
+    populated: bool
+    has_unique_index: bool
+    depends_on: List[str]
+
+    @property
+    def concurrently(self) -> bool:
+        """
+        Whether the view can be refreshed without blocking its readers.
+        """
+        return self.populated and self.has_unique_index
+
+
 class CRUDMaterializedView(object):
     def __init__(self):
         """
@@ -45,34 +60,137 @@ class CRUDMaterializedView(object):
         names = [mv.name for mv in db.execute(stmt).fetchall()]
         return names
 
-    def refresh_view(self, db: Session, mv_name: str) -> str:
+    def get_views(self, db: Session) -> Dict[str, MaterializedView]:
+        """
+        Retrieve the materialized views in the db with what's needed to plan a
+        refresh: whether they are populated and have a unique index (both needed
+        for REFRESH ... CONCURRENTLY), and the materialized views they read from.
+        """
+        stmt = """
+            select
+                c.relname "name",
+                m.ispopulated populated,
+                exists (
+                    select 1
+                    from pg_index i
+                    where i.indrelid = c.oid
+                        and i.indisunique
+                        and i.indpred is null
+                        and i.indexprs is null
+                ) has_unique_index
+            from pg_matviews m
+            join pg_namespace n on n.nspname = m.schemaname
+            join pg_class c
+                on c.relname = m.matviewname
+                and c.relnamespace = n.oid;
+        """
+        stmt = text(stmt).columns(
+            name=String, populated=Boolean, has_unique_index=Boolean
+        )
+        views = {
+            row.name: MaterializedView(
+                name=row.name,
+                populated=row.populated,
+                has_unique_index=row.has_unique_index,
+                depends_on=[],
+            )
+            for row in db.execute(stmt).fetchall()
+        }
+        # A view's query is a rewrite rule, whose dependencies list the relations
+        # it reads from.
+        stmt = """
+            select distinct
+                v.relname "name",
+                d.relname depends_on
+            from pg_rewrite r
+            join pg_depend dep
+                on dep.objid = r.oid
+                and dep.classid = 'pg_rewrite'::regclass
+            join pg_class v on v.oid = r.ev_class
+            join pg_class d on d.oid = dep.refobjid
+            where v.relkind = 'm'
+                and d.relkind = 'm'
+                and v.oid <> d.oid;
+        """
+        stmt = text(stmt).columns(name=String, depends_on=String)
+        for row in db.execute(stmt).fetchall():
+            if row.name in views and row.depends_on in views:
+                views[row.name].depends_on.append(row.depends_on)
+        return views
+
+    def refresh_levels(self, views: Dict[str, MaterializedView]) -> List[List[str]]:
+        """
+        Order views for refreshing: each level only depends on views in earlier
+        levels, so the views within a level can refresh in parallel.
+        """
+        remaining = {name: set(view.depends_on) for name, view in views.items()}
+        levels = []
+        while remaining:
+            level = sorted(name for name, deps in remaining.items() if not deps)
+            if not level:
+                # Postgres doesn't allow cycles, but don't spin if one shows up.
+                logger.warning(f"Circular materialized views: {sorted(remaining)}")
+                level = sorted(remaining)
+            levels.append(level)
+            for name in level:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(level)
+        return levels
+
+    def refresh_view(
+        self, db: Session, mv_name: str, concurrently: bool = False
+    ) -> Dict[str, Any]:
         """
-        Refresh the materialized view specified by mv_name.
+        Refresh the materialized view specified by mv_name. With concurrently=True
+        (the view must be populated and have a unique index) readers aren't
+        blocked while it refreshes.
+
+        The view is analyzed right after, which keeps the planner's statistics
+        current and gives the row count estimate (pg_class.reltuples) of the stats
+        without scanning the view again.
 
         Returns:
-            The mv_name parameter.
+            The refresh stats: name, concurrently, seconds, and rows (estimated).
         """
+        start = time.perf_counter()
+        mode = "CONCURRENTLY " if concurrently else ""
         stmt = f"""
-            REFRESH MATERIALIZED VIEW {mv_name};
+            REFRESH MATERIALIZED VIEW {mode}{mv_name};
         """
         db.execute(text(stmt))
         db.commit()
-        return mv_name
+        seconds = time.perf_counter() - start
+        db.execute(text(f"ANALYZE {mv_name};"))
+        stmt = """
+            select reltuples::bigint "rows"
+            from pg_class
+            where oid = cast(:mv_name as regclass);
+        """
+        stmt = text(stmt).bindparams(mv_name=mv_name).columns(rows=BigInteger)
+        rows = db.execute(stmt).scalar()
+        db.commit()
+        return dict(
+            name=mv_name,
+            concurrently=concurrently,
+            seconds=round(seconds, 3),
+            rows=rows,
+        )
 
     def refresh_all(self, db: Session) -> List[str]:
         """
-        Refresh all existing materialized views in the db.
+        Refresh all existing materialized views in the db, in dependency order and
+        concurrently where possible.
 
         Returns:
             A list of names of the materialized view that were refreshed.
         """
-        names = self.get_names(db)
-        for mv in names:
-            stmt = f"""
-                REFRESH MATERIALIZED VIEW {mv};
-            """
-            db.execute(text(stmt))
-            db.commit()
+        views = self.get_views(db)
+        names = []
+        for level in self.refresh_levels(views):
+            for mv in level:
+                self.refresh_view(db, mv, concurrently=views[mv].concurrently)
+                names.append(mv)
         return names
 
     # def get_with_cache(self, db: Session, compiled_cache: Dict):
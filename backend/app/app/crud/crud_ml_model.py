@@ -1,4 +1,5 @@
 from typing import Optional, List
+from datetime import datetime
 
 from sqlalchemy.orm import Session
 
@@ -13,7 +14,25 @@ class CRUDMLModel(CRUDBase[ML_Model, MLModelCreate, MLModelUpdate]):
     ) -> Optional[List[ML_Model]]:
         return db.query(ML_Model).filter(ML_Model.model_type == model_type).all()
 
-    pass
+    def get_or_create(self, db: Session, *, model_id: str) -> ML_Model:
+        """
+        Get the ml_model row for model_id, creating it from the id's
+        `<model_type>_<date_trained>_<epochs>[_<extra_metadata>]` format if missing.
+        """
+        db_obj = self.get(db, id=model_id)
+        if db_obj:
+            return db_obj
+        model_config = model_id.split("_")
+        return self.create(
+            db,
+            obj_in=MLModelCreate(
+                id=model_id,
+                model_type=model_config[0],
+                date_trained=datetime.fromisoformat(model_config[1]),
+                epochs=int(model_config[2]),
+                extra_metadata=model_config[-1] if len(model_config) > 3 else None,
+            ),
+        )
 
 
 ml_model = CRUDMLModel(ML_Model)
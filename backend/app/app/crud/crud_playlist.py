@@ -18,6 +18,7 @@ class CRUDPlaylist(CRUDBase[Playlist, PlaylistCreate, PlaylistUpdate]):
         *,
         skip: int = 0,
         limit: int = 1_000,
+        stream: bool = False,
     ) -> List[Playlist]:
         # TODO: define the term_ids to exclude in a config file
         stmt = """
@@ -55,7 +56,7 @@ class CRUDPlaylist(CRUDBase[Playlist, PlaylistCreate, PlaylistUpdate]):
             .bindparams(min_followers=min_followers, limit=limit, skip=skip,)
             .columns(id=String)
         )
-        return db.execute(stmt).fetchall()
+        return self.fetch(db, stmt, stream=stream)
 
     def get_by_spotify_user(
         self, db: Session, *, spotify_user_id: str, skip: int = 0, limit: int = 1_000,
@@ -1,5 +1,7 @@
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Iterator, Dict, Union
 
+from sqlalchemy import func, bindparam
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from celery.utils.log import get_task_logger
@@ -39,6 +41,31 @@ class CRUDSpectrogram(CRUDBase[Spectrogram, SpectrogramCreate, SpectrogramUpdate
         finally:
             return spec
 
+    def create_multi(
+        self,
+        db: Session,
+        *,
+        objs_in: List[Union[SpectrogramCreate, Dict[str, Any]]],
+    ) -> bool:
+        """
+        Bulk insert a list of spectrograms. Spectrograms already stored for the
+        track with the same parameters (eg, pushed by a concurrent task) are left
+        untouched instead of failing the whole batch.
+        """
+        if len(objs_in) == 0:
+            return True
+        objs_in = [obj if isinstance(obj, dict) else obj.dict() for obj in objs_in]
+        table = Spectrogram.__table__
+        success = False
+        try:
+            db.execute(insert(table).on_conflict_do_nothing(), objs_in)
+            db.commit()
+            success = True
+        except Exception as err:  # noqa: F841
+            logger.warning(f"ERROR Inserting to {table.name} \n {err}")
+            db.rollback()
+        return success
+
     def update_is_corrupt(
         self, db: Session, *, db_obj: Spectrogram, is_corrupt: bool
     ) -> Spectrogram:
@@ -46,6 +73,22 @@ class CRUDSpectrogram(CRUDBase[Spectrogram, SpectrogramCreate, SpectrogramUpdate
         db.refresh(db_obj)
         return db_obj
 
+    def update_is_corrupt_multi(
+        self, db: Session, *, ids: List[int], is_corrupt: bool = True
+    ) -> int:
+        """
+        Flag many spectrograms (by spectrogram id) as corrupt in one statement.
+        """
+        if not ids:
+            return 0
+        count = (
+            db.query(Spectrogram)
+            .filter(Spectrogram.id.in_(ids))
+            .update({Spectrogram.is_corrupt: is_corrupt}, synchronize_session=False)
+        )
+        db.commit()
+        return count
+
     def get(
         self,
         db: Session,
@@ -100,6 +143,40 @@ class CRUDSpectrogram(CRUDBase[Spectrogram, SpectrogramCreate, SpectrogramUpdate
             .all()
         )
 
+    def iter_by_track_ids(
+        self,
+        db: Session,
+        *,
+        track_ids: List[str],
+        page_size: int = settings.INFERENCE_PAGE_SIZE,
+        spec_type: Optional[str] = settings.SPECTROGRAM_TYPE,
+        hop_size: Optional[int] = settings.HOP_SIZE,
+        window_size: Optional[int] = settings.WINDOW_SIZE,
+        n_mels: Optional[int] = settings.N_MELS,
+    ) -> Iterator[Any]:
+        """
+        Stream the (id, track_id, spectrogram) rows of a large set of track ids,
+        one page of track ids per query, so only a page of spectrograms is held in
+        memory at a time.
+        """
+        track_ids = sorted(set(track_ids))
+        for i in range(0, len(track_ids), page_size):
+            page_ids = track_ids[i : i + page_size]  # noqa: E203
+            rows = (
+                db.query(Spectrogram.id, Spectrogram.track_id, Spectrogram.spectrogram)
+                .filter(
+                    Spectrogram.track_id.in_(page_ids),
+                    Spectrogram.spectrogram_type == spec_type,
+                    Spectrogram.hop_size == hop_size,
+                    Spectrogram.window_size == window_size,
+                    Spectrogram.n_mels == n_mels,
+                    Spectrogram.is_corrupt == False,  # noqa: E712
+                )
+                .order_by(Spectrogram.track_id)
+                .all()
+            )
+            yield from rows
+
     def get_by_track_ids_simplified(
         self,
         db: Session,
@@ -154,5 +231,51 @@ class CRUDSpectrogram(CRUDBase[Spectrogram, SpectrogramCreate, SpectrogramUpdate
             .all()
         )
 
+    def get_batch_not_in_format(
+        self, db: Session, *, magic: bytes, after_id: int = 0, limit: int = 500,
+    ) -> List[Any]:
+        """
+        Keyset page of (id, track_id, spectrogram) rows whose blob doesn't start
+        with `magic`, ordered by id.
+        """
+        return (
+            db.query(Spectrogram.id, Spectrogram.track_id, Spectrogram.spectrogram)
+            .filter(
+                Spectrogram.id > after_id,
+                Spectrogram.spectrogram != None,  # noqa: E711
+                func.substring(Spectrogram.spectrogram, 1, len(magic)) != magic,
+            )
+            .order_by(Spectrogram.id)
+            .limit(limit)
+            .all()
+        )
+
+    def update_spectrogram_multi(
+        self, db: Session, *, objs_in: List[Dict[str, Any]]
+    ) -> bool:
+        """
+        Bulk rewrite the spectrogram blob of many rows. Each obj needs an id and a
+        spectrogram.
+        """
+        if not objs_in:
+            return True
+        table = Spectrogram.__table__
+        try:
+            db.execute(
+                table.update()
+                .where(table.c.id == bindparam("_id"))
+                .values(spectrogram=bindparam("_spectrogram")),
+                [
+                    {"_id": obj["id"], "_spectrogram": obj["spectrogram"]}
+                    for obj in objs_in
+                ],
+            )
+            db.commit()
+            return True
+        except Exception as err:  # noqa: F841
+            logger.warning(f"ERROR Updating {table.name} \n {err}")
+            db.rollback()
+            return False
+
 
 spectrogram = CRUDSpectrogram(Spectrogram)
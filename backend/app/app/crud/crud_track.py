@@ -1,9 +1,10 @@
 from typing import List, Optional, Tuple, Union, Dict, Any, NamedTuple
 from collections import defaultdict
+import datetime
 
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy import text, Integer, String, Float, Boolean, BigInteger
 from celery.utils.log import get_task_logger
 
@@ -19,6 +20,7 @@ from app import schemas
 from app.spotify import parser
 
 from .crud_track_artist import track_artist
+from .crud_track_growth import track_growth
 
 
 logger = get_task_logger(__name__)
@@ -110,7 +112,7 @@ class CRUDTrack(CRUDBase[Track, TrackCreate, TrackUpdate]):
                 tr.musicai_score
             from (
                 select tp.*,
-                    7 period_days,
+                    {int(lag_days)} period_days,
                     prediction,
                     probability,
                     CASE
@@ -120,7 +122,7 @@ class CRUDTrack(CRUDBase[Track, TrackCreate, TrackUpdate]):
                         WHEN probability < 0.97 THEN 4
                         WHEN probability <= 1.0 THEN 5
                     END musicai_score
-                from track_rising_rolling_{lag_days} tp
+                from ({track_growth.rising_sql(lag_days)}) tp
                 join track_prediction tpred on tpred.track_id = tp.track_id
                 where tpred.model_id = 'CNNSpectrogramV2_2019-11-25_100'
             ) tr
@@ -175,6 +177,61 @@ class CRUDTrack(CRUDBase[Track, TrackCreate, TrackUpdate]):
         ]
         return tracks_rising
 
+    def get_tracks_hydrated(self, db: Session, *, track_ids: List[str]) -> List[Track]:
+        """
+        Retrieve a list of db tracks with their album and artists loaded, in two
+        queries however many tracks: the tracks joined to their albums, and the
+        artists of all of them.
+        """
+        if not track_ids:
+            return []
+        return (
+            db.query(Track)
+            .options(joinedload(Track.album), selectinload(Track.artists))
+            .filter(Track.id.in_(track_ids))
+            .all()
+        )
+
+    def hydrate_rising_tracks(
+        self, db: Session, *, tracks_rising_base: List[TrackRisingBase]
+    ) -> List[schemas.TrackRising]:
+        """
+        Build the rising track responses, in the order of tracks_rising_base, with
+        each track's album and artists (see get_tracks_hydrated).
+        """
+        rising_bases = {t.id: t for t in tracks_rising_base}
+        tracks = {
+            t.id: t for t in self.get_tracks_hydrated(db, track_ids=list(rising_bases))
+        }
+        if len(tracks) != len(rising_bases):
+            raise ValueError("Track rising base and tracks must be the same length!")
+
+        today = datetime.date.today()
+        tracks_rising = []
+        for rising_base in rising_bases.values():
+            track = tracks[rising_base.id]
+            tracks_rising.append(
+                schemas.TrackRising(
+                    **rising_base.dict(),
+                    track=schemas.Track.from_orm(track),
+                    artists=[schemas.Artist.from_orm(a) for a in track.artists],
+                    album=schemas.Album.from_orm(track.album),
+                    days_since_release=(today - track.album.release_date).days,
+                )
+            )
+        return tracks_rising
+
+    def get_rising_tracks_response(
+        self, db: Session, **filters: Any
+    ) -> List[schemas.TrackRising]:
+        """
+        The rising tracks matching `filters` (see get_rising_tracks) with their
+        track, album and artists, as returned by /tracks/rising-tracks.
+        """
+        return self.hydrate_rising_tracks(
+            db, tracks_rising_base=self.get_rising_tracks(db, **filters)
+        )
+
     def get_rising_tracks_missing_spectrograms(
         self,
         db: Session,
@@ -183,15 +240,15 @@ class CRUDTrack(CRUDBase[Track, TrackCreate, TrackUpdate]):
         order_by: str = "growth_rate",
         skip: int = 0,
         limit: int = 10_000,
+        stream: bool = False,
     ) -> List[Tuple[str, str]]:
-        # TODO: add lag days functionality
         if order_by in ("growth_rate", "chg"):
             order_by = f"avg_{order_by}"
         stmt = f"""
             select
                 tr.track_id id,
                 tr.preview_url
-            from track_rising_rolling_{lag_days} tr
+            from ({track_growth.rising_sql(lag_days)}) tr
             left join spectrogram s on s.track_id = tr.track_id
             where (s.spectrogram is null or s.is_corrupt = true)
                 and tr.preview_url is not null
@@ -203,10 +260,16 @@ class CRUDTrack(CRUDBase[Track, TrackCreate, TrackUpdate]):
             .bindparams(limit=limit, skip=skip,)
             .columns(id=String, preview_url=String,)
         )
-        return db.execute(stmt).fetchall()
+        return self.fetch(db, stmt, stream=stream)
 
     def get_tracks_missing_spectrograms(
-        self, db: Session, *, lag_days: int = 7, skip: int = 0, limit: int = 10_000,
+        self,
+        db: Session,
+        *,
+        lag_days: int = 7,
+        skip: int = 0,
+        limit: int = 10_000,
+        stream: bool = False,
     ) -> List[Track]:
         """
         Retrieve tracks missing spectrograms that have a preview url and are associated
@@ -281,7 +344,7 @@ class CRUDTrack(CRUDBase[Track, TrackCreate, TrackUpdate]):
                 album_id=String,
             )
         )
-        return db.execute(stmt).fetchall()
+        return self.fetch(db, stmt, stream=stream)
 
     def get_rising_tracks_to_predict(
         self,
@@ -292,13 +355,12 @@ class CRUDTrack(CRUDBase[Track, TrackCreate, TrackUpdate]):
         skip: int = 0,
         limit: int = 10_000,
     ) -> List[Tuple[str]]:
-        # TODO: add lag days functionality
         if order_by in ("growth_rate", "chg"):
             order_by = f"avg_{order_by}"
 
         stmt = f"""
             select tr.track_id id
-            from track_rising_rolling_{lag_days} tr
+            from ({track_growth.rising_sql(lag_days)}) tr
             join spectrogram s on s.track_id = tr.track_id
             left join track_prediction tpred on tpred.track_id = tr.track_id
             where s.is_corrupt is false
@@ -388,9 +450,23 @@ class CRUDTrack(CRUDBase[Track, TrackCreate, TrackUpdate]):
         return db.execute(stmt).fetchall()
 
     def get_tracks_missing_preview_url(
-        self, db: Session, *, skip: int = 0, limit: int = 10_000
+        self,
+        db: Session,
+        *,
+        skip: int = 0,
+        limit: int = 10_000,
+        after_id: Optional[str] = None,
+        shard: int = 0,
+        shards: int = 1,
     ) -> List[Track]:
-        stmt = """
+        """
+        Retrieve tracks missing a preview url, newest release first, or with
+        after_id (keyset pagination) in id order after it. See CRUDBase.seek for
+        shard/shards.
+        """
+        conditions, params = self.seek("t.id", after_id, shard=shard, shards=shards)
+        order_by = "t.id" if after_id is not None else "max(al.release_date) desc"
+        stmt = f"""
             with valid_tracks as (
                 select t.id id,
                     max(al.release_date) release_date
@@ -418,14 +494,18 @@ class CRUDTrack(CRUDBase[Track, TrackCreate, TrackUpdate]):
                             'lo-fi beats'
                         )
                         or ga.genre_id is null
-                    )
+                    ){conditions}
                 group by t.id
-                order by max(al.release_date) desc
+                order by {order_by}
                 limit :limit offset :skip
             ) select id
             from valid_tracks vt
         """
-        stmt = text(stmt).bindparams(limit=limit, skip=skip,).columns(id=String)
+        stmt = (
+            text(stmt)
+            .bindparams(limit=limit, skip=skip, **params)
+            .columns(id=String)
+        )
         return db.execute(stmt).fetchall()
 
 
@@ -1,6 +1,8 @@
-from typing import Optional, List
+from typing import Optional, List, Dict, Any, Union, Tuple
 
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
 from celery.utils.log import get_task_logger
 
 from app.crud.base import CRUDBase
@@ -67,27 +69,73 @@ class CRUDTrackDistance(
             .all()
         )
 
-    def create(self, db: Session, *, obj_in: TrackDistanceCreate) -> Track_Distance:
+    def _format_distance(
+        self, obj_in: Union[TrackDistanceCreate, Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Build the db row for a distance pair.
+        """
+        if not isinstance(obj_in, dict):
+            obj_in = jsonable_encoder(obj_in)
         # Id is <src_id>_<tgt_id>_<model_id>_<distance_type>
         # Note: src_id < tgt_id
-        if obj_in.t1_id < obj_in.t2_id:
-            d_id = f"{obj_in.t1_id}_{obj_in.t2_id}"
-            src_id = obj_in.t1_id
-            tgt_id = obj_in.t2_id
+        if obj_in["t1_id"] < obj_in["t2_id"]:
+            src_id, tgt_id = obj_in["t1_id"], obj_in["t2_id"]
         else:
-            d_id = f"{obj_in.t2_id}_{obj_in.t1_id}"
-            src_id = obj_in.t2_id
-            tgt_id = obj_in.t1_id
-        d_id = f"{d_id}_{obj_in.model_id}_{obj_in.distance_type}"
-        obj_in = TrackDistance(
-            id=d_id,
+            src_id, tgt_id = obj_in["t2_id"], obj_in["t1_id"]
+        return dict(
+            id=f"{src_id}_{tgt_id}_{obj_in['model_id']}_{obj_in['distance_type']}",
             src_id=src_id,
             tgt_id=tgt_id,
-            model_id=obj_in.model_id,
-            distance_type=obj_in.distance_type,
-            distance=obj_in.distance,
+            model_id=obj_in["model_id"],
+            distance_type=obj_in["distance_type"],
+            distance=obj_in["distance"],
         )
+
+    def create(self, db: Session, *, obj_in: TrackDistanceCreate) -> Track_Distance:
+        obj_in = TrackDistance(**self._format_distance(obj_in))
         return super().create(db, obj_in=obj_in, refresh=True)
 
+    def create_multi(
+        self,
+        db: Session,
+        *,
+        objs_in: List[Union[TrackDistanceCreate, Dict[str, Any]]],
+        chunk_size: int = 10_000,
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Bulk insert a batch of distance pairs. The canonical ids are built once for
+        the whole batch and every chunk of rows is written with a single
+        INSERT ... ON CONFLICT DO NOTHING, so pairs that are already in the table
+        (or repeated in the batch) are skipped instead of failing the batch.
+
+        Returns:
+            A tuple with the number of inserted and skipped pairs, or None if the
+            batch couldn't be written (nothing is inserted then).
+        """
+        rows = {}
+        for obj_in in objs_in:
+            row = self._format_distance(obj_in)
+            rows[row["id"]] = row
+        rows = list(rows.values())
+
+        inserted = 0
+        table = Track_Distance.__table__
+        try:
+            for i in range(0, len(rows), chunk_size):
+                stmt = (
+                    insert(table)
+                    .values(rows[i : i + chunk_size])  # noqa: E203
+                    .on_conflict_do_nothing(index_elements=[table.c.id])
+                    .returning(table.c.id)
+                )
+                inserted += len(db.execute(stmt).fetchall())
+            db.commit()
+        except Exception as err:  # noqa: F841
+            logger.warning(f"ERROR Inserting to {table.name} \n {err}")
+            db.rollback()
+            return None
+        return inserted, len(objs_in) - inserted
+
 
 track_distance = CRUDTrackDistance(Track_Distance)
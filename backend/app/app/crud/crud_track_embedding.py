@@ -0,0 +1,76 @@
+from typing import Optional, List, Dict, Any, Union
+
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from celery.utils.log import get_task_logger
+
+from app.crud.base import CRUDBase
+from app.models.track_embedding import Track_Embedding
+from app.schemas.track_embedding import TrackEmbeddingCreate, TrackEmbeddingUpdate
+from app.core.config import settings
+
+logger = get_task_logger(__name__)
+
+
+class CRUDTrackEmbedding(
+    CRUDBase[Track_Embedding, TrackEmbeddingCreate, TrackEmbeddingUpdate]
+):
+    def get(
+        self, db: Session, *, track_id: str, model_id: str = settings.MODEL_ID,
+    ) -> Optional[Track_Embedding]:
+        return (
+            db.query(Track_Embedding)
+            .filter(
+                Track_Embedding.track_id == track_id,
+                Track_Embedding.model_id == model_id,
+            )
+            .first()
+        )
+
+    def get_by_track_ids(
+        self, db: Session, *, track_ids: List[str], model_id: str = settings.MODEL_ID,
+    ) -> List[Track_Embedding]:
+        """
+        Retrieve the stored embeddings of the given track ids for a model.
+        """
+        return (
+            db.query(Track_Embedding)
+            .filter(
+                Track_Embedding.track_id.in_(track_ids),
+                Track_Embedding.model_id == model_id,
+            )
+            .all()
+        )
+
+    def create_multi(
+        self,
+        db: Session,
+        *,
+        objs_in: List[Union[TrackEmbeddingCreate, Dict[str, Any]]],
+    ) -> bool:
+        """
+        Bulk insert a list of embeddings. Embeddings that are already stored for the
+        (track_id, model_id) pair are left untouched.
+        """
+        if len(objs_in) == 0:
+            return True
+        objs_in = [
+            obj if isinstance(obj, dict) else obj.dict(exclude_none=True)
+            for obj in objs_in
+        ]
+        table = Track_Embedding.__table__
+        success = False
+        try:
+            stmt = insert(table).on_conflict_do_nothing(
+                index_elements=[table.c.track_id, table.c.model_id]
+            )
+            db.execute(stmt, objs_in)
+            db.commit()
+            success = True
+        except Exception as err:  # noqa: F841
+            logger.warning(f"ERROR Inserting to {table.name} \n {err}")
+            db.rollback()
+        return success
+
+
+track_embedding = CRUDTrackEmbedding(Track_Embedding)
@@ -0,0 +1,167 @@
+from typing import List
+
+from sqlalchemy.orm import Session
+from sqlalchemy import text, bindparam
+from celery.utils.log import get_task_logger
+
+from app.crud.base import CRUDBase
+from app.models.track_growth import Track_Growth
+from app.schemas.track_growth import TrackGrowthCreate, TrackGrowthUpdate
+
+logger = get_task_logger(__name__)
+
+# Windows (in days) whose start playcount is kept on the track_growth rows. Other
+# lag_days look the start up in track_playcount, one index seek per track.
+WINDOWS = (7, 14, 30)
+
+
+def _window_start(days: int, alias: str, ref: str) -> str:
+    """
+    Lateral join of the last playcount of `ref`'s track at least `days` days
+    before `ref`.date.
+    """
+    return f"""
+            left join lateral (
+                select p.date, p.playcount
+                from track_playcount p
+                where p.track_id = {ref}.track_id
+                    and p.date <= {ref}.date - {int(days)}
+                order by p.date desc
+                limit 1
+            ) {alias} on true"""
+
+
+class CRUDTrackGrowth(CRUDBase[Track_Growth, TrackGrowthCreate, TrackGrowthUpdate]):
+    def _upsert(self, db: Session, where: str, **params) -> int:
+        """
+        Recompute the track_growth rows of the tracks whose playcounts match
+        `where`, from their latest playcount.
+        """
+        windows = ", ".join(f"w{d}.date, w{d}.playcount" for d in WINDOWS)
+        window_columns = ", ".join(f"date_{d}, playcount_{d}" for d in WINDOWS)
+        window_updates = ",\n".join(
+            f"                date_{d} = excluded.date_{d},\n"
+            f"                playcount_{d} = excluded.playcount_{d}"
+            for d in WINDOWS
+        )
+        window_joins = "".join(_window_start(d, f"w{d}", "tp") for d in WINDOWS)
+        stmt = f"""
+            insert into track_growth (
+                track_id, date, playcount, popularity, prev_date, prev_playcount,
+                first_date, first_playcount, {window_columns}
+            )
+            select
+                tp.track_id, tp.date, tp.playcount, tp.popularity,
+                prev.date, prev.playcount,
+                f.date, f.playcount,
+                {windows}
+            from (
+                select distinct on (track_id) track_id, date, playcount, popularity
+                from track_playcount
+                where {where}
+                order by track_id, date desc
+            ) tp
+            left join lateral (
+                select p.date, p.playcount
+                from track_playcount p
+                where p.track_id = tp.track_id
+                    and p.date < tp.date
+                order by p.date desc
+                limit 1
+            ) prev on true
+            join lateral (
+                select p.date, p.playcount
+                from track_playcount p
+                where p.track_id = tp.track_id
+                order by p.date
+                limit 1
+            ) f on true{window_joins}
+            on conflict (track_id) do update set
+                date = excluded.date,
+                playcount = excluded.playcount,
+                popularity = excluded.popularity,
+                prev_date = excluded.prev_date,
+                prev_playcount = excluded.prev_playcount,
+                first_date = excluded.first_date,
+                first_playcount = excluded.first_playcount,
+{window_updates}
+        """
+        stmt = text(stmt)
+        if "track_ids" in params:
+            stmt = stmt.bindparams(bindparam("track_ids", expanding=True))
+        try:
+            result = db.execute(stmt, params)
+            db.commit()
+        except Exception as err:  # noqa: F841
+            logger.warning(f"ERROR Updating track_growth \n {err}")
+            db.rollback()
+            return 0
+        return result.rowcount
+
+    def update_tracks(self, db: Session, *, track_ids: List[str]) -> int:
+        """
+        Bring the track_growth rows of the given tracks up to date with their
+        latest playcounts. Call after pushing new track playcounts.
+
+        Returns:
+            The number of rows written.
+        """
+        if not track_ids:
+            return 0
+        return self._upsert(db, "track_id in :track_ids", track_ids=list(track_ids))
+
+    def rebuild(self, db: Session) -> int:
+        """
+        Recompute every track_growth row from the whole track_playcount history
+        (ie, to backfill the table).
+        """
+        return self._upsert(db, "true")
+
+    def rising_sql(self, lag_days: int) -> str:
+        """
+        Subquery with the columns of the former track_rising_rolling_{lag_days}
+        materialized views, for any lag_days: track_id, preview_url, date,
+        playcount, chg (plays gained over the window), avg_chg (plays gained per
+        day) and avg_growth_rate (avg_chg relative to the playcount at the start
+        of the window).
+
+        Only tracks with a playcount in the last lag_days days are included. When
+        a track's history is shorter than the window, the window starts at its
+        first playcount.
+        """
+        lag_days = int(lag_days)
+        if lag_days <= 0:
+            raise ValueError(f"lag_days must be positive, got {lag_days}")
+        if lag_days in WINDOWS:
+            start_join = ""
+            start_date = f"coalesce(g.date_{lag_days}, g.first_date)"
+            start_playcount = f"coalesce(g.playcount_{lag_days}, g.first_playcount)"
+        else:
+            start_join = _window_start(lag_days, "ws", "g")
+            start_date = "coalesce(ws.date, g.first_date)"
+            start_playcount = "coalesce(ws.playcount, g.first_playcount)"
+        return f"""
+            select gw.*,
+                gw.playcount - gw.start_playcount chg,
+                (gw.playcount - gw.start_playcount)::float
+                    / (gw.date - gw.start_date) avg_chg,
+                (gw.playcount - gw.start_playcount)::float
+                    / (gw.date - gw.start_date)
+                    / gw.start_playcount avg_growth_rate
+            from (
+                select g.track_id,
+                    t.preview_url,
+                    g.date,
+                    g.playcount,
+                    {start_date} start_date,
+                    {start_playcount} start_playcount
+                from track_growth g
+                join track t on t.id = g.track_id{start_join}
+                where g.date >= CURRENT_DATE - {lag_days}
+            ) gw
+            where gw.date > gw.start_date
+                and gw.start_playcount > 0
+        """
+
+
+track_growth = CRUDTrackGrowth(Track_Growth)
@@ -0,0 +1,53 @@
+from typing import Any, Dict, List, Union
+
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from celery.utils.log import get_task_logger
+
+from app.crud.base import CRUDBase
+from app.models.track_metric import Track_Metric
+from app.schemas.track_metric import TrackMetricCreate, TrackMetricUpdate
+
+logger = get_task_logger(__name__)
+
+
+class CRUDTrackMetric(CRUDBase[Track_Metric, TrackMetricCreate, TrackMetricUpdate]):
+    def upsert_multi(
+        self,
+        db: Session,
+        *,
+        objs_in: List[Union[TrackMetricCreate, Dict[str, Any]]],
+        chunk_size: int = 5_000,
+    ) -> int:
+        """
+        Bulk insert track metrics, replacing the stored (track_id, lag_days) rows.
+        Each chunk of chunk_size rows is written with a single multi row insert.
+
+        Returns:
+            The number of rows written.
+        """
+        objs_in = [obj if isinstance(obj, dict) else obj.dict() for obj in objs_in]
+        table = Track_Metric.__table__
+        written = 0
+        for i in range(0, len(objs_in), chunk_size):
+            chunk = objs_in[i : i + chunk_size]  # noqa: E203
+            stmt = insert(table).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.track_id, table.c.lag_days],
+                set_={
+                    column.name: stmt.excluded[column.name]
+                    for column in table.columns
+                    if not column.primary_key
+                },
+            )
+            try:
+                db.execute(stmt)
+                db.commit()
+                written += len(chunk)
+            except Exception as err:  # noqa: F841
+                logger.warning(f"ERROR Upserting to {table.name} \n {err}")
+                db.rollback()
+        return written
+
+
+track_metric = CRUDTrackMetric(Track_Metric)
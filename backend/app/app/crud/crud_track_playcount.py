@@ -1,5 +1,7 @@
-from typing import Optional, List
+from typing import Any, Optional, List
 from sqlalchemy.orm import Session
+from sqlalchemy import text, String, Integer, BIGINT
+from celery.utils.log import get_task_logger
 import datetime
 from app.crud.base import CRUDBase
 from app.models.track_playcount import Track_Playcount
@@ -9,6 +11,13 @@ from app.schemas.track_playcount import (
     TrackPlaycountUpdate,
 )
 
+logger = get_task_logger(__name__)
+
+
+def _month_start(day: datetime.date, months: int = 0) -> datetime.date:
+    month = day.year * 12 + day.month - 1 + months
+    return datetime.date(month // 12, month % 12 + 1, 1)
+
 
 class CRUDTrackPlaycount(
     CRUDBase[Track_Playcount, TrackPlaycountCreate, TrackPlaycountUpdate]
@@ -61,5 +70,114 @@ class CRUDTrackPlaycount(
             .all()
         )
 
+    def get_window(
+        self,
+        db: Session,
+        *,
+        since: datetime.date,
+        end: datetime.date,
+        shard: int = 0,
+        shards: int = 1,
+        stream: bool = False,
+    ) -> Any:
+        """
+        The (non zero) playcounts dated from `since` through `end` as rows of
+        track_id, day (days since `since`) and playcount, eg, to load into an
+        analytics.PlaycountMatrix. The date range only scans the partitions that
+        cover it.
+        """
+        conditions, params = self.seek("track_id", shard=shard, shards=shards)
+        stmt = f"""
+            select track_id, date - :since as day, playcount
+            from track_playcount
+            where date between :since and :end
+                and playcount > 0{conditions}
+        """
+        stmt = (
+            text(stmt)
+            .bindparams(since=since, end=end, **params)
+            .columns(track_id=String, day=Integer, playcount=BIGINT)
+        )
+        return self.fetch(db, stmt, stream=stream)
+
+    def partition_name(self, month: datetime.date) -> str:
+        return f"track_playcount_p{month.strftime('%Y%m')}"
+
+    def ensure_partitions(
+        self,
+        db: Session,
+        *,
+        start: Optional[datetime.date] = None,
+        months_ahead: int = 2,
+    ) -> List[str]:
+        """
+        Create the monthly partitions of track_playcount from the month of `start`
+        (default: today) through months_ahead months later, if missing.
+
+        Returns:
+            The names of the partitions covering that range.
+        """
+        month = _month_start(start or datetime.date.today())
+        names = []
+        for i in range(months_ahead + 1):
+            lower, upper = _month_start(month, i), _month_start(month, i + 1)
+            name = self.partition_name(lower)
+            stmt = f"""
+                create table if not exists {name}
+                partition of track_playcount
+                for values from ('{lower.isoformat()}') to ('{upper.isoformat()}');
+            """
+            db.execute(text(stmt))
+            names.append(name)
+        db.commit()
+        return names
+
+    def compact(
+        self,
+        db: Session,
+        *,
+        older_than_days: int,
+        lookback_days: Optional[int] = None,
+    ) -> int:
+        """
+        Downsample playcounts older than older_than_days to weekly points, keeping
+        each track's last playcount of every (Monday to Sunday) week.
+
+        lookback_days limits the work to rows at most that many days past the
+        cutoff (rounded back to the start of a week), so a daily run only touches
+        the few partitions that just aged out. None compacts everything.
+
+        Returns:
+            The number of rows deleted.
+        """
+        cutoff = datetime.date.today() - datetime.timedelta(days=older_than_days)
+        params = dict(cutoff=cutoff)
+        since_filter, tp_since_filter = "", ""
+        if lookback_days is not None:
+            since = cutoff - datetime.timedelta(days=lookback_days)
+            params["since"] = since - datetime.timedelta(days=since.weekday())
+            since_filter = "and date >= :since"
+            tp_since_filter = "and tp.date >= :since"
+        stmt = f"""
+            delete from track_playcount tp
+            using (
+                select track_id,
+                    date_trunc('week', date)::date week,
+                    max(date) keep_date
+                from track_playcount
+                where date < :cutoff {since_filter}
+                group by track_id, date_trunc('week', date)::date
+                having count(*) > 1
+            ) w
+            where tp.track_id = w.track_id
+                and tp.date < :cutoff {tp_since_filter}
+                and date_trunc('week', tp.date)::date = w.week
+                and tp.date <> w.keep_date;
+        """
+        result = db.execute(text(stmt), params)
+        db.commit()
+        logger.info(f"Compacted {result.rowcount} track playcounts before {cutoff}")
+        return result.rowcount
+
 
 track_playcount = CRUDTrackPlaycount(Track_Playcount)
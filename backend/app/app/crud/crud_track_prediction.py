@@ -1,14 +1,18 @@
-from typing import Optional, List, Any
-from datetime import date
+from typing import Optional, List, Any, Dict, Union
+from datetime import date, datetime
 
 from sqlalchemy.orm import Session
-from sqlalchemy import text, Integer, String, Float, Boolean, desc
+from sqlalchemy import text, Integer, String, Float, Boolean, desc, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from celery.utils.log import get_task_logger
 
 from app.crud.base import CRUDBase
 from app.models.track_prediction import Track_Prediction
 from app.schemas.track_prediction import TrackPredictionCreate, TrackPredictionUpdate
 from app import models
 
+logger = get_task_logger(__name__)
+
 
 class CRUDTrackPrediction(
     CRUDBase[Track_Prediction, TrackPredictionCreate, TrackPredictionUpdate]
@@ -87,5 +91,90 @@ class CRUDTrackPrediction(
             .all()
         )
 
+    def get_updated_since(
+        self,
+        db: Session,
+        *,
+        model_id: str,
+        since: Optional[datetime] = None,
+        after_track_id: Optional[str] = None,
+        limit: int = 100_000,
+    ) -> List[Any]:
+        """
+        Retrieve the (track_id, probability, date) of predictions made after `since`
+        (all predictions if None), ordered by (date, track_id). Pages continue after
+        the (date, track_id) of the previous page's last row, so predictions sharing
+        a date aren't skipped at a page boundary.
+        """
+        query = db.query(
+            Track_Prediction.track_id,
+            Track_Prediction.probability,
+            Track_Prediction.date,
+        ).filter(Track_Prediction.model_id == model_id)
+        if since is not None and after_track_id is not None:
+            query = query.filter(
+                tuple_(Track_Prediction.date, Track_Prediction.track_id)
+                > tuple_(since, after_track_id)
+            )
+        elif since is not None:
+            query = query.filter(Track_Prediction.date > since)
+        return (
+            query.order_by(Track_Prediction.date, Track_Prediction.track_id)
+            .limit(limit)
+            .all()
+        )
+
+    def upsert_multi(
+        self,
+        db: Session,
+        *,
+        objs_in: List[Union[TrackPredictionCreate, Dict[str, Any]]],
+        chunk_size: int = 10_000,
+    ) -> int:
+        """
+        Insert or update a batch of predictions in one transaction. Existing
+        (track_id, model_id) rows are only rewritten when the prediction or
+        probability changed.
+
+        Returns:
+            The number of inserted or updated rows.
+        """
+        rows = {}
+        for obj_in in objs_in:
+            obj_in = obj_in if isinstance(obj_in, dict) else obj_in.dict()
+            rows[(obj_in["track_id"], obj_in["model_id"])] = obj_in
+        rows = list(rows.values())
+        if not rows:
+            return 0
+
+        table = Track_Prediction.__table__
+        written = 0
+        try:
+            for i in range(0, len(rows), chunk_size):
+                stmt = insert(table).values(rows[i : i + chunk_size])  # noqa: E203
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[table.c.track_id, table.c.model_id],
+                    set_=dict(
+                        date=stmt.excluded.date,
+                        prediction=stmt.excluded.prediction,
+                        probability=stmt.excluded.probability,
+                    ),
+                    where=(
+                        table.c.prediction.is_distinct_from(stmt.excluded.prediction)
+                        | table.c.probability.is_distinct_from(
+                            stmt.excluded.probability
+                        )
+                    ),
+                )
+                written += len(
+                    db.execute(stmt.returning(table.c.track_id)).fetchall()
+                )
+            db.commit()
+        except Exception as err:  # noqa: F841
+            logger.warning(f"ERROR Upserting to {table.name} \n {err}")
+            db.rollback()
+            written = 0
+        return written
+
 
 track_prediction = CRUDTrackPrediction(Track_Prediction)
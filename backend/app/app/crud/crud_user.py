@@ -4,15 +4,157 @@ from sqlalchemy import text, String, Float, Integer
 from sqlalchemy.orm import Session
 from fastapi.encoders import jsonable_encoder
 
+from app.core.config import settings
 from app.core.security import get_password_hash, verify_password
 from app.db.session import session_scope
 from app.crud.base import CRUDBase
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
 from .crud_spotify_user import spotify_user
+from .crud_track_growth import track_growth
 from app.schemas.spotify_user import SpotifyUser
 
 
+def _rec_canidate_hits_cte(lag_period: int, days_since_release: int) -> str:
+    """
+    The user_tracks and canidate_hits CTEs shared by the user recommendation
+    queries. Expects a :spotify_id bind param.
+    """
+    if lag_period in settings.TRACK_METRIC_LAG_DAYS:
+        # One row per track, precomputed by the compute_track_metrics task.
+        pcnt = f"""
+            select tm.track_id,
+                t.isrc,
+                t.name,
+                t.album_id,
+                al.release_date,
+                t.preview_url,
+                tm.date,
+                tm.playcount,
+                tm.start_playcount,
+                tm.chg
+            from track_metric tm
+            join track t on t.id = tm.track_id
+            join album al on al.id = t.album_id
+            where tm.lag_days = {int(lag_period)}
+                and tm.date >= CURRENT_DATE - 1
+                and t.preview_url is not null
+                and al.release_date BETWEEN CURRENT_DATE - interval '{str(days_since_release)} days' AND CURRENT_DATE"""
+    else:
+        pcnt = f"""
+            select pc.track_id,
+                t.isrc,
+                t.name,
+                t.album_id,
+                al.release_date,
+                t.preview_url,
+                pc.date,
+                last_value(pc.playcount) OVER (PARTITION BY pc.track_id ORDER BY pc.date) playcount,
+                first_value(pc.playcount) OVER (PARTITION BY pc.track_id ORDER BY pc.date) start_playcount,
+                last_value(pc.playcount) OVER (PARTITION BY pc.track_id ORDER BY pc.date) - first_value(pc.playcount) OVER (PARTITION BY pc.track_id ORDER BY pc.date) chg
+            from track_playcount pc
+            join track t on t.id = pc.track_id
+            join album al on al.id = t.album_id
+            where playcount > 0
+                and pc.date >= CURRENT_DATE - interval '{str(lag_period)} days'
+                and t.preview_url is not null
+                and al.release_date BETWEEN CURRENT_DATE - interval '{str(days_since_release)} days' AND CURRENT_DATE"""
+    return f"""
+        with pcnt as ({pcnt}
+        ), filtered_pcnt as (
+            select pc.track_id id,
+                pc.isrc,
+                pc.name track_name,
+                pc.album_id,
+                pc.release_date,
+                pc.preview_url,
+                pc.date,
+                a.id artist_id,
+                a.name artist_name,
+                pc.playcount,
+                pc.start_playcount,
+                pc.chg,
+                ((cast(playcount as DOUBLE PRECISION) / cast(start_playcount as DOUBLE PRECISION)) - 1) growth_rate,
+                row_number() over (partition by pc.track_id order by pc.date desc) as row_num
+            from pcnt pc
+            join track_artist ta on ta.track_id = pc.track_id
+            join artist a on a.id = ta.artist_id
+            join genre_artist ga on ga.artist_id = a.id
+            where start_playcount is not null
+                and a.verified = true
+                and chg > 0
+                and pc.playcount BETWEEN 10000 AND 50000000
+                and 1 - (cast(chg as DOUBLE PRECISION) / cast(playcount as DOUBLE PRECISION)) >= 0.03
+                and ga.genre_id not in (
+                    'meditation',
+                    'musica de fondo',
+                    'pianissimo',
+                    'world meditation',
+                    'sleep',
+                    'background piano',
+                    'spa',
+                    'background',
+                    'atmosphere',
+                    'musica para ninos',
+                    'focus beats',
+                    'lo-fi beats'
+                )
+        ), final_tbl as (
+            select fp.id,
+                fp.isrc,
+                playcount,
+                chg,
+                growth_rate,
+                7 period_days,
+                prediction,
+                probability,
+                CASE
+                    WHEN probability < 0.3 THEN 1
+                    WHEN probability < 0.6 THEN 2
+                    WHEN probability < 0.9 THEN 3
+                    WHEN probability < 0.97 THEN 4
+                    WHEN probability <= 1.0 THEN 5
+                END musicai_score
+            from filtered_pcnt fp
+            join track_prediction tpred on tpred.track_id = fp.id
+            where row_num = 1
+                and tpred.model_id = 'CNNSpectrogramV2_2019-11-25_100'
+        ), reduce_identicals as (
+            select id,
+                isrc,
+                playcount,
+                chg,
+                growth_rate,
+                period_days,
+                prediction,
+                probability,
+                musicai_score,
+                (CAST(musicai_score as DOUBLE PRECISION) * growth_rate) rank_col,
+                row_number() over (partition by isrc order by musicai_score desc) as row_num
+            from final_tbl
+            where musicai_score between 4 and 5
+        ), user_tracks as (
+            select tu.track_id id
+            from track_user tu
+            where tu.user_id = :spotify_id
+        ), canidate_hits as (
+            select ri.id,
+                playcount,
+                chg,
+                growth_rate,
+                period_days,
+                prediction,
+                probability,
+                musicai_score,
+                rank_col
+            from reduce_identicals ri
+            left join user_tracks ut on ut.id = ri.id
+            where row_num = 1
+                and ut.id is null
+        )
+    """
+
+
 class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
     def get_by_email(self, db: Session, *, email: str) -> Optional[User]:
         return db.query(User).filter(User.email == email).first()
@@ -63,7 +205,7 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
                                 WHEN probability < 0.97 THEN 4
                                 WHEN probability <= 1.0 THEN 5
                             END musicai_score
-                        from track_rising_rolling_{lag_period} tr
+                        from ({track_growth.rising_sql(lag_period)}) tr
                         join track_prediction tpred on tpred.track_id = tr.track_id
                         where tpred.model_id = 'CNNSpectrogramV2_2019-11-25_100'
                     ) score_tr
@@ -107,7 +249,7 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
                 .columns(src_id=String, tgt_id=String,)
             )
         else:
-            stmt = """
+            stmt = f"""
                 with user_tracks as (
                     select tu.track_id
                     from track_user tu
@@ -133,7 +275,7 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
                                 WHEN probability < 0.97 THEN 4
                                 WHEN probability <= 1.0 THEN 5
                             END musicai_score
-                        from track_rising_rolling_7 tr
+                        from ({track_growth.rising_sql(7)}) tr
                         join track_prediction tpred on tpred.track_id = tr.track_id
                         where tpred.model_id = 'CNNSpectrogramV2_2019-11-25_100'
                     ) score_tr
@@ -190,120 +332,14 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         skip: int = 0,
     ) -> List[Dict[str, str]]:
         """
-        Retrieve track  <> hit track pairs that aren't in the
-        track_distance table.
+        Retrieve the canidate hit tracks closest to the user's tracks using the
+        precomputed track_distance table.
         """
         # TODO: refactor to use rising tracks materialized view
-        stmt = f"""
-            with pcnt as (
-                select pc.track_id,
-                    t.isrc,
-                    t.name,
-                    t.album_id,
-                    al.release_date,
-                    t.preview_url,
-                    pc.date,
-                    last_value(pc.playcount) OVER (PARTITION BY pc.track_id ORDER BY pc.date) playcount,
-                    first_value(pc.playcount) OVER (PARTITION BY pc.track_id ORDER BY pc.date) start_playcount,
-                    last_value(pc.playcount) OVER (PARTITION BY pc.track_id ORDER BY pc.date) - first_value(pc.playcount) OVER (PARTITION BY pc.track_id ORDER BY pc.date) chg
-                from track_playcount pc
-                join track t on t.id = pc.track_id
-                join album al on al.id = t.album_id
-                where playcount > 0
-                    and pc.date >= CURRENT_DATE - interval '{str(lag_period)} days'
-                    and t.preview_url is not null
-                    and al.release_date BETWEEN CURRENT_DATE - interval '{str(days_since_release)} days' AND CURRENT_DATE
-            ), filtered_pcnt as (
-                select pc.track_id id,
-                    pc.isrc,
-                    pc.name track_name,
-                    pc.album_id,
-                    pc.release_date,
-                    pc.preview_url,
-                    pc.date,
-                    a.id artist_id,
-                    a.name artist_name,
-                    pc.playcount,
-                    pc.start_playcount,
-                    pc.chg,
-                    ((cast(playcount as DOUBLE PRECISION) / cast(start_playcount as DOUBLE PRECISION)) - 1) growth_rate,
-                    row_number() over (partition by pc.track_id order by pc.date desc) as row_num
-                from pcnt pc
-                join track_artist ta on ta.track_id = pc.track_id
-                join artist a on a.id = ta.artist_id
-                join genre_artist ga on ga.artist_id = a.id
-                where start_playcount is not null
-                    and a.verified = true
-                    and chg > 0
-                    and pc.playcount BETWEEN 10000 AND 50000000
-                    and 1 - (cast(chg as DOUBLE PRECISION) / cast(playcount as DOUBLE PRECISION)) >= 0.03
-                    and ga.genre_id not in (
-                        'meditation',
-                        'musica de fondo',
-                        'pianissimo',
-                        'world meditation',
-                        'sleep',
-                        'background piano',
-                        'spa',
-                        'background',
-                        'atmosphere',
-                        'musica para ninos',
-                        'focus beats',
-                        'lo-fi beats'
-                    )
-            ), final_tbl as (
-                select fp.id,
-                    fp.isrc,
-                    playcount,
-                    chg,
-                    growth_rate,
-                    7 period_days,
-                    prediction,
-                    probability,
-                    CASE
-                        WHEN probability < 0.3 THEN 1
-                        WHEN probability < 0.6 THEN 2
-                        WHEN probability < 0.9 THEN 3
-                        WHEN probability < 0.97 THEN 4
-                        WHEN probability <= 1.0 THEN 5
-                    END musicai_score
-                from filtered_pcnt fp
-                join track_prediction tpred on tpred.track_id = fp.id
-                where row_num = 1
-                    and tpred.model_id = 'CNNSpectrogramV2_2019-11-25_100'
-            ), reduce_identicals as (
-                select id,
-                    isrc,
-                    playcount,
-                    chg,
-                    growth_rate,
-                    period_days,
-                    prediction,
-                    probability,
-                    musicai_score,
-                    (CAST(musicai_score as DOUBLE PRECISION) * growth_rate) rank_col,
-                    row_number() over (partition by isrc order by musicai_score desc) as row_num
-                from final_tbl
-                where musicai_score between 4 and 5
-            ), user_tracks as (
-                select tu.track_id id
-                from track_user tu
-                where tu.user_id = '{spotify_id}'
-            ), canidate_hits as (
-                select ri.id,
-                    playcount,
-                    chg,
-                    growth_rate,
-                    period_days,
-                    prediction,
-                    probability,
-                    musicai_score,
-                    rank_col
-                from reduce_identicals ri
-                left join user_tracks ut on ut.id = ri.id
-                where row_num = 1
-                    and ut.id is null
-            ) select
+        stmt = (
+            _rec_canidate_hits_cte(lag_period, days_since_release)
+            + """
+            select
                 ch.id id,
                 CAST(avg(td.distance) as INTEGER) avg_distance,
                 CAST(PERCENTILE_CONT(0.5) WITHIN GROUP(ORDER BY distance) as INTEGER) median
@@ -322,13 +358,43 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
             order by median, avg_distance
             limit :limit offset :skip;
         """
+        )
         stmt = (
             text(stmt)
-            .bindparams(limit=limit, skip=skip,)
+            .bindparams(spotify_id=spotify_id, limit=limit, skip=skip,)
             .columns(id=String, avg_distance=Integer, median=Integer)
         )
         return [jsonable_encoder(row) for row in db.execute(stmt).fetchall()]
 
+    def get_canidate_hits_for_user(
+        self,
+        db: Session,
+        *,
+        spotify_id: str,
+        lag_period: int = 7,
+        days_since_release: int = 180,
+        limit: int = 10_000,
+    ) -> List[str]:
+        """
+        Retrieve the ids of the rising hit tracks that are canidate recommendations
+        for the user (tracks not in their library), best ranked first.
+        """
+        stmt = (
+            _rec_canidate_hits_cte(lag_period, days_since_release)
+            + """
+            select ch.id
+            from canidate_hits ch
+            order by ch.rank_col desc
+            limit :limit;
+        """
+        )
+        stmt = (
+            text(stmt)
+            .bindparams(spotify_id=spotify_id, limit=limit)
+            .columns(id=String)
+        )
+        return [row.id for row in db.execute(stmt).fetchall()]
+
     def create(self, db: Session, *, obj_in: UserCreate) -> User:
         db_obj = User(
             email=obj_in.email,
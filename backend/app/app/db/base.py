@@ -29,5 +29,8 @@ from app.models.genre_artist import Genre_Artist  # noqa
 from app.models.city_artist import City_Artist  # noqa
 from app.models.track_distance import Track_Distance  # noqa
 from app.models.track_prediction import Track_Prediction  # noqa
+from app.models.track_embedding import Track_Embedding  # noqa
+from app.models.track_growth import Track_Growth  # noqa
+from app.models.track_metric import Track_Metric  # noqa
 from app.models.spectrogram import Spectrogram  # noqa
 from app.models.musicai_playlist import Musicai_Playlist  # noqa
@@ -22,3 +22,10 @@ def init_db(db: Session) -> None:
             is_superuser=True,
         )
         user = crud.user.create(db, obj_in=user_in)  # noqa: F841
+
+    # track_playcount is partitioned by month and has no default partition, so
+    # playcounts can only be pushed once their month's partition exists. Create
+    # them now rather than waiting for the first maintain_track_playcount run.
+    crud.track_playcount.ensure_partitions(
+        db, months_ahead=settings.TRACK_PLAYCOUNT_PARTITIONS_AHEAD
+    )
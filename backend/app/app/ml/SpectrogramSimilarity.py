@@ -1,4 +1,4 @@
-from typing import Optional, List, Any, Union
+from typing import Optional, List, Any, Union, Tuple
 
 import shelve
 from datetime import datetime
@@ -14,6 +14,9 @@ from celery.utils.log import get_task_logger
 from tqdm import tqdm
 
 from app.ml.models import MODEL_DICT
+from app.ml.inference import inference_context
+from app.ml.distance import pair_distances
+from app.ml import runtime as ml_runtime
 from app.db.session import session_scope
 
 # from app.spotify.spectrogram import download_spectrogram, upload_spectrogram
@@ -39,6 +42,8 @@ class SpectrogramSimilarity:
         date_trained: datetime = None,
         epochs: int = None,
         extra_metadata: str = None,
+        runtime: str = settings.INFERENCE_RUNTIME,
+        quantize: bool = settings.INFERENCE_QUANTIZE,
     ):
         self.cuda = torch.cuda.is_available()
         print("gpu available :", self.cuda)
@@ -52,6 +57,9 @@ class SpectrogramSimilarity:
         self.date_trained = date_trained
         self.epochs = epochs
         self.extra_metadata = extra_metadata
+        self.runtime = runtime
+        self.quantize = quantize
+        self._compiled = None
 
     @classmethod
     def load(cls, saved_model_path: str):
@@ -94,17 +102,59 @@ class SpectrogramSimilarity:
                     return ((t1_feats - t2_feats) ** 2).sum()
                 except Exception as e:
                     raise (e)
+            elif distance_type == "cosine":
+                t1_feats, t2_feats = t1_feats.view(-1), t2_feats.view(-1)
+                return 1 - torch.nn.functional.cosine_similarity(
+                    t1_feats, t2_feats, dim=0
+                )
             # if tid1 != self.last_tid:
             # self.last_tid = tid1
             # self.last_feat = self.shelve[tid1]
             # return torch.sum((self.last_feat - self.shelve[tid2]) ** 2)
 
+    def calculate_pair_distances(
+        self,
+        embeddings: Union[np.ndarray, torch.Tensor],
+        src_index: Union[np.ndarray, List[int]],
+        tgt_index: Union[np.ndarray, List[int]],
+        distance_type: Optional[str] = settings.DISTANCE_TYPE,
+    ) -> np.ndarray:
+        """
+        See app.ml.distance.pair_distances.
+        """
+        if isinstance(embeddings, torch.Tensor):
+            embeddings = embeddings.detach().cpu().numpy()
+        return pair_distances(embeddings, src_index, tgt_index, distance_type)
+
+    @property
+    def compiled(self) -> Optional[ml_runtime.CompiledModel]:
+        """
+        The optimized cpu runtime for the model, None when running eagerly (eager
+        runtime, cuda, or a model the runtime doesn't support).
+        """
+        if self._compiled is None and self.use_compiled:
+            self._compiled = ml_runtime.CompiledModel(
+                self.model, quantize=self.quantize
+            )
+        return self._compiled
+
+    @property
+    def use_compiled(self) -> bool:
+        return (
+            self.runtime != "eager"
+            and not self.cuda
+            and ml_runtime.supports(self.model)
+        )
+
     def get_features(self, data: np.ndarray) -> torch.Tensor:
         self.model.eval()
-        with torch.no_grad():
+        compiled = self.compiled  # built outside inference mode
+        with inference_context():
             if data.ndim == 2:
                 data = np.expand_dims(data, 0)
             data = torch.Tensor(data).to(self.device).float()
+            if compiled is not None:
+                return compiled.features(data)
             return self.model.output_features(data).to(self.device)
 
     def get_predictions(
@@ -116,10 +166,36 @@ class SpectrogramSimilarity:
             data = np.array(data)
 
         self.model.eval()
-        with torch.no_grad():
+        compiled = self.compiled  # built outside inference mode
+        with inference_context():
             data = torch.Tensor(data).to(self.device).float()
+            if compiled is not None:
+                return compiled.probabilities(data)
             return self.model.output_probabilities(data).to(self.device)
 
+    def get_scores(
+        self, data: Union[np.ndarray, List[np.ndarray]]
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Hit probabilities and embedding features from a single forward pass.
+
+        Returns:
+            (probabilities, features), matching get_predictions and get_features.
+        """
+        if isinstance(data, list):
+            data = np.array(data)
+        if data.ndim == 2:
+            data = np.expand_dims(data, 0)
+
+        self.model.eval()
+        compiled = self.compiled  # built outside inference mode
+        with inference_context():
+            data = torch.Tensor(data).to(self.device).float()
+            if compiled is not None:
+                return compiled.scores(data)
+            out = self.model.get_dict(data)
+            return torch.sigmoid(out["linear"]), out["flatten"]
+
     def open_shelve(self, sp):
         self.shelve = shelve.open(sp)
 
@@ -204,9 +280,6 @@ class SpectrogramSimilarity:
         return matrix
 
 
-spec_model = SpectrogramSimilarity.load(saved_model_path=settings.MODEL_WEIGHTS)
-
-
 # @app.task(bind=True)
 # def test_similarity(n=150, m=1000):
 #     t = SpectrogramSimilarity.load(
@@ -1 +1,9 @@
-from .SpectrogramSimilarity import spec_model
+from .registry import model_registry
+from .server import get_model
+
+
+def __getattr__(name: str):
+    # Kept for `from app.ml import spec_model`, which now loads the default model.
+    if name == "spec_model":
+        return model_registry.get()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,286 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import copy
+
+import numpy as np
+
+
+class IVFIndex:
+    """
+    An in-memory inverted file (IVF) index over track embeddings.
+
+    Vectors are bucketed by their nearest k-means centroid, and a query only scans
+    the buckets whose centroids are closest to it. Vectors can be added and removed
+    at any time. The centroids are retrained once the index has grown by
+    `retrain_growth` since the last training. Until the index holds enough vectors
+    to train, every search is exact.
+
+    Distances follow SpectrogramSimilarity.calculate_distance: "euclidean" is the
+    squared euclidean distance and "cosine" is 1 - cosine similarity.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        *,
+        distance_type: str = "euclidean",
+        n_lists: Optional[int] = None,
+        n_probe: int = 8,
+        min_train_size: int = 1_024,
+        retrain_growth: float = 2.0,
+        kmeans_iters: int = 10,
+        seed: int = 0,
+    ):
+        if distance_type not in ("euclidean", "cosine"):
+            raise ValueError(f"Unsupported distance type: {distance_type}")
+        self.dim = dim
+        self.distance_type = distance_type
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.min_train_size = min_train_size
+        self.retrain_growth = retrain_growth
+        self.kmeans_iters = kmeans_iters
+        self._rng = np.random.default_rng(seed)
+
+        self._ids: List[str] = []
+        self._pos: Dict[str, int] = {}
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._sq_norms = np.zeros(0, dtype=np.float32)
+        self._assign = np.zeros(0, dtype=np.int64)
+        self._centroids: Optional[np.ndarray] = None
+        self._trained_size = 0
+        # Row order sorted by list, rebuilt lazily after add/remove.
+        self._list_rows: Optional[np.ndarray] = None
+        self._list_bounds: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, track_id: str) -> bool:
+        return track_id in self._pos
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if self.distance_type == "cosine":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = np.divide(
+                vectors, norms, out=np.zeros_like(vectors), where=norms > 0
+            )
+        return vectors
+
+    def _nearest_centroids(self, vectors: np.ndarray) -> np.ndarray:
+        c_sq = np.einsum("ij,ij->i", self._centroids, self._centroids)
+        return np.argmin(c_sq[None, :] - 2.0 * vectors @ self._centroids.T, axis=1)
+
+    def add(self, track_ids: Iterable[str], vectors: np.ndarray) -> None:
+        """
+        Add (or replace) the vectors of the given track ids.
+        """
+        track_ids = list(track_ids)
+        vectors = self._prepare(vectors)
+        if len(track_ids) != vectors.shape[0]:
+            raise ValueError("track_ids and vectors must be the same length!")
+        if not track_ids:
+            return
+
+        # Replace existing vectors in place, append the new ones (last one wins).
+        latest = {tid: i for i, tid in enumerate(track_ids)}
+        for tid, i in latest.items():
+            if tid in self._pos:
+                self._vectors[self._pos[tid]] = vectors[i]
+        new_ids = [tid for tid in latest if tid not in self._pos]
+        new_rows = [latest[tid] for tid in new_ids]
+        start = len(self._ids)
+        for offset, tid in enumerate(new_ids):
+            self._pos[tid] = start + offset
+        self._ids.extend(new_ids)
+        self._vectors = np.concatenate([self._vectors, vectors[new_rows]])
+        self._sq_norms = np.einsum("ij,ij->i", self._vectors, self._vectors)
+
+        if self._should_train():
+            self.train()
+        elif self.is_trained:
+            self._assign = np.concatenate(
+                [self._assign, np.zeros(len(new_ids), dtype=np.int64)]
+            )
+            rows = np.array([self._pos[tid] for tid in latest])
+            self._assign[rows] = self._nearest_centroids(self._vectors[rows])
+        self._list_rows = None
+
+    def remove(self, track_ids: Iterable[str]) -> int:
+        """
+        Remove the vectors of the given track ids.
+
+        Returns:
+            The number of removed vectors.
+        """
+        rows = sorted(
+            (self._pos.pop(tid) for tid in set(track_ids) if tid in self._pos),
+            reverse=True,
+        )
+        if not rows:
+            return 0
+        keep = np.ones(len(self._ids), dtype=bool)
+        keep[rows] = False
+        for row in rows:
+            del self._ids[row]
+        self._pos = {tid: i for i, tid in enumerate(self._ids)}
+        self._vectors = self._vectors[keep]
+        self._sq_norms = self._sq_norms[keep]
+        if self.is_trained:
+            self._assign = self._assign[keep]
+        self._list_rows = None
+        return len(rows)
+
+    def copy(self) -> "IVFIndex":
+        """
+        A deep copy of the index, eg to update while searches read the original.
+        """
+        return copy.deepcopy(self)
+
+    def build_lists(self) -> None:
+        """
+        Build the inverted lists now rather than on the next search, so concurrent
+        searches of an index that is no longer updated don't race to build them.
+        """
+        if self.is_trained and self._list_rows is None:
+            self._build_lists()
+
+    def _should_train(self) -> bool:
+        if len(self) < self.min_train_size:
+            return False
+        if not self.is_trained:
+            return True
+        return len(self) >= self._trained_size * self.retrain_growth
+
+    def train(self) -> None:
+        """
+        Fit the coarse quantizer with k-means (k-means++ init) and reassign every
+        vector to its nearest centroid.
+        """
+        n = len(self)
+        if n == 0:
+            return
+        n_lists = self.n_lists or int(np.clip(np.sqrt(n), 1, 1_024))
+        n_lists = min(n_lists, n)
+        sample_size = min(n, n_lists * 256)
+        sample = self._vectors[self._rng.choice(n, size=sample_size, replace=False)]
+        sample_sq = np.einsum("ij,ij->i", sample, sample)
+
+        def sq_dists(centroid: np.ndarray) -> np.ndarray:
+            dists = sample_sq - 2.0 * sample @ centroid + centroid @ centroid
+            return np.maximum(dists, 0.0).astype(np.float64)
+
+        centroids = np.empty((n_lists, self.dim), dtype=np.float32)
+        centroids[0] = sample[self._rng.integers(sample_size)]
+        closest = sq_dists(centroids[0])
+        for c in range(1, n_lists):
+            total = closest.sum()
+            if total <= 0:
+                # Fewer distinct vectors than lists, fill the rest at random.
+                picks = self._rng.integers(sample_size, size=n_lists - c)
+                centroids[c:] = sample[picks]
+                break
+            centroids[c] = sample[self._rng.choice(sample_size, p=closest / total)]
+            closest = np.minimum(closest, sq_dists(centroids[c]))
+
+        self._centroids = centroids
+        for _ in range(self.kmeans_iters):
+            labels = self._nearest_centroids(sample)
+            counts = np.bincount(labels, minlength=n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        if self.distance_type == "cosine":
+            centroids = self._prepare(centroids)
+        self._centroids = centroids
+        self._assign = self._nearest_centroids(self._vectors)
+        self._trained_size = n
+        self._list_rows = None
+
+    def _build_lists(self) -> None:
+        self._list_rows = np.argsort(self._assign, kind="stable")
+        self._list_bounds = np.searchsorted(
+            self._assign[self._list_rows], np.arange(len(self._centroids) + 1)
+        )
+
+    def _candidate_rows(self, queries: np.ndarray, n_probe: int) -> np.ndarray:
+        if not self.is_trained:
+            return np.arange(len(self))
+        if self._list_rows is None:
+            self._build_lists()
+        n_probe = min(n_probe, len(self._centroids))
+        c_sq = np.einsum("ij,ij->i", self._centroids, self._centroids)
+        c_dists = c_sq[None, :] - 2.0 * queries @ self._centroids.T
+        probed = np.unique(np.argpartition(c_dists, n_probe - 1, axis=1)[:, :n_probe])
+        return np.concatenate(
+            [
+                self._list_rows[self._list_bounds[c] : self._list_bounds[c + 1]]  # noqa
+                for c in probed
+            ]
+        )
+
+    def _distances(self, rows: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        q_sq = np.einsum("ij,ij->i", queries, queries)
+        dists = self._sq_norms[rows, None] + q_sq[None, :]
+        dists -= 2.0 * self._vectors[rows] @ queries.T
+        dists = np.maximum(dists, 0.0)
+        if self.distance_type == "cosine":
+            # Unit vectors: ||a - b||^2 = 2 - 2 cos(a, b)
+            dists *= 0.5
+        return dists
+
+    def search_set(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        *,
+        n_probe: Optional[int] = None,
+        allowed_ids: Optional[Set[str]] = None,
+        exclude_ids: Optional[Set[str]] = None,
+    ) -> List[Tuple[str, float, float]]:
+        """
+        Find the k indexed tracks closest to a set of query vectors (e.g. a user's
+        tracks), ranked by their median and then mean distance to the set.
+
+        Returns:
+            A list of (track_id, median_distance, mean_distance) tuples.
+        """
+        queries = self._prepare(queries)
+        if len(self) == 0 or queries.shape[0] == 0 or k <= 0:
+            return []
+
+        def filter_rows(rows: np.ndarray) -> np.ndarray:
+            if allowed_ids is None and not exclude_ids:
+                return rows
+            return np.array(
+                [
+                    r
+                    for r in rows
+                    if (allowed_ids is None or self._ids[r] in allowed_ids)
+                    and not (exclude_ids and self._ids[r] in exclude_ids)
+                ],
+                dtype=np.int64,
+            )
+
+        rows = filter_rows(self._candidate_rows(queries, n_probe or self.n_probe))
+        if rows.size < k and self.is_trained:
+            # Not enough neighbours in the probed lists, scan everything.
+            rows = filter_rows(np.arange(len(self)))
+        if rows.size == 0:
+            return []
+
+        dists = self._distances(rows, queries)
+        median, mean = np.median(dists, axis=1), dists.mean(axis=1)
+        if rows.size > k:
+            top = np.argpartition(median, k - 1)[:k]
+            # Keep every row tied with the k-th median so the mean breaks ties.
+            top = np.flatnonzero(median <= median[top].max())
+        else:
+            top = np.arange(rows.size)
+        top = top[np.lexsort((mean[top], median[top]))][:k]
+        return [(self._ids[rows[i]], float(median[i]), float(mean[i])) for i in top]
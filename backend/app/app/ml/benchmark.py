@@ -0,0 +1,61 @@
+"""
+Tracks per second of the eager model vs the optimized runtime (ml/runtime.py) on
+random spectrograms.
+
+    python -m app.ml.benchmark --batch-size 32 --batches 10 [--weights <path>]
+"""
+from typing import Callable, List, Optional
+import argparse
+import time
+
+import torch
+
+from app.ml import runtime
+from app.ml.inference import configure_threads
+from app.ml.models import CNN_SpectrogramV2
+
+
+def tracks_per_sec(
+    fn: Callable[[torch.Tensor], torch.Tensor], batch: torch.Tensor, batches: int
+) -> float:
+    fn(batch)  # warm up (first traced calls are slower)
+    start = time.perf_counter()
+    for _ in range(batches):
+        fn(batch)
+    return batch.shape[0] * batches / (time.perf_counter() - start)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--weights", help="saved model (random weights if unset)")
+    args = parser.parse_args(argv)
+
+    print(f"threads: {configure_threads()}")
+    if args.weights:
+        from app.ml.SpectrogramSimilarity import SpectrogramSimilarity
+
+        model = SpectrogramSimilarity.load(saved_model_path=args.weights).model
+    else:
+        model = CNN_SpectrogramV2(output_dims=1)
+    model = model.cpu().eval()
+    batch = torch.randn(args.batch_size, 96, 1765)
+
+    compiled = runtime.CompiledModel(model)
+    quantized = runtime.CompiledModel(model, quantize=True)
+    candidates = {
+        "eager probabilities": model.output_probabilities,
+        "eager features": model.output_features,
+        "torchscript probabilities": compiled.probabilities,
+        "torchscript features": compiled.features,
+        "torchscript int8 probabilities": quantized.probabilities,
+    }
+    with torch.no_grad():
+        for name, fn in candidates.items():
+            rate = tracks_per_sec(fn, batch, args.batches)
+            print(f"{name:<32} {rate:8.1f} tracks/sec")
+
+
+if __name__ == "__main__":
+    main()
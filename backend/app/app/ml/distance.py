@@ -0,0 +1,61 @@
+from typing import List, Optional, Union
+
+import numpy as np
+
+from app.core.config import settings
+
+
+def pair_distances(
+    embeddings: np.ndarray,
+    src_index: Union[np.ndarray, List[int]],
+    tgt_index: Union[np.ndarray, List[int]],
+    distance_type: Optional[str] = settings.DISTANCE_TYPE,
+) -> np.ndarray:
+    """
+    Calculate the distances for many track pairs in one vectorized call.
+
+    `embeddings` is an (N x D) matrix holding one embedding per track, and
+    `src_index`/`tgt_index` hold the embedding row of the source and target
+    track of each pair. Euclidean distances are squared (like
+    SpectrogramSimilarity.calculate_distance) and expanded as
+    ||a||^2 + ||b||^2 - 2ab, so each norm is computed once per track instead of
+    once per pair.
+
+    Returns:
+        A float64 array where result[i] is the distance of the i-th pair.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float64)
+    embeddings = embeddings.reshape(embeddings.shape[0], -1)
+    src_index = np.asarray(src_index, dtype=np.int64)
+    tgt_index = np.asarray(tgt_index, dtype=np.int64)
+    if src_index.shape != tgt_index.shape:
+        raise ValueError("src_index and tgt_index must be the same length!")
+    if distance_type not in ("euclidean", "cosine"):
+        raise ValueError(f"Unsupported distance type: {distance_type}")
+    if src_index.size == 0:
+        return np.zeros(0, dtype=np.float64)
+
+    sq_norms = np.einsum("ij,ij->i", embeddings, embeddings)
+
+    # Pairs usually form a (user tracks x canidate hits) grid, so a single
+    # matmul between the unique sources and targets is the cheapest way to get
+    # every dot product. Fall back to row-wise dots for sparse pair lists.
+    src_rows, src_pos = np.unique(src_index, return_inverse=True)
+    tgt_rows, tgt_pos = np.unique(tgt_index, return_inverse=True)
+    if src_rows.size * tgt_rows.size <= 4 * src_index.size:
+        gram = embeddings[src_rows] @ embeddings[tgt_rows].T
+        dots = gram[src_pos, tgt_pos]
+    else:
+        dots = np.einsum(
+            "ij,ij->i", embeddings[src_index], embeddings[tgt_index]
+        )
+
+    if distance_type == "euclidean":
+        distances = sq_norms[src_index] + sq_norms[tgt_index] - 2.0 * dots
+        # Round off can push near identical pairs slightly below zero.
+        return np.maximum(distances, 0.0)
+
+    norms = np.sqrt(sq_norms)
+    denom = norms[src_index] * norms[tgt_index]
+    similarity = np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+    return 1.0 - np.clip(similarity, -1.0, 1.0)
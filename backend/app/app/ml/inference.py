@@ -0,0 +1,173 @@
+from typing import Any, Iterable, Iterator, List, Optional, Tuple, Callable
+from contextlib import contextmanager
+import os
+import time
+
+import numpy as np
+from celery.utils.log import get_task_logger
+
+from app.core.config import settings
+
+
+logger = get_task_logger(__name__)
+
+_num_threads: Optional[int] = None
+
+
+def configure_threads(
+    num_threads: Optional[int] = settings.INFERENCE_NUM_THREADS,
+) -> int:
+    """
+    Pin the number of intra-op threads torch uses for CPU inference. Defaults to
+    the number of cpus. Only the first call per process has any effect, since
+    torch can't resize its thread pool once work has started.
+    """
+    import torch
+
+    global _num_threads
+    if _num_threads is None:
+        _num_threads = num_threads or os.cpu_count() or 1
+        torch.set_num_threads(_num_threads)
+    return _num_threads
+
+
+@contextmanager
+def inference_context():
+    """
+    torch.inference_mode when the installed torch has it, else torch.no_grad.
+    """
+    import torch
+
+    mode = getattr(torch, "inference_mode", None)
+    with (mode() if mode is not None else torch.no_grad()):
+        yield
+
+
+def to_numpy(output: Any) -> np.ndarray:
+    """
+    Model output (a torch tensor, or an array from the inference server) as numpy.
+    """
+    if isinstance(output, np.ndarray):
+        return output
+    return output.detach().cpu().numpy()
+
+
+class AdaptiveBatchSizer:
+    """
+    Pick the batch size for the next forward pass from how long the last one took.
+
+    The size doubles while batches finish under target_seconds and halves when a
+    batch overshoots it (or runs out of memory), staying between min_size and
+    max_size.
+    """
+
+    def __init__(
+        self,
+        initial_size: int = settings.INFERENCE_BATCH_SIZE,
+        min_size: int = 1,
+        max_size: int = settings.INFERENCE_MAX_BATCH_SIZE,
+        target_seconds: float = settings.INFERENCE_TARGET_BATCH_SECONDS,
+    ):
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size)
+        self.size = int(np.clip(initial_size, self.min_size, self.max_size))
+        self.target_seconds = target_seconds
+
+    def update(self, batch_size: int, elapsed: float) -> int:
+        if batch_size < self.size:
+            # A partial (last) batch says nothing about the full size.
+            return self.size
+        if elapsed < self.target_seconds / 2:
+            self.size = min(self.size * 2, self.max_size)
+        elif elapsed > self.target_seconds:
+            self.size = max(self.size // 2, self.min_size)
+        return self.size
+
+    def shrink(self) -> int:
+        self.size = max(self.size // 2, self.min_size)
+        return self.size
+
+
+class InferenceStats:
+    """
+    Running totals for an inference run.
+    """
+
+    def __init__(self):
+        self.tracks = 0
+        self.batches = 0
+        self.model_seconds = 0.0
+        self.started = time.perf_counter()
+
+    @property
+    def seconds(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def tracks_per_sec(self) -> float:
+        return self.tracks / self.seconds if self.seconds > 0 else 0.0
+
+    def dict(self) -> dict:
+        return dict(
+            tracks=self.tracks,
+            batches=self.batches,
+            seconds=round(self.seconds, 3),
+            model_seconds=round(self.model_seconds, 3),
+            tracks_per_sec=round(self.tracks_per_sec, 2),
+        )
+
+
+def run_batched(
+    predict: Callable[[np.ndarray], Any],
+    items: Iterable[Tuple[str, np.ndarray]],
+    sizer: Optional[AdaptiveBatchSizer] = None,
+    stats: Optional[InferenceStats] = None,
+) -> Iterator[Tuple[List[str], Any]]:
+    """
+    Run `predict` over a stream of (track_id, spectrogram) items in adaptive-size
+    batches. `predict` returns a tensor, or a tuple of tensors (eg,
+    SpectrogramSimilarity.get_scores).
+
+    Yields:
+        (track_ids, outputs) for each batch, outputs[i] belonging to track_ids[i]
+        (for tuples, each array's i-th row).
+    """
+    configure_threads()
+    sizer = sizer or AdaptiveBatchSizer()
+    stats = stats or InferenceStats()
+    buffer_ids: List[str] = []
+    buffer_specs: List[np.ndarray] = []
+
+    def flush(drain: bool = False) -> Iterator[Tuple[List[str], Any]]:
+        while buffer_ids and (drain or len(buffer_ids) >= sizer.size):
+            n = min(sizer.size, len(buffer_ids))
+            batch = np.stack(buffer_specs[:n]).astype(np.float32, copy=False)
+            start = time.perf_counter()
+            try:
+                with inference_context():
+                    outputs = predict(batch)
+                    if isinstance(outputs, tuple):
+                        outputs = tuple(to_numpy(o) for o in outputs)
+                    else:
+                        outputs = to_numpy(outputs)
+            except (RuntimeError, MemoryError) as err:
+                if n <= sizer.min_size:
+                    raise
+                logger.warning(f"Inference batch of {n} failed, shrinking ({err})")
+                sizer.shrink()
+                continue
+            elapsed = time.perf_counter() - start
+            ids = buffer_ids[:n]
+            del buffer_ids[:n]
+            del buffer_specs[:n]
+            stats.tracks += n
+            stats.batches += 1
+            stats.model_seconds += elapsed
+            sizer.update(n, elapsed)
+            yield ids, outputs
+
+    for track_id, spec in items:
+        buffer_ids.append(track_id)
+        buffer_specs.append(spec)
+        yield from flush()
+    yield from flush(drain=True)
@@ -0,0 +1,94 @@
+from typing import Callable, Dict, List, Optional, TYPE_CHECKING
+from collections import OrderedDict
+from pathlib import Path
+import threading
+import time
+
+from celery.utils.log import get_task_logger
+
+from app.core.config import settings
+
+if TYPE_CHECKING:  # pragma: no cover
+    from app.ml.SpectrogramSimilarity import SpectrogramSimilarity
+
+
+logger = get_task_logger(__name__)
+
+
+def _load_weights(weights_path: str) -> "SpectrogramSimilarity":
+    from app.ml.SpectrogramSimilarity import SpectrogramSimilarity
+
+    return SpectrogramSimilarity.load(saved_model_path=weights_path)
+
+
+class ModelRegistry:
+    """
+    Resolves a model_id to its weights file and loads SpectrogramSimilarity
+    instances on first use, keeping the max_models most recently used in memory.
+
+    Models are not loaded at import time, so processes that never run inference
+    (the api, most workers) don't import torch or read any weights. Workers that
+    do can preload() before forking (see worker.py) so prefork children share the
+    weights copy-on-write.
+    """
+
+    def __init__(
+        self,
+        default_model_id: str = settings.MODEL_ID,
+        default_weights: str = settings.MODEL_WEIGHTS,
+        weights_dir: Optional[str] = settings.MODEL_WEIGHTS_DIR,
+        max_models: int = settings.MODEL_CACHE_SIZE,
+        loader: Callable[[str], "SpectrogramSimilarity"] = _load_weights,
+    ):
+        self.default_model_id = default_model_id
+        self.default_weights = default_weights
+        self.weights_dir = Path(weights_dir or Path(default_weights).parent)
+        self.max_models = max(max_models, 1)
+        self.loader = loader
+        self._models: Dict[str, "SpectrogramSimilarity"] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> List[str]:
+        return list(self._models.keys())
+
+    def weights_path(self, model_id: str) -> str:
+        """
+        The weights file for a model id, `<weights_dir>/<model_id><suffix>`
+        (the suffix of the default weights, eg .pt).
+        """
+        if model_id == self.default_model_id:
+            return self.default_weights
+        path = self.weights_dir / f"{model_id}{Path(self.default_weights).suffix}"
+        if not path.exists():
+            raise FileNotFoundError(f"No weights found for model {model_id}: {path}")
+        return str(path)
+
+    def get(self, model_id: Optional[str] = None) -> "SpectrogramSimilarity":
+        model_id = model_id or self.default_model_id
+        with self._lock:
+            model = self._models.get(model_id)
+            if model is not None:
+                self._models.move_to_end(model_id)
+                return model
+
+            weights_path = self.weights_path(model_id)
+            start = time.perf_counter()
+            model = self.loader(weights_path)
+            logger.info(
+                f"Loaded model {model_id} in {time.perf_counter() - start:.2f}s"
+            )
+            self._models[model_id] = model
+            while len(self._models) > self.max_models:
+                evicted, _ = self._models.popitem(last=False)
+                logger.info(f"Evicted model {evicted}")
+            return model
+
+    def preload(self, model_ids: Optional[List[str]] = None) -> None:
+        for model_id in model_ids or [self.default_model_id]:
+            model = self.get(model_id)
+            # Build the optimized runtime now too, so it's shared after the fork.
+            getattr(model, "compiled", None)
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,165 @@
+"""
+Optimized CPU inference runtime for CNN_SpectrogramV2.
+
+The eager model builds a dict of every intermediate activation per call and
+always runs the final linear layer. The runtime instead:
+
+    - folds each BatchNorm into the conv layer before it,
+    - runs the conv stack as one plain Sequential (features-only head), with the
+      linear layer + sigmoid only on the probabilities and scores heads (the
+      scores head returns probabilities and features from one pass),
+    - optionally quantizes the linear layer to int8 (dynamic quantization),
+    - traces the heads with TorchScript.
+"""
+from typing import Tuple
+import copy
+
+import torch
+
+from app.ml.models import CNN_SpectrogramV2
+
+
+RUNTIMES = ("eager", "torchscript")
+
+FEATURE_LAYERS = (
+    "conv2",
+    "avg2",
+    "conv3",
+    "avg3",
+    "conv4",
+    "avg4",
+    "conv5",
+    "avg5",
+    "conv6",
+    "avg6",
+    "conv7",
+)
+
+
+def supports(model: torch.nn.Module) -> bool:
+    return isinstance(model, CNN_SpectrogramV2)
+
+
+def fold_conv_bn(conv: torch.nn.Conv1d, bn: torch.nn.BatchNorm1d) -> torch.nn.Conv1d:
+    """
+    A copy of `conv` with the (eval mode) batch norm `bn` folded into its weights.
+    """
+    fused = copy.deepcopy(conv)
+    scale = bn.weight.detach() / torch.sqrt(bn.running_var + bn.eps)
+    bias = (
+        conv.bias.detach()
+        if conv.bias is not None
+        else torch.zeros_like(bn.running_mean)
+    )
+    fused.weight = torch.nn.Parameter(conv.weight.detach() * scale.view(-1, 1, 1))
+    fused.bias = torch.nn.Parameter((bias - bn.running_mean) * scale + bn.bias.detach())
+    return fused
+
+
+def fold_batch_norm(module: torch.nn.Module) -> torch.nn.Module:
+    """
+    Fold every Conv1d -> BatchNorm1d pair inside the Sequentials of `module`
+    (in place). Only valid for eval mode inference.
+    """
+    for name, child in module.named_children():
+        if isinstance(child, torch.nn.Sequential):
+            layers = list(child)
+            folded = []
+            i = 0
+            while i < len(layers):
+                layer = layers[i]
+                following = layers[i + 1] if i + 1 < len(layers) else None
+                if isinstance(layer, torch.nn.Conv1d) and isinstance(
+                    following, torch.nn.BatchNorm1d
+                ):
+                    folded.append(fold_conv_bn(layer, following))
+                    i += 2
+                    continue
+                folded.append(fold_batch_norm(layer))
+                i += 1
+            setattr(module, name, torch.nn.Sequential(*folded))
+        else:
+            fold_batch_norm(child)
+    return module
+
+
+class FeatureHead(torch.nn.Module):
+    """
+    The conv stack of CNN_SpectrogramV2, returning the flattened embedding.
+    """
+
+    def __init__(self, model: CNN_SpectrogramV2):
+        super().__init__()
+        self.layers = torch.nn.Sequential(
+            *[copy.deepcopy(getattr(model, name)) for name in FEATURE_LAYERS]
+        )
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        out = self.layers(x)
+        return out.view(out.size(0), -1)
+
+
+class ProbabilityHead(torch.nn.Module):
+    def __init__(self, features: FeatureHead, linear: torch.nn.Linear):
+        super().__init__()
+        self.features = features
+        self.linear = copy.deepcopy(linear)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return torch.sigmoid(self.linear(self.features(x)))
+
+
+class ScoreHead(ProbabilityHead):
+    def forward(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        features = self.features(x)
+        return torch.sigmoid(self.linear(features)), features
+
+
+class CompiledModel:
+    """
+    Features, probabilities and scores heads for a CNN_SpectrogramV2, with batch
+    norm folded and (by default) traced with TorchScript. Outputs match the eager
+    model's output_features and output_probabilities.
+    """
+
+    def __init__(
+        self,
+        model: CNN_SpectrogramV2,
+        quantize: bool = False,
+        script: bool = True,
+        example_shape: Tuple[int, int, int] = (1, 96, 1765),
+    ):
+        if not supports(model):
+            raise ValueError(f"No optimized runtime for {type(model).__name__}")
+        model = copy.deepcopy(model).cpu().eval()
+        features = fold_batch_norm(FeatureHead(model)).eval()
+        probabilities = ProbabilityHead(features, model.linear).eval()
+        scores = ScoreHead(features, model.linear).eval()
+        if quantize:
+            # Dynamic quantization only covers Linear layers, the convs stay float.
+            probabilities, scores = [
+                torch.quantization.quantize_dynamic(
+                    head, {torch.nn.Linear}, dtype=torch.qint8
+                )
+                for head in (probabilities, scores)
+            ]
+        if script:
+            example = torch.zeros(example_shape)
+            with torch.no_grad():
+                features = torch.jit.trace(features, example)
+                probabilities = torch.jit.trace(probabilities, example)
+                scores = torch.jit.trace(scores, example)
+        self.quantized = quantize
+        self.scripted = script
+        self._features = features
+        self._probabilities = probabilities
+        self._scores = scores
+
+    def features(self, x: torch.Tensor) -> torch.Tensor:
+        return self._features(x)
+
+    def probabilities(self, x: torch.Tensor) -> torch.Tensor:
+        return self._probabilities(x)
+
+    def scores(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        return self._scores(x)
@@ -0,0 +1,466 @@
+"""
+Local micro-batching inference server.
+
+One server process per host holds the models (through the model registry) and
+serves every worker on the host over a Unix socket. Requests from all
+connections are coalesced into micro-batches of up to max_batch_size
+spectrograms, waiting at most max_latency_ms after the first request of a batch,
+and each batch runs as one forward pass on a fixed pool of intra-op threads.
+
+Start it with `python -m app.ml.server` (worker-start.sh runs it, restarting it
+if it exits, when INFERENCE_SERVER_SOCKET is set). Workers then get models
+through `get_model`, which returns a RemoteModel bound to the server, or the
+local model when no server is configured or the server is unreachable.
+
+Messages are length prefixed pickles over a plain socket, after an HMAC
+challenge on the authkey, so gevent's patched sockets make the client
+cooperative: a worker's greenlets wait on the server concurrently and their
+requests share micro-batches.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from collections import deque
+import hmac
+import os
+import pickle
+import queue
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+from celery.utils.log import get_task_logger
+
+from app.core.config import settings
+from app.ml.inference import configure_threads, to_numpy
+from app.ml.registry import model_registry
+
+
+logger = get_task_logger(__name__)
+
+OPS = ("scores", "features", "predictions")
+
+_HEADER = struct.Struct("!Q")
+_NONCE_SIZE = 32
+
+
+class ServerError(RuntimeError):
+    """
+    The inference server failed to run a request.
+    """
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks, remaining = [], size
+    while remaining:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            raise EOFError("Inference connection closed")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def _send(sock: socket.socket, message: Any) -> None:
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv(sock: socket.socket) -> Any:
+    (size,) = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    return pickle.loads(_recv_exactly(sock, size))
+
+
+def _digest(authkey: bytes, nonce: bytes) -> bytes:
+    return hmac.new(authkey, nonce, "sha256").digest()
+
+
+def _deliver_challenge(sock: socket.socket, authkey: bytes) -> None:
+    """
+    Server side of the handshake: nothing is unpickled from a client that
+    can't show it holds the authkey.
+    """
+    nonce = os.urandom(_NONCE_SIZE)
+    sock.sendall(nonce)
+    response = _recv_exactly(sock, len(_digest(authkey, nonce)))
+    if not hmac.compare_digest(response, _digest(authkey, nonce)):
+        raise ConnectionError("Inference client failed authentication")
+    sock.sendall(b"\x01")
+
+
+def _answer_challenge(sock: socket.socket, authkey: bytes) -> None:
+    sock.sendall(_digest(authkey, _recv_exactly(sock, _NONCE_SIZE)))
+    if _recv_exactly(sock, 1) != b"\x01":
+        raise ConnectionError("Inference server rejected the authkey")
+
+
+class _Request:
+    def __init__(self, op: str, model_id: str, specs: np.ndarray):
+        self.op = op
+        self.model_id = model_id
+        self.specs = specs
+        self.received = time.perf_counter()
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[str] = None
+
+
+class ServerMetrics:
+    """
+    Queue depth, batch size and latency of the server. Latencies are kept for the
+    last `window` requests.
+    """
+
+    def __init__(self, window: int = 1_000):
+        self.requests = 0
+        self.tracks = 0
+        self.batches = 0
+        self.errors = 0
+        self.max_batch_size = 0
+        self.model_seconds = 0.0
+        self.latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def batch(self, requests: List[_Request], size: int, seconds: float) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            self.requests += len(requests)
+            self.tracks += size
+            self.batches += 1
+            self.max_batch_size = max(self.max_batch_size, size)
+            self.model_seconds += seconds
+            self.latencies.extend(now - r.received for r in requests)
+
+    def failed(self, count: int) -> None:
+        with self._lock:
+            self.errors += count
+
+    def dict(self, queue_depth: int) -> Dict[str, Any]:
+        with self._lock:
+            latencies = np.array(self.latencies) * 1000
+            return dict(
+                queue_depth=queue_depth,
+                requests=self.requests,
+                tracks=self.tracks,
+                batches=self.batches,
+                errors=self.errors,
+                avg_batch_size=round(self.tracks / self.batches, 2)
+                if self.batches
+                else 0.0,
+                max_batch_size=self.max_batch_size,
+                model_seconds=round(self.model_seconds, 3),
+                latency_ms_p50=round(float(np.percentile(latencies, 50)), 2)
+                if latencies.size
+                else 0.0,
+                latency_ms_p95=round(float(np.percentile(latencies, 95)), 2)
+                if latencies.size
+                else 0.0,
+            )
+
+
+class InferenceServer:
+    def __init__(
+        self,
+        socket_path: Optional[str] = settings.INFERENCE_SERVER_SOCKET,
+        max_batch_size: int = settings.INFERENCE_SERVER_MAX_BATCH_SIZE,
+        max_latency_ms: float = settings.INFERENCE_SERVER_MAX_LATENCY_MS,
+        num_threads: Optional[int] = settings.INFERENCE_NUM_THREADS,
+        authkey: bytes = settings.SECRET_KEY.encode("utf-8"),
+        timeout: float = settings.INFERENCE_SERVER_TIMEOUT,
+    ):
+        """
+        Args:
+            timeout: seconds a request may wait on its batch before it's failed.
+        """
+        self.socket_path = socket_path
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.num_threads = num_threads
+        self.authkey = authkey
+        self.timeout = timeout
+        self.metrics = ServerMetrics()
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._held: Optional[_Request] = None
+
+    def _collect(self) -> List[_Request]:
+        """
+        Block for the first request, then gather more until the batch is full or
+        max_latency has passed since the first one arrived.
+        """
+        first = self._held or self._queue.get()
+        self._held = None
+        batch, size = [first], len(first.specs)
+        deadline = first.received + self.max_latency
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request.model_id != first.model_id:
+                # Batches hold a single model, this one starts the next batch.
+                self._held = request
+                break
+            batch.append(request)
+            size += len(request.specs)
+        return batch
+
+    def _run(self, batch: List[_Request]) -> None:
+        start = time.perf_counter()
+        try:
+            model = model_registry.get(batch[0].model_id)
+            specs = np.concatenate([r.specs for r in batch])
+            probs, features = model.get_scores(specs)
+            probs, features = to_numpy(probs), to_numpy(features)
+        except Exception as err:
+            logger.warning(f"Inference batch failed: {err}")
+            self._fail(batch, err)
+            return
+        self.metrics.batch(batch, len(specs), time.perf_counter() - start)
+        offset = 0
+        for request in batch:
+            rows = slice(offset, offset + len(request.specs))
+            offset += len(request.specs)
+            if request.op == "scores":
+                request.result = (probs[rows], features[rows])
+            elif request.op == "features":
+                request.result = features[rows]
+            else:
+                request.result = probs[rows]
+            request.done.set()
+
+    def _fail(self, requests: List[_Request], err: Exception) -> None:
+        requests = [r for r in requests if not r.done.is_set()]
+        self.metrics.failed(len(requests))
+        for request in requests:
+            request.error = str(err) or type(err).__name__
+            request.done.set()
+
+    def _batcher(self) -> None:
+        """
+        Run batches for as long as the server runs. Whatever goes wrong fails the
+        requests of the batch at hand and the batcher carries on, so no request
+        is left waiting on a dead thread.
+        """
+        try:
+            configure_threads(self.num_threads)
+        except Exception as err:
+            logger.warning(f"Could not configure the inference threads: {err}")
+        while True:
+            batch: List[_Request] = []
+            try:
+                batch = self._collect()
+                self._run(batch)
+            except Exception as err:
+                logger.exception(f"Inference batcher failed: {err}")
+                self._fail(batch, err)
+
+    def _serve(self, conn: socket.socket) -> None:
+        try:
+            conn.settimeout(self.timeout)
+            _deliver_challenge(conn, self.authkey)
+            conn.settimeout(None)
+        except Exception as err:
+            logger.warning(f"Rejected inference client: {err}")
+            conn.close()
+            return
+        try:
+            while True:
+                message = _recv(conn)
+                op = message.get("op")
+                if op == "ping":
+                    _send(conn, dict(result="pong"))
+                    continue
+                if op == "metrics":
+                    _send(conn, dict(result=self.metrics.dict(self._queue.qsize())))
+                    continue
+                if op not in OPS:
+                    _send(conn, dict(error=f"Unknown op: {op}"))
+                    continue
+                specs = np.asarray(message["specs"], dtype=np.float32)
+                if specs.ndim == 2:
+                    specs = np.expand_dims(specs, 0)
+                request = _Request(
+                    op, message.get("model_id") or settings.MODEL_ID, specs
+                )
+                self._queue.put(request)
+                if not request.done.wait(self.timeout):
+                    timeout = TimeoutError(f"Timed out after {self.timeout}s")
+                    self._fail([request], timeout)
+                _send(conn, dict(result=request.result, error=request.error))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def _report(self, interval: int = 60) -> None:
+        while True:
+            time.sleep(interval)
+            logger.info(f"Inference server: {self.metrics.dict(self._queue.qsize())}")
+
+    def serve_forever(self) -> None:
+        if not self.socket_path:
+            raise ValueError("INFERENCE_SERVER_SOCKET is not set")
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        model_registry.preload(settings.MODEL_PRELOAD or None)
+        threading.Thread(target=self._batcher, name="batcher", daemon=True).start()
+        threading.Thread(target=self._report, name="metrics", daemon=True).start()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+            # Listen only once the models are loaded, clients fall back to their
+            # own model until then.
+            listener.bind(self.socket_path)
+            listener.listen(128)
+            logger.info(f"Inference server listening on {self.socket_path}")
+            while True:
+                conn, _ = listener.accept()
+                threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+
+class InferenceClient:
+    """
+    Client for the inference server. Connections are pooled, so concurrent
+    callers (threads or greenlets) each get their own and their requests land in
+    the same micro-batches.
+    """
+
+    def __init__(
+        self,
+        socket_path: Optional[str] = settings.INFERENCE_SERVER_SOCKET,
+        authkey: bytes = settings.SECRET_KEY.encode("utf-8"),
+        timeout: float = settings.INFERENCE_SERVER_TIMEOUT,
+        retry_interval: float = settings.INFERENCE_SERVER_RETRY_INTERVAL,
+    ):
+        """
+        Args:
+            timeout: seconds to wait on a response before giving up on it.
+            retry_interval: seconds the server is assumed to be down after a
+                failed request or health check.
+        """
+        self.socket_path = socket_path
+        self.authkey = authkey
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._pool: "queue.LifoQueue" = queue.LifoQueue()
+        self._pid = os.getpid()
+        self._down_until = 0.0
+
+    def _connect(self, timeout: float) -> socket.socket:
+        # Looked up at call time, so the socket is gevent's once it's patched.
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(self.socket_path)
+            _answer_challenge(sock, self.authkey)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def _request(self, message: Dict[str, Any]) -> Any:
+        if self._pid != os.getpid():
+            # Connections can't be shared with a forked child.
+            self._pool, self._pid = queue.LifoQueue(), os.getpid()
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect(self.timeout)
+        try:
+            _send(conn, message)
+            response = _recv(conn)
+        except Exception:
+            conn.close()
+            raise
+        self._pool.put(conn)
+        if response.get("error"):
+            raise ServerError(response["error"])
+        return response["result"]
+
+    def run(self, op: str, specs: np.ndarray, model_id: Optional[str] = None) -> Any:
+        return self._request(
+            dict(op=op, model_id=model_id, specs=np.asarray(specs, dtype=np.float32))
+        )
+
+    def metrics(self) -> Dict[str, Any]:
+        return self._request(dict(op="metrics"))
+
+    def mark_down(self) -> None:
+        self._down_until = time.monotonic() + self.retry_interval
+
+    def available(self, timeout: float = 1.0) -> bool:
+        """
+        Whether the server is up: its socket exists and it answers a ping within
+        `timeout` seconds. A failure is remembered for retry_interval seconds.
+        """
+        if time.monotonic() < self._down_until:
+            return False
+        try:
+            with self._connect(timeout) as sock:
+                _send(sock, dict(op="ping"))
+                if _recv(sock).get("result") == "pong":
+                    return True
+        except (EOFError, OSError) as err:
+            logger.warning(f"Inference server unavailable: {err}")
+        self.mark_down()
+        return False
+
+
+class RemoteModel:
+    """
+    Stands in for SpectrogramSimilarity in the tasks, running get_scores,
+    get_features and get_predictions on the inference server. Results are numpy
+    arrays. When the server can't be reached (or times out) the call runs on the
+    model loaded in this process instead.
+    """
+
+    def __init__(self, client: InferenceClient, model_id: str):
+        self.client = client
+        self.model_id = model_id
+
+    def _run(self, op: str, data: np.ndarray) -> Any:
+        try:
+            return self.client.run(op, data, self.model_id)
+        except (EOFError, OSError) as err:
+            logger.warning(f"Inference server failed, running {op} locally: {err}")
+            self.client.mark_down()
+        model = model_registry.get(self.model_id)
+        if op == "scores":
+            return tuple(to_numpy(t) for t in model.get_scores(data))
+        if op == "features":
+            return to_numpy(model.get_features(data))
+        return to_numpy(model.get_predictions(data))
+
+    def get_scores(self, data: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return tuple(self._run("scores", data))
+
+    def get_features(self, data: np.ndarray) -> np.ndarray:
+        return self._run("features", data)
+
+    def get_predictions(self, data: np.ndarray) -> np.ndarray:
+        return self._run("predictions", data)
+
+
+_client: Optional[InferenceClient] = None
+
+
+def get_model(model_id: Optional[str] = None):
+    """
+    The model to run inference with: a RemoteModel on the host's inference server
+    when INFERENCE_SERVER_SOCKET is set and the server answers, else the model
+    loaded in this process.
+    """
+    global _client
+    model_id = model_id or settings.MODEL_ID
+    if not settings.INFERENCE_SERVER_SOCKET:
+        return model_registry.get(model_id)
+    if _client is None:
+        _client = InferenceClient(settings.INFERENCE_SERVER_SOCKET)
+    if not _client.available():
+        return model_registry.get(model_id)
+    return RemoteModel(_client, model_id)
+
+
+if __name__ == "__main__":
+    InferenceServer().serve_forever()
@@ -26,6 +26,9 @@ from .genre_artist import Genre_Artist
 from .city_artist import City_Artist
 from .track_distance import Track_Distance
 from .track_prediction import Track_Prediction
+from .track_embedding import Track_Embedding
+from .track_growth import Track_Growth
+from .track_metric import Track_Metric
 from .label import Label
 from .spectrogram import Spectrogram
 from .musicai_playlist import Musicai_Playlist
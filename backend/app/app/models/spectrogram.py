@@ -1,6 +1,14 @@
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Column, ForeignKey, String, Boolean, LargeBinary, Integer
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    String,
+    Boolean,
+    LargeBinary,
+    Integer,
+    UniqueConstraint,
+)
 from sqlalchemy.orm import relationship
 
 from app.db.base_class import Base
@@ -10,6 +18,13 @@ if TYPE_CHECKING:
 
 
 class Spectrogram(Base):
+    # One spectrogram per track and set of parameters; bulk inserts skip the
+    # spectrograms that already exist (crud.spectrogram.create_multi).
+    __table_args__ = (
+        UniqueConstraint(
+            "track_id", "spectrogram_type", "hop_size", "window_size", "n_mels"
+        ),
+    )
     id = Column(Integer, primary_key=True, index=True)
     track_id = Column(String, ForeignKey("track.id"), index=True)
     spectrogram_type = Column(String, index=True, nullable=False)
@@ -35,3 +35,4 @@ class Track(Base):
     )
     spectrogram = relationship("Spectrogram", uselist=False, back_populates="track")
     predictions = relationship("Track_Prediction", back_populates="track")
+    embeddings = relationship("Track_Embedding", back_populates="track")
@@ -0,0 +1,21 @@
+from typing import TYPE_CHECKING
+
+from datetime import datetime
+
+from sqlalchemy import Column, ForeignKey, String, DateTime, LargeBinary
+from sqlalchemy.orm import relationship
+
+from app.db.base_class import Base
+
+
+if TYPE_CHECKING:
+    from .track import Track  # noqa: F401
+
+
+class Track_Embedding(Base):
+    track_id = Column(String, ForeignKey("track.id"), primary_key=True, index=True)
+    model_id = Column(String, ForeignKey("ml_model.id"), primary_key=True, index=True)
+    date = Column(DateTime, default=datetime.now, nullable=False)
+    # Little-endian float32 bytes of the model's output_features vector.
+    embedding = Column(LargeBinary, nullable=False)
+    track = relationship("Track", back_populates="embeddings")
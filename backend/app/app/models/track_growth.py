@@ -0,0 +1,28 @@
+from typing import TYPE_CHECKING
+
+from sqlalchemy import Column, ForeignKey, Integer, BIGINT, String, Date
+
+from app.db.base_class import Base
+
+if TYPE_CHECKING:
+    from .track import Track  # noqa: F401
+
+
+class Track_Growth(Base):
+    # One row per track, kept up to date as playcounts are pushed (see
+    # crud.track_growth): the latest playcount, the one before it, the first one
+    # and the playcount at the start of the 7, 14 and 30 day windows.
+    track_id = Column(String, ForeignKey("track.id"), primary_key=True, index=True)
+    date = Column(Date(), nullable=False, index=True)
+    playcount = Column(BIGINT, nullable=False)
+    popularity = Column(Integer)
+    prev_date = Column(Date())
+    prev_playcount = Column(BIGINT)
+    first_date = Column(Date(), nullable=False)
+    first_playcount = Column(BIGINT, nullable=False)
+    date_7 = Column(Date())
+    playcount_7 = Column(BIGINT)
+    date_14 = Column(Date())
+    playcount_14 = Column(BIGINT)
+    date_30 = Column(Date())
+    playcount_30 = Column(BIGINT)
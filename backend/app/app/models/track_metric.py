@@ -0,0 +1,23 @@
+from typing import TYPE_CHECKING
+
+from sqlalchemy import Column, ForeignKey, Integer, BIGINT, Float, String, Date
+
+from app.db.base_class import Base
+
+if TYPE_CHECKING:
+    from .track import Track  # noqa: F401
+
+
+class Track_Metric(Base):
+    # Growth of a track over the last lag_days days, as of `date`, written in
+    # bulk by the compute_track_metrics task (see analytics/playcounts.py).
+    track_id = Column(String, ForeignKey("track.id"), primary_key=True, index=True)
+    lag_days = Column(Integer, primary_key=True)
+    date = Column(Date(), nullable=False, index=True)
+    playcount = Column(BIGINT, nullable=False)
+    start_playcount = Column(BIGINT, nullable=False)
+    chg = Column(BIGINT, nullable=False)
+    days = Column(Integer, nullable=False)
+    growth_rate = Column(Float)
+    avg_chg = Column(Float)
+    acceleration = Column(Float)
@@ -1,7 +1,7 @@
 from typing import TYPE_CHECKING
 from datetime import date
 
-from sqlalchemy import Column, ForeignKey, Integer, BIGINT, String, Date
+from sqlalchemy import Column, ForeignKey, Index, Integer, BIGINT, String, Date
 from sqlalchemy.orm import relationship
 
 from app.db.base_class import Base
@@ -11,10 +11,17 @@ if TYPE_CHECKING:
 
 
 class Track_Playcount(Base):
-    # __tablename__ = "tracks_playcounts"
-    id = Column(String, primary_key=True, index=True)  # Format: <track_id>_<date>
-    track_id = Column(String, ForeignKey("track.id"), index=True)
-    date = Column(Date(), default=date.today, index=True, nullable=False)
+    # Range partitioned by date into monthly partitions (created by
+    # crud.track_playcount.ensure_partitions, from init_db and then ahead of time
+    # by maintain_track_playcount; there's no default partition) and keyed by
+    # (track_id, date). The primary key index also serves lookups by track_id, and
+    # a BRIN index covers date ranges at a fraction of a btree's size.
+    __table_args__ = (
+        Index("ix_track_playcount_date_brin", "date", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
+    track_id = Column(String, ForeignKey("track.id"), primary_key=True)
+    date = Column(Date(), default=date.today, primary_key=True, nullable=False)
     playcount = Column(BIGINT, nullable=False)
     popularity = Column(Integer)
     track = relationship("Track", back_populates="playcounts")
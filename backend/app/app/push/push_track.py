@@ -35,9 +35,12 @@ class PushTrack(object):
         """
         Push track playcount to db.
         """
-        db_track_pcnt = crud.track_playcount.get(db, id=track_playcount.id)
+        db_track_pcnt = crud.track_playcount.get_by_track_id_and_date(
+            db, track_id=track_playcount.track_id, date=track_playcount.date
+        )
         if not db_track_pcnt:
             db_track_pcnt = crud.track_playcount.create(db, obj_in=track_playcount)
+            crud.track_growth.update_tracks(db, track_ids=[track_playcount.track_id])
 
         return db_track_pcnt
 
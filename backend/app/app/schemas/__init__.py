@@ -39,10 +39,17 @@ from .track_prediction import (
     TrackPredictionUpdate,
 )
 from .ml_model import MLModel, MLModelCreate, MLModelUpdate
-from .track_rising import TrackRisingBase, TrackRising
+from .track_rising import TrackRisingBase, TrackRising, TrackRisingFilter
 from .user_playlist import UserPlaylist, UserPlaylistCreate
 from .track_user import TrackUser, TrackUserCreate, TrackUserUpdate
 from .track_distance import TrackDistance, TrackDistanceCreate, TrackDistanceUpdate
+from .track_embedding import (
+    TrackEmbedding,
+    TrackEmbeddingCreate,
+    TrackEmbeddingUpdate,
+)
+from .track_growth import TrackGrowth, TrackGrowthCreate, TrackGrowthUpdate
+from .track_metric import TrackMetric, TrackMetricCreate, TrackMetricUpdate
 from .musicai_playlist import (
     MusicaiPlaylist,
     MusicaiPlaylistCreate,
@@ -0,0 +1,38 @@
+from typing import Optional
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+# Shared properties
+class TrackEmbeddingBase(BaseModel):
+    track_id: str
+    model_id: str
+    date: Optional[datetime] = None
+    embedding: bytes
+
+
+# Properties to receive via API on creation
+class TrackEmbeddingCreate(TrackEmbeddingBase):
+    pass
+
+
+# Properties to receive via API on update
+class TrackEmbeddingUpdate(TrackEmbeddingBase):
+    pass
+
+
+# Properties shared by models stored in DB
+class TrackEmbeddingInDBBase(TrackEmbeddingBase):
+    class Config:
+        orm_mode = True
+
+
+# Additional properties to return via API
+class TrackEmbedding(TrackEmbeddingInDBBase):
+    pass
+
+
+# Additional properties stored in DB
+class TrackEmbeddingInDB(TrackEmbeddingInDBBase):
+    pass
@@ -0,0 +1,48 @@
+from typing import Optional
+from datetime import date
+
+from pydantic import BaseModel
+
+
+# Shared properties
+class TrackGrowthBase(BaseModel):
+    track_id: str
+    date: date
+    playcount: int
+    popularity: Optional[int] = None
+    prev_date: Optional[date] = None
+    prev_playcount: Optional[int] = None
+    first_date: date
+    first_playcount: int
+    date_7: Optional[date] = None
+    playcount_7: Optional[int] = None
+    date_14: Optional[date] = None
+    playcount_14: Optional[int] = None
+    date_30: Optional[date] = None
+    playcount_30: Optional[int] = None
+
+
+# Properties to receive via API on creation
+class TrackGrowthCreate(TrackGrowthBase):
+    pass
+
+
+# Properties to receive via API on update
+class TrackGrowthUpdate(TrackGrowthBase):
+    pass
+
+
+# Properties shared by models stored in DB
+class TrackGrowthInDBBase(TrackGrowthBase):
+    class Config:
+        orm_mode = True
+
+
+# Additional properties to return via API
+class TrackGrowth(TrackGrowthInDBBase):
+    pass
+
+
+# Additional properties stored in DB
+class TrackGrowthInDB(TrackGrowthInDBBase):
+    pass
@@ -0,0 +1,44 @@
+from typing import Optional
+from datetime import date
+
+from pydantic import BaseModel
+
+
+# Shared properties
+class TrackMetricBase(BaseModel):
+    track_id: str
+    lag_days: int
+    date: date
+    playcount: int
+    start_playcount: int
+    chg: int
+    days: int
+    growth_rate: Optional[float] = None
+    avg_chg: Optional[float] = None
+    acceleration: Optional[float] = None
+
+
+# Properties to receive via API on creation
+class TrackMetricCreate(TrackMetricBase):
+    pass
+
+
+# Properties to receive via API on update
+class TrackMetricUpdate(TrackMetricBase):
+    pass
+
+
+# Properties shared by models stored in DB
+class TrackMetricInDBBase(TrackMetricBase):
+    class Config:
+        orm_mode = True
+
+
+# Additional properties to return via API
+class TrackMetric(TrackMetricInDBBase):
+    pass
+
+
+# Additional properties stored in DB
+class TrackMetricInDB(TrackMetricInDBBase):
+    pass
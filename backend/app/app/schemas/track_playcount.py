@@ -5,7 +5,6 @@ from pydantic import BaseModel
 
 # Shared properties
 class TrackPlaycountBase(BaseModel):
-    id: str
     track_id: str
     date: date
     playcount: int
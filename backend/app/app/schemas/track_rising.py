@@ -18,6 +18,28 @@ class TrackRisingBase(BaseModel):
     musicai_score: Optional[int] = None
 
 
+class TrackRisingFilter(BaseModel):
+    """
+    The filters of /tracks/rising-tracks (see crud.track.get_rising_tracks), also
+    used to key the cached responses.
+    """
+
+    lag_days: int = 7
+    order_by: str = "musicai_score"
+    min_growth_rate: float = 0
+    max_growth_rate: float = 1e9
+    min_playcount: int = 0
+    max_playcount: int = int(1e10)
+    min_chg: float = 0
+    max_chg: float = 1e9
+    min_probability: float = 0.0
+    max_probability: float = 1.0
+    min_musicai_score: int = 1
+    max_musicai_score: int = 5
+    skip: int = 0
+    limit: int = 100
+
+
 class TrackRising(TrackRisingBase):
     track: Track
     artists: List[Artist]
@@ -1,18 +1,24 @@
-# Import all the celery tasks here, so that Celery can register them.
-import app.spotify.track
-import app.spotify.album
-import app.spotify.artist
-import app.spotify.playlist
-import app.spotify.playlist_track
-import app.spotify.genre
-import app.spotify.track_playcount
-import app.spotify.track_prediction
-import app.spotify.track_distance
-import app.spotify.spectrogram
-import app.spotify.search_term
-import app.spotify.association
-import app.spotify.spotify_user
-import app.spotify.flow
-import app.spotify.spotify_mux
-import app.spotify.spapi
-import app.spotify.spotipy_mux
+# The celery task modules are listed in TASK_MODULES and imported by the workers
+# (see core/celery_app.py). Importing app.spotify on its own stays cheap, so the api
+# can pull in single modules (eg, spotify_mux) without loading every task.
+TASK_MODULES = [
+    "app.spotify.track",
+    "app.spotify.album",
+    "app.spotify.artist",
+    "app.spotify.playlist",
+    "app.spotify.playlist_track",
+    "app.spotify.genre",
+    "app.spotify.track_playcount",
+    "app.spotify.track_prediction",
+    "app.spotify.track_distance",
+    "app.spotify.track_embedding",
+    "app.spotify.spectrogram",
+    "app.spotify.search_term",
+    "app.spotify.association",
+    "app.spotify.spotify_user",
+    "app.spotify.dispatch",
+    "app.spotify.flow",
+    "app.spotify.spotify_mux",
+    "app.spotify.spapi",
+    "app.spotify.spotipy_mux",
+]
@@ -4,5 +4,6 @@ from .tasks import (
     fetch_album_playcount,
     update_album,
     flow_update_album,
+    update_album_workflow,
 )
 
@@ -59,9 +59,13 @@ def update_album(self, album: Dict[str, Any]) -> Dict[str, Any]:
         return jsonable_encoder(db_album)
 
 
+def update_album_workflow(album_id: str) -> Any:
+    return fetch_album_playcount.si(album_id=album_id) | update_album.s()
+
+
 @celery_app.task(bind=True, ignore_result=True, serializer="json")
 def flow_update_album(self, album_id: str) -> None:
-    workflow = fetch_album_playcount.si(album_id=album_id) | update_album.s()
+    workflow = update_album_workflow(album_id)
     workflow.apply_async()
 
 
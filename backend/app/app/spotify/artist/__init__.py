@@ -5,4 +5,5 @@ from .tasks import (
     push_artist,
     parse_artist,
     flow_artist,
+    artist_workflow,
 )
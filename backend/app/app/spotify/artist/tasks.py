@@ -191,6 +191,26 @@ def push_artist_discography(
         _ = crud.track.create_multi(db, objs_in=missing_tracks)
 
 
+def artist_workflow(
+    artist_id: str,
+    push_related_artists: Optional[bool] = True,
+    push_discography: Optional[bool] = False,
+) -> Any:
+    return (
+        group(
+            [
+                fetch_artist_info.si(artist_id=artist_id),
+                fetch_artist_insights.si(artist_id=artist_id),
+                fetch_artist_about.si(artist_id=artist_id),
+            ]
+        )
+        | parse_artist.s()
+        | push_artist.s(
+            push_related_artists=push_related_artists, push_discography=push_discography
+        )
+    )
+
+
 @celery_app.task(bind=True, task_time_limit=6, ignore_result=True, serializer="json")
 def flow_artist(
     self,
@@ -212,18 +232,10 @@ def flow_artist(
             else:
                 push_discography = True
 
-    workflow = (
-        group(
-            [
-                fetch_artist_info.si(artist_id=artist_id),
-                fetch_artist_insights.si(artist_id=artist_id),
-                fetch_artist_about.si(artist_id=artist_id),
-            ]
-        )
-        | parse_artist.s()
-        | push_artist.s(
-            push_related_artists=push_related_artists, push_discography=push_discography
-        )
+    workflow = artist_workflow(
+        artist_id,
+        push_related_artists=push_related_artists,
+        push_discography=push_discography,
     )
     workflow.apply_async(ignore_result=True)
     # return workflow()
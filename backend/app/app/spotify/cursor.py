@@ -0,0 +1,57 @@
+"""
+Persisted keyset cursors for the flows.
+
+A flow that pages its selection query with keyset pagination (see
+CRUDBase.seek) keeps the last id it handed out in Redis, so each run continues
+where the previous one stopped instead of skipping a fixed offset. A run that
+comes up short of its limit has reached the end and the next one starts over.
+Each shard of a flow has its own cursor.
+"""
+from typing import Any, Callable, Iterable, Iterator
+
+from celery.utils.log import get_task_logger
+
+from app.core.celery_app import celery_app
+
+
+logger = get_task_logger(__name__)
+
+
+class FlowCursor:
+    def __init__(self, name: str, shard: int = 0, shards: int = 1):
+        if not 0 <= shard < shards:
+            raise ValueError(f"shard must be in [0, {shards}), got {shard}")
+        self.name = name
+        self.key = f"FlowCursor::{name}::{shard}/{shards}"
+
+    @property
+    def redis(self):
+        return celery_app.backend.client
+
+    def position(self) -> str:
+        """
+        The id to continue after ("" at the start).
+        """
+        value = self.redis.get(self.key)
+        return value.decode("utf-8") if value else ""
+
+    def reset(self) -> None:
+        self.redis.delete(self.key)
+
+    def walk(
+        self, items: Iterable[Any], limit: int, item_id: Callable[[Any], str] = str,
+    ) -> Iterator[Any]:
+        """
+        Yield a page of items, moving the cursor to the last id once the page is
+        consumed (or back to the start if the page was the last one).
+        """
+        count, last = 0, None
+        for item in items:
+            count += 1
+            last = item_id(item)
+            yield item
+        if count < limit or last is None:
+            logger.info(f"{self.name} reached the end after {count}, starting over.")
+            self.reset()
+        else:
+            self.redis.set(self.key, last)
@@ -0,0 +1,152 @@
+"""
+Bulk dispatch for the flows.
+
+Instead of collecting every id into a list and publishing one message (often a
+two task chain) per id, a flow streams its ids out of the db through a server
+side cursor and hands them to `dispatch` along with its workflow, a module level
+function building an id's signature. `dispatch` packs the ids into
+`publish_batch` tasks of DISPATCH_BATCH_SIZE ids, all published through one
+broker producer, so a flow of N ids sends N / DISPATCH_BATCH_SIZE messages.
+
+A worker running a `publish_batch` builds each id's workflow and publishes it as
+is, so the tasks keep their own queue routing, time limits and retries; nothing
+runs eagerly inside the batch.
+
+The ids of every published batch are recorded in Redis under the dispatch's
+key, with one pipelined write per batch. If a dispatch is interrupted (eg, a
+worker restart) the next run skips the ids that were already sent; the record
+is dropped once a dispatch completes.
+"""
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from celery import Signature
+from celery.utils.log import get_task_logger
+from kombu.utils.imports import symbol_by_name
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+
+
+logger = get_task_logger(__name__)
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """
+    Lazily split an iterable into lists of (at most) size items.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def dispatch_key(name: str, **params: Any) -> str:
+    """
+    Key of a dispatch, eg, dispatch_key("flow_update_artists", skip=0, limit=10)
+    -> "flow_update_artists::skip=0::limit=10". Runs of a flow with different
+    params keep separate progress.
+    """
+    return "::".join([name] + [f"{k}={v}" for k, v in params.items()])
+
+
+def workflow_path(workflow: Callable[..., Signature]) -> str:
+    """
+    The import path a `publish_batch` task finds a workflow by. Workflows must be
+    module level functions (not lambdas or closures).
+    """
+    path = f"{workflow.__module__}.{workflow.__qualname__}"
+    if "<" in path:
+        raise ValueError(f"Workflows must be module level functions, got {path}")
+    return path
+
+
+def _publish(sig: Signature, producer: Any) -> None:
+    """
+    Publish a signature with the given producer. Canvases (chains, chords) don't
+    hand a producer down to their steps, which publish through the app's pool.
+    """
+    if sig.subtask_type:
+        sig.apply_async()
+    else:
+        sig.apply_async(producer=producer)
+
+
+@celery_app.task(bind=True, ignore_result=True, serializer="json")
+def publish_batch(
+    self,
+    workflow: str,
+    items: List[Any],
+    workflow_kwargs: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    Publish the workflow of each item of a batch (see `dispatch`). The workflows
+    run as regular tasks, on their own queues.
+    """
+    make_signature = symbol_by_name(workflow)
+    workflow_kwargs = workflow_kwargs or {}
+    with celery_app.producer_or_acquire() as producer:
+        for item in items:
+            _publish(make_signature(item, **workflow_kwargs), producer)
+    return len(items)
+
+
+def dispatch(
+    key: str,
+    items: Iterable[Any],
+    workflow: Callable[..., Signature],
+    workflow_kwargs: Optional[Dict[str, Any]] = None,
+    item_id: Callable[[Any], str] = str,
+    batch_size: int = settings.DISPATCH_BATCH_SIZE,
+    resume: bool = True,
+    progress_ttl: int = settings.DISPATCH_PROGRESS_TTL,
+) -> int:
+    """
+    Publish `publish_batch` tasks covering every item.
+
+    Args:
+        key: identifies the dispatch, see `dispatch_key`.
+        items: the (json serializable) items to dispatch, typically streamed from
+            the db.
+        workflow: module level function building the signature (a task or a
+            canvas) of an item, called as workflow(item, **workflow_kwargs).
+        item_id: the id an item is recorded under in the progress set.
+        batch_size: how many items a `publish_batch` task covers.
+        resume: skip items recorded by an unfinished dispatch with the same key,
+            otherwise start over.
+
+    Returns:
+        The number of items dispatched.
+    """
+    path = workflow_path(workflow)
+    redis = celery_app.backend.client
+    progress = f"Dispatch::{key}::dispatched"
+    if resume:
+        sent = {member.decode("utf-8") for member in redis.smembers(progress)}
+        if sent:
+            logger.info(f"Resuming {key}, skipping {len(sent)} dispatched items.")
+    else:
+        redis.delete(progress)
+        sent = set()
+
+    pending = (item for item in items if item_id(item) not in sent)
+    total = 0
+    # One producer (and broker connection) for every batch, rather than one
+    # acquired from the pool per message.
+    with celery_app.producer_or_acquire() as producer:
+        for chunk in chunked(pending, batch_size):
+            publish_batch.si(path, chunk, workflow_kwargs).apply_async(
+                producer=producer
+            )
+            pipe = redis.pipeline(transaction=False)
+            pipe.sadd(progress, *[item_id(item) for item in chunk])
+            pipe.expire(progress, progress_ttl)
+            pipe.execute()
+            total += len(chunk)
+
+    redis.delete(progress)
+    logger.info(f"Dispatched {total} items for {key} in batches of {batch_size}.")
+    return total
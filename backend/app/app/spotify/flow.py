@@ -1,13 +1,14 @@
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any, Tuple, Union
 import datetime
+import json
 import random
-import time
-import shutil
 
+from fastapi.encoders import jsonable_encoder
 from celery import chord, group, chain
 from celery.utils.log import get_task_logger
 from celery.result import ResultBase
 
+from app.core.cache import rising_tracks_cache
 from app.core.celery_app import celery_app
 from app.core.config import settings
 from app.db.session import session_scope
@@ -16,6 +17,8 @@ from app import crud, schemas, push
 from app.spotify import parser
 from app.spotify.spotify_mux import spotify_mux
 from app.spotify import utils
+from app.spotify.dispatch import dispatch, dispatch_key
+from app.spotify.cursor import FlowCursor
 
 from app.spotify import artist
 from app.spotify import track
@@ -33,11 +36,35 @@ logger = get_task_logger(__name__)
 # TODO: finish flow for scrapping artist (cities and links)
 
 
+def _flow_cursor(
+    name: str, keyset: bool, shard: int, shards: int
+) -> Tuple[Optional[FlowCursor], Optional[str]]:
+    """
+    The persisted cursor of a keyset paginated flow and the id to continue after,
+    (None, None) when the flow pages by offset.
+    """
+    if not keyset:
+        return None, None
+    cursor = FlowCursor(name, shard=shard, shards=shards)
+    return cursor, cursor.position()
+
+
 @celery_app.task(bind=True, serializer="json")
-def flow_update_tracks(self, skip: int = 0, limit: int = 100_000) -> int:
+def flow_update_tracks(
+    self,
+    skip: int = 0,
+    limit: int = 100_000,
+    keyset: bool = True,
+    shard: int = 0,
+    shards: int = 1,
+) -> int:
     """
     Update track metadata with Spotify api data for tracks in our db.
 
+    With keyset=True (the default) each run picks up after the last track id of
+    the previous run (of the same shard) rather than paging with skip. Running
+    the flow for shard 0..shards-1 splits the tracks between workers.
+
     The flow performs the following steps:
         get track ids missing preview urls
         chunck tracks into sets of 50 track ids
@@ -46,13 +73,21 @@ def flow_update_tracks(self, skip: int = 0, limit: int = 100_000) -> int:
                 push updated track to db
     repeat: 1/week
     """
+    cursor, after_id = _flow_cursor(self.name, keyset, shard, shards)
     with session_scope() as db:
         track_ids = [
             t.id
             for t in crud.track.get_tracks_missing_preview_url(
-                db, skip=skip, limit=limit
+                db,
+                skip=skip,
+                limit=limit,
+                after_id=after_id,
+                shard=shard,
+                shards=shards,
             )
         ]
+    if cursor:
+        track_ids = list(cursor.walk(track_ids, limit))
 
     chunked_ids = utils.chunkify(track_ids, chunk_size=50)
     logger.info(
@@ -62,7 +97,6 @@ def flow_update_tracks(self, skip: int = 0, limit: int = 100_000) -> int:
     for ids in chunked_ids:
         # Send request to Spotify API for tracks metadata
         # Process metadata and push results to db
-        time.sleep(0.1)  # avoid flooding spotify api with requests
         track.flow_tracks(track_ids=ids)
 
     total_tasks = len(chunked_ids)
@@ -70,51 +104,87 @@ def flow_update_tracks(self, skip: int = 0, limit: int = 100_000) -> int:
 
 
 @celery_app.task(bind=True, serializer="json")
-def flow_update_artists(self, skip: int = 0, limit: int = 100_000) -> int:
+def flow_update_artists(
+    self,
+    skip: int = 0,
+    limit: int = 100_000,
+    resume: bool = True,
+    keyset: bool = True,
+    shard: int = 0,
+    shards: int = 1,
+) -> int:
     """
-    Update artist metadata with Spotify API data for artists in our db.
+    Update artist metadata with Spotify API data for artists in our db. See
+    flow_update_tracks for keyset and shard/shards.
 
     The flow performs the following steps:
-        get artist ids missing links or genres
-        for each artist:
-            push artist to db
+        stream artist ids missing links or genres
+        for each batch of artists:
+            for each artist:
+                push artist to db
     repeat: 1/week
     """
+    cursor, after_id = _flow_cursor(self.name, keyset, shard, shards)
     with session_scope() as db:
-        artist_ids = [
+        artist_ids = (
             a.id
-            for a in crud.artist.get_artist_ids_missing_data(db, skip=skip, limit=limit)
-        ]
-
-    logger.info(f"Updating metadata for {len(artist_ids)} artists!")
-    for aid in artist_ids:
+            for a in crud.artist.get_artist_ids_missing_data(
+                db,
+                skip=skip,
+                limit=limit,
+                after_id=after_id,
+                shard=shard,
+                shards=shards,
+                stream=True,
+            )
+        )
+        if cursor:
+            artist_ids = cursor.walk(artist_ids, limit)
         # Send request to Spotify API for tracks metadata
         # Process metadata and push results to db
-        time.sleep(0.1)  # avoid flooding spotify api with requests
-        artist.flow_artist.si(
-            artist_id=aid,
-            check_db_first=False,
-            push_related_artists=True,
-            push_discography=True,
-        ).apply_async(ignore_result=True)
+        total_tasks = dispatch(
+            dispatch_key(
+                self.name,
+                skip=skip,
+                limit=limit,
+                after_id=after_id,
+                shard=shard,
+                shards=shards,
+            ),
+            artist_ids,
+            artist.artist_workflow,
+            dict(push_related_artists=True, push_discography=True),
+            resume=resume,
+        )
 
-    total_tasks = len(artist_ids)
+    logger.info(f"Updating metadata for {total_tasks} artists!")
     return total_tasks
 
 
 @celery_app.task(bind=True, serializer="json")
-def flow_update_albums(self, skip: int = 0, limit: int = 100_000) -> None:
+def flow_update_albums(
+    self,
+    skip: int = 0,
+    limit: int = 100_000,
+    resume: bool = True,
+    keyset: bool = True,
+    shard: int = 0,
+    shards: int = 1,
+) -> None:
     """
-    Update album metadata with Spotify Client data for albums in our db.
+    Update album metadata with Spotify Client data for albums in our db. See
+    flow_update_tracks for keyset and shard/shards.
 
     The flow performs the following steps:
-        get album ids missing metadata in our db (cover image, label_id, etc.)
-        for each album:
-            push updated album to db
+        stream album ids missing metadata in our db (cover image, label_id, etc.)
+        for each batch of albums:
+            for each album:
+                push updated album to db
     repeat: 1/week
     """
+    cursor, after_id = _flow_cursor(self.name, keyset, shard, shards)
     with session_scope() as db:
-        album_ids = [
+        album_ids = (
             a.id
             for a in crud.album.get_album_ids_by_verified_artists_missing_data(
                 db,
@@ -122,22 +192,41 @@ def flow_update_albums(self, skip: int = 0, limit: int = 100_000) -> None:
                 max_date=datetime.date.today(),
                 skip=skip,
                 limit=limit,
+                after_id=after_id,
+                shard=shard,
+                shards=shards,
+                stream=True,
             )
-        ]
-
-    logger.info(f"Updating metadata for {len(album_ids)} albums!")
-
-    # TODO: batch update albums using spotify api result for multi albums
-    for aid in album_ids:
+        )
+        if cursor:
+            album_ids = cursor.walk(album_ids, limit)
+        # TODO: batch update albums using spotify api result for multi albums
         # Send request to Spotify Client API for album metadata
         # Process metadata and push results to db
-        # time.sleep(0.1)  # avoid flooding spotify client api with requests
-        album.flow_update_album.si(album_id=aid).apply_async()
+        total_tasks = dispatch(
+            dispatch_key(
+                self.name,
+                skip=skip,
+                limit=limit,
+                after_id=after_id,
+                shard=shard,
+                shards=shards,
+            ),
+            album_ids,
+            album.update_album_workflow,
+            resume=resume,
+        )
+
+    logger.info(f"Updating metadata for {total_tasks} albums!")
 
 
 @celery_app.task(bind=True, serializer="json")
 def flow_scrape_playlists_tracks(
-    self, playlist_tracks_limit: int = 300, skip: int = 0, limit: int = 2_000,
+    self,
+    playlist_tracks_limit: int = 300,
+    skip: int = 0,
+    limit: int = 2_000,
+    resume: bool = True,
 ) -> None:
     """
     Collect tracks on playlists from Spotify.
@@ -163,17 +252,22 @@ def flow_scrape_playlists_tracks(
     repeat: 1/week
     """
     with session_scope() as db:
-        playlists_ids = [
-            p.id for p in crud.playlist.get_popular_playlists(db, skip=0, limit=limit)
-        ]
-
-    logger.info(f"Collecting tracks for {len(playlists_ids)} playlist!")
-    # tasks = []
-    for play_id in playlists_ids:
-        playlist_track.flow_playlist_tracks(
-            playlist_id=play_id, track_limit=playlist_tracks_limit
+        playlists_ids = (
+            p.id
+            for p in crud.playlist.get_popular_playlists(
+                db, skip=0, limit=limit, stream=True
+            )
+        )
+        total_tasks = dispatch(
+            dispatch_key(self.name, limit=limit),
+            playlists_ids,
+            playlist_track.playlist_tracks_workflow,
+            dict(track_limit=playlist_tracks_limit),
+            resume=resume,
         )
 
+    logger.info(f"Collecting tracks for {total_tasks} playlist!")
+
 
 @celery_app.task(bind=True)
 def flow_scrape_album_playcounts(
@@ -184,9 +278,14 @@ def flow_scrape_album_playcounts(
     verified_artists: Optional[bool] = True,
     skip: Optional[int] = 0,
     limit: Optional[int] = 100_000,
+    resume: bool = True,
+    keyset: bool = True,
+    shard: int = 0,
+    shards: int = 1,
 ) -> int:
     """
-    Collect album track playcounts.
+    Collect album track playcounts. See flow_update_tracks for keyset and
+    shard/shards.
 
     The flow performs the following steps:
         get album ids (only include albums by verified artists)
@@ -199,8 +298,9 @@ def flow_scrape_album_playcounts(
             )
     repeat: 3/week
     """
+    cursor, after_id = _flow_cursor(self.name, keyset, shard, shards)
     with session_scope() as db:
-        album_ids = [
+        album_ids = (
             a.id
             for a in crud.album.get_ids_missing_playcount(
                 db,
@@ -209,15 +309,30 @@ def flow_scrape_album_playcounts(
                 verified_artists=verified_artists,
                 skip=skip,
                 limit=limit,
+                after_id=after_id,
+                shard=shard,
+                shards=shards,
+                stream=True,
             )
-        ]
-
-    logger.info(f"Collecting album playcounts for {len(album_ids)} ")
-    for album_id in album_ids:
-        time.sleep(0.05)  # small jitter between tasks
-        track_playcount.flow_album_playcount(album_id=album_id)
+        )
+        if cursor:
+            album_ids = cursor.walk(album_ids, limit)
+        total_tasks = dispatch(
+            dispatch_key(
+                self.name,
+                verified_artists=verified_artists,
+                skip=skip,
+                limit=limit,
+                after_id=after_id,
+                shard=shard,
+                shards=shards,
+            ),
+            album_ids,
+            track_playcount.album_playcount_workflow,
+            resume=resume,
+        )
 
-    total_tasks = len(album_ids)
+    logger.info(f"Collecting album playcounts for {total_tasks} ")
     return total_tasks
 
 
@@ -229,56 +344,59 @@ def flow_scrape_spectrograms(
     lag_days: Optional[int] = 30,
     skip: Optional[int] = 0,
     limit: Optional[int] = 1_000,
+    batch: Optional[bool] = False,
+    resume: bool = True,
 ) -> int:
     """
-    Collect spectrograms for tracks.
+    Collect spectrograms for tracks. With batch=True the whole set is handed to
+    a single spectrogram.flow_spectrogram_batch task on the spec queue.
 
     The flow performs the following steps:
         get track ids (only include rising tracks by verified artists and with
         preview_urls)
         for each track:
-            chain(
-                download spectrogram (if necessary),
-                push spectrogram
-            )
+            download preview, convert to spectrogram, and push it (in memory)
 
     repeat: 2/week
     """
-    remake_audio_dir = True
-    if settings.AUDIO_DIR.exists() and remake_audio_dir:
-        shutil.rmtree(settings.AUDIO_DIR)
-    settings.AUDIO_DIR.mkdir(parents=True, exist_ok=True)
-
-    settings.MP3_DIR.mkdir(parents=True, exist_ok=True)
-    settings.WAV_DIR.mkdir(parents=True, exist_ok=True)
+    if batch:
+        spectrogram.flow_spectrogram_batch.si(
+            rising_tracks_only=rising_tracks_only,
+            lag_days=lag_days,
+            skip=skip,
+            limit=limit,
+        ).apply_async(ignore_result=True)
+        return limit
 
     with session_scope() as db:
         if rising_tracks_only:
-            tracks = [
-                (t.id, t.preview_url)
-                for t in crud.track.get_rising_tracks_missing_spectrograms(
-                    db,
-                    lag_days=lag_days,
-                    order_by="growth_rate",
-                    skip=skip,
-                    limit=limit,
-                )
-            ]
+            rows = crud.track.get_rising_tracks_missing_spectrograms(
+                db,
+                lag_days=lag_days,
+                order_by="growth_rate",
+                skip=skip,
+                limit=limit,
+                stream=True,
+            )
         else:
-            tracks = [
-                (t.id, t.preview_url)
-                for t in crud.track.get_tracks_missing_spectrograms(
-                    db, lag_days=lag_days, skip=skip, limit=limit
-                )
-            ]
-
-    logger.info(f"Collecting spectrograms for {len(tracks)} tracks.")
-    for tid, preview_url in tracks:
-        spectrogram.flow_spectrogram.si(
-            track_id=tid, preview_url=preview_url
-        ).apply_async()
+            rows = crud.track.get_tracks_missing_spectrograms(
+                db, lag_days=lag_days, skip=skip, limit=limit, stream=True
+            )
+        total_tasks = dispatch(
+            dispatch_key(
+                self.name,
+                rising_tracks_only=rising_tracks_only,
+                lag_days=lag_days,
+                skip=skip,
+                limit=limit,
+            ),
+            ((t.id, t.preview_url) for t in rows),
+            spectrogram.push_spectrogram_workflow,
+            item_id=lambda track: track[0],
+            resume=resume,
+        )
 
-    total_tasks = len(tracks)
+    logger.info(f"Collecting spectrograms for {total_tasks} tracks.")
     return total_tasks
 
 
@@ -290,6 +408,7 @@ def flow_track_predictions(
     lag_days: int = 30,
     skip: int = 0,
     limit: int = 20_000,
+    stream: bool = True,
 ) -> int:
     """
     Generate track predictions for tracks.
@@ -302,6 +421,10 @@ def flow_track_predictions(
             generate predictions
             push track_id <> prediction to db
 
+    With stream=True the track ids are split into a few large
+    predict_tracks_stream tasks (settings.INFERENCE_TASK_SIZE ids each) instead
+    of one predict_tracks task per model batch.
+
 
     repeat: 3/week and/or as needed
     """
@@ -323,10 +446,16 @@ def flow_track_predictions(
 
     # Chunk track_ids
     total_tracks = len(track_ids)
+    if stream:
+        for tids in utils.chunkify(track_ids, chunk_size=settings.INFERENCE_TASK_SIZE):
+            track_prediction.predict_tracks_stream.si(
+                track_ids=tids, model_id=model_id
+            ).apply_async(ignore_result=True)
+        return total_tracks
+
     track_ids = utils.chunkify(track_ids, chunk_size=settings.MAX_BATCH_SIZE)
 
     logger.info(f"Created {len(track_ids)} tasks to generate track predictions!")
-    # TODO: bulk insert/update track preds
     for tids in track_ids:
         track_prediction.predict_tracks.si(
             track_ids=tids, model_id=model_id
@@ -394,13 +523,83 @@ def flow_track_distances(
     return len(td_canidate_pairs)
 
 
+MV_REFRESH_STATS_KEY = "MaterializedView::refresh_stats"
+
+
+@celery_app.task(bind=True, serializer="json")
+def refresh_materialized_view(
+    self, mv_name: str, concurrently: bool = False
+) -> Dict[str, Any]:
+    """
+    Refresh one materialized view and record its duration and (estimated) row
+    count in the MV_REFRESH_STATS_KEY hash.
+    """
+    with session_scope() as db:
+        stats = crud.materialized_view.refresh_view(
+            db, mv_name, concurrently=concurrently
+        )
+    stats["refreshed_at"] = datetime.datetime.utcnow().isoformat()
+    logger.info(f"Refreshed materialized view: {stats}")
+    celery_app.backend.client.hset(MV_REFRESH_STATS_KEY, mv_name, json.dumps(stats))
+    return stats
+
+
+@celery_app.task(bind=True, serializer="json")
+def warm_rising_tracks_cache(self) -> int:
+    """
+    Invalidate the cached /tracks/rising-tracks responses and cache the ones of
+    settings.RISING_TRACKS_CACHE_WARM again, returning the new cache generation.
+    Runs after the materialized views are refreshed and after new playcounts are
+    pushed (see track_playcount.schedule_rising_tracks_warm).
+    """
+    generation = rising_tracks_cache.bump()
+    with session_scope() as db:
+        for overrides in settings.RISING_TRACKS_CACHE_WARM:
+            filters = schemas.TrackRisingFilter(**overrides).dict()
+            payload = jsonable_encoder(
+                crud.track.get_rising_tracks_response(db, **filters)
+            )
+            rising_tracks_cache.set(filters, payload, generation)
+    logger.info(
+        f"Warmed {len(settings.RISING_TRACKS_CACHE_WARM)} rising tracks responses "
+        f"(generation {generation})"
+    )
+    return generation
+
+
 @celery_app.task(bind=True)
 def flow_refresh_materialized_views(self) -> List[str]:
     """
     Refresh all materialized views in the db and return a list with their
     names.
+
+    Views refresh in dependency order, the views of each level in parallel (a
+    task, and db connection, per view), using REFRESH ... CONCURRENTLY wherever
+    the view has a unique index so readers (eg, /rising-tracks) aren't blocked.
     """
-    # TODO: create object with list of materialized views
     with session_scope() as db:
-        refreshed_mv_list = crud.materialized_view.refresh_all(db)
-        return refreshed_mv_list
+        views = crud.materialized_view.get_views(db)
+    levels = crud.materialized_view.refresh_levels(views)
+    if not levels:
+        warm_rising_tracks_cache.si().apply_async()
+        return []
+
+    blocking = sorted(name for name, view in views.items() if not view.concurrently)
+    if blocking:
+        logger.warning(
+            f"Materialized views without a unique index block readers: {blocking}"
+        )
+    workflow = chain(
+        *[
+            group(
+                refresh_materialized_view.si(
+                    mv_name=name, concurrently=views[name].concurrently
+                )
+                for name in level
+            )
+            for level in levels
+        ],
+        warm_rising_tracks_cache.si(),
+    )
+    workflow.apply_async()
+    return [name for level in levels for name in level]
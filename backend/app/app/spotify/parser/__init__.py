@@ -7,3 +7,4 @@ from .parse_album import album
 from .parse_track_playcount import track_playcount
 from .parse_genre import genre
 from .parse_spectrogram import spectrogram
+from .parse_track_embedding import track_embedding
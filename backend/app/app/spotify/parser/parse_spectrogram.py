@@ -7,11 +7,16 @@ import librosa as lb
 import requests
 from requests.exceptions import ConnectionError
 from pydub import AudioSegment
+from celery.utils.log import get_task_logger
 
 from app.core.config import settings
 from app.spotify.parser.base import ParseBase
+from app.spotify.parser import spectrogram_codec
+from app.spotify import transport
 from app.schemas.spectrogram import Spectrogram, SpectrogramCreate
 
+logger = get_task_logger(__name__)
+
 
 class ParseSpectrogram(ParseBase[Spectrogram, SpectrogramCreate]):
     def __init__(self, model: Spectrogram):
@@ -23,13 +28,130 @@ class ParseSpectrogram(ParseBase[Spectrogram, SpectrogramCreate]):
 
     def clip_spectrogram(self, song: np.ndarray, length: int = 1765) -> np.ndarray:
         # spec needs 1765 length for the model
-        clipped = np.zeros((96, length))
+        clipped = np.zeros((96, length), dtype=np.float32)
         if song.shape[1] < length:
             clipped[:96, : song.shape[1]] = song[:96, : song.shape[1]]
         else:
             clipped[:96, :length] = song[:96, :length]
         return clipped
 
+    def download_audio(
+        self,
+        track_id: str,
+        preview_url: str,
+        *,
+        conn_timeout: int = 3,
+        read_timeout: int = int(60 * 1.5),
+        attempts: int = 3,
+        session: Optional[requests.Session] = None,
+    ) -> Optional[bytes]:
+        """
+        Download a preview mp3 into memory, over the shared keep-alive session
+        unless one is given.
+        """
+        get = (session or transport.get_session()).get
+        for _ in range(attempts):
+            try:
+                r = get(
+                    preview_url,
+                    headers=self.headers,
+                    timeout=(conn_timeout, read_timeout),
+                )
+            except ConnectionError:
+                logger.warning(f"Conn. Error: {track_id}")
+                continue
+            if r.ok and r.content:
+                return r.content
+        return None
+
+    def decode_audio(
+        self,
+        audio: bytes,
+        *,
+        sample_rate: int = settings.SAMPLE_RATE,
+        duration: int = 30,
+        audio_format: str = "mp3",
+    ) -> np.ndarray:
+        """
+        Decode compressed audio bytes to a mono float32 PCM array at sample_rate,
+        like librosa.load would from a WAV file.
+        """
+        segment = AudioSegment.from_file(io.BytesIO(audio), format=audio_format)
+        segment = segment[: duration * 1000]
+        samples = np.array(segment.get_array_of_samples(), dtype=np.float32)
+        if segment.channels > 1:
+            samples = samples.reshape(-1, segment.channels).mean(axis=1)
+        samples /= float(1 << (8 * segment.sample_width - 1))
+        if segment.frame_rate != sample_rate:
+            samples = lb.resample(
+                samples,
+                orig_sr=segment.frame_rate,
+                target_sr=sample_rate,
+                res_type="kaiser_fast",
+            )
+        return samples.astype(np.float32, copy=False)
+
+    def audio2spec(
+        self,
+        track_id: str,
+        y: np.ndarray,
+        *,
+        sr: int = settings.SAMPLE_RATE,
+        spectrogram_type: str = settings.SPECTROGRAM_TYPE,
+        hop_size: int = settings.HOP_SIZE,
+        window_size: int = settings.WINDOW_SIZE,
+        n_mels: int = settings.N_MELS,
+    ) -> SpectrogramCreate:
+        """
+        Convert a PCM array to a valid Spectrogram object.
+        """
+        if spectrogram_type != settings.SPECTROGRAM_TYPE:
+            raise ValueError(
+                f"{settings.SPECTROGRAM_TYPE} is the only supported spectrogram type."
+            )
+        # Convert audio to log mel-spectrogram.
+        spec = lb.feature.melspectrogram(
+            y=y, sr=sr, hop_length=hop_size, n_fft=window_size, n_mels=n_mels,
+        ).astype(np.float32)
+        spec = self.clip_spectrogram(np.log10(10000 * spec + 1))
+        return SpectrogramCreate(
+            track_id=track_id,
+            spectrogram_type=spectrogram_type,
+            hop_size=hop_size,
+            window_size=window_size,
+            n_mels=n_mels,
+            is_corrupt=False,
+            spectrogram=self.numpy2spec(spec),
+        )
+
+    def url2spec(
+        self,
+        track_id: str,
+        preview_url: str,
+        *,
+        spectrogram_type: str = settings.SPECTROGRAM_TYPE,
+        hop_size: int = settings.HOP_SIZE,
+        window_size: int = settings.WINDOW_SIZE,
+        n_mels: int = settings.N_MELS,
+    ) -> Optional[SpectrogramCreate]:
+        """
+        Download a preview, decode it and convert it to a Spectrogram object,
+        all in memory.
+        """
+        audio = self.download_audio(track_id, preview_url)
+        if not audio:
+            return None
+        y = self.decode_audio(audio, sample_rate=settings.SAMPLE_RATE)
+        return self.audio2spec(
+            track_id,
+            y,
+            sr=settings.SAMPLE_RATE,
+            spectrogram_type=spectrogram_type,
+            hop_size=hop_size,
+            window_size=window_size,
+            n_mels=n_mels,
+        )
+
     def download_wav(
         self,
         track_id: str,
@@ -114,9 +236,7 @@ class ParseSpectrogram(ParseBase[Spectrogram, SpectrogramCreate]):
             spec = self.clip_spectrogram(np.log10(10000 * spec + 1))
 
             # Write spectrogram out to bytes file-like object
-            output = io.BytesIO()
-            np.save(output, spec)
-            output.seek(0)
+            output = io.BytesIO(self.numpy2spec(spec))
         except Exception as e:
             print(f"Error converting wav to spectrogram: {wav_path}")
             raise e
@@ -149,9 +269,30 @@ class ParseSpectrogram(ParseBase[Spectrogram, SpectrogramCreate]):
         finally:
             return spec_obj
 
+    def numpy2spec(
+        self,
+        spec: np.ndarray,
+        dtype: str = settings.SPECTROGRAM_DTYPE,
+        compression: str = settings.SPECTROGRAM_COMPRESSION,
+        level: int = settings.SPECTROGRAM_COMPRESSION_LEVEL,
+    ) -> bytes:
+        """
+        Encode a spectrogram to the compact blob stored in spectrogram.spectrogram.
+        """
+        return spectrogram_codec.encode(
+            spec, dtype=dtype, compression=compression, level=level
+        )
+
     def spec2numpy(self, track_id: str, spectrogram: bytes) -> Optional[np.ndarray]:
+        """
+        Decode a spectrogram blob, either the versioned format or a legacy
+        `np.save` blob. Returns None if the blob is corrupt.
+        """
         try:
-            return np.load(io.BytesIO(spectrogram))
+            return spectrogram_codec.decode(spectrogram)
+        except spectrogram_codec.CodecUnavailableError:
+            # Not corrupt, this worker is just missing a compression library.
+            raise
         except Exception as corrupt_spec:
             print(f"Corrupted spectrogram: {track_id} \n {corrupt_spec}")
             return None
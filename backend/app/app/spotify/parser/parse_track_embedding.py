@@ -0,0 +1,41 @@
+from typing import Union
+from datetime import datetime
+
+import numpy as np
+
+from app.spotify.parser.base import ParseBase
+from app.schemas.track_embedding import TrackEmbedding, TrackEmbeddingCreate
+
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+
+class ParseTrackEmbedding(ParseBase[TrackEmbedding, TrackEmbeddingCreate]):
+    def from_numpy(
+        self, *, track_id: str, model_id: str, embedding: np.ndarray
+    ) -> TrackEmbeddingCreate:
+        """
+        Parse a valid TrackEmbedding object from a model feature vector.
+        """
+        return TrackEmbeddingCreate(
+            track_id=track_id,
+            model_id=model_id,
+            date=datetime.now(),
+            embedding=self.numpy2bytes(embedding),
+        )
+
+    def numpy2bytes(self, embedding: np.ndarray) -> bytes:
+        """
+        Encode a feature vector as compact little-endian float32 bytes.
+        """
+        return np.ascontiguousarray(embedding, dtype=EMBEDDING_DTYPE).tobytes()
+
+    def bytes2numpy(self, embedding: Union[bytes, memoryview]) -> np.ndarray:
+        """
+        Decode the bytes stored in track_embedding.embedding to a float32 vector.
+        """
+        return np.frombuffer(bytes(embedding), dtype=EMBEDDING_DTYPE).astype(
+            np.float32
+        )
+
+
+track_embedding = ParseTrackEmbedding(TrackEmbedding)
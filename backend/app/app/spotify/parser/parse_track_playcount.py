@@ -7,16 +7,6 @@ from app.schemas import TrackPlaycount, TrackPlaycountCreate
 
 
 class ParseTrackPlaycount(ParseBase[TrackPlaycount, TrackPlaycountCreate]):
-    def make_id(self, *, track_id: str, date: Optional[datetime.date] = None) -> str:
-        """
-        Create valid track_playcount id.
-        """
-        if not date:
-            date = datetime.date.today().strftime("%Y-%m-%d")
-        else:
-            date = date.strftime("%Y-%m-%d")
-        return f"{track_id}_{date}"
-
     def from_dict(self, *, obj_in: List[Dict[str, Any]]) -> Optional[TrackPlaycount]:
         """
         Parse valid TrackPlaycount object from dict.
@@ -43,9 +33,6 @@ class ParseTrackPlaycount(ParseBase[TrackPlaycount, TrackPlaycountCreate]):
 
         copy_obj["track_id"] = tid
         copy_obj["date"] = datetime.date.today()
-        copy_obj["id"] = self.make_id(
-            track_id=copy_obj["track_id"], date=copy_obj["date"]
-        )
 
         return TrackPlaycount(**copy_obj)
 
@@ -0,0 +1,160 @@
+"""
+Versioned binary format for spectrogram.spectrogram blobs.
+
+Layout (little-endian): a 24 byte header followed by the (optionally compressed)
+array data.
+
+    magic        4s   b"MHSP"
+    version      B    format version (1)
+    dtype        B    1 = float16, 2 = uint8 (linearly quantized)
+    compression  B    0 = none, 1 = zlib, 2 = zstd, 3 = lz4
+    reserved     B
+    rows, cols   II   array shape
+    scale        f    uint8 dequantization: value = q * scale + offset
+    offset       f
+
+Rows written before this format are plain `np.save` blobs, `decode` still reads
+those.
+"""
+from typing import Tuple
+import io
+import struct
+import zlib
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover
+    lz4_frame = None
+
+
+MAGIC = b"MHSP"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBBIIff")
+
+DTYPES = {"float16": 1, "uint8": 2}
+COMPRESSIONS = {"none": 0, "zlib": 1, "zstd": 2, "lz4": 3}
+
+
+class CodecUnavailableError(RuntimeError):
+    """
+    The blob is valid but needs a compression library that isn't installed.
+    """
+
+
+def is_encoded(blob: bytes) -> bool:
+    return bytes(blob[: len(MAGIC)]) == MAGIC
+
+
+def available_compression(compression: str) -> str:
+    """
+    Return `compression` if its library is installed, else fall back to zlib.
+    """
+    if compression == "zstd" and zstandard is None:
+        return "zlib"
+    if compression == "lz4" and lz4_frame is None:
+        return "zlib"
+    return compression
+
+
+def _compress(data: bytes, compression: str, level: int) -> bytes:
+    if compression == "none":
+        return data
+    if compression == "zlib":
+        return zlib.compress(data, level)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if compression == "lz4":
+        return lz4_frame.compress(data, compression_level=level)
+    raise ValueError(f"Unsupported spectrogram compression: {compression}")
+
+
+def _decompress(data: bytes, compression_code: int) -> bytes:
+    if compression_code == COMPRESSIONS["none"]:
+        return data
+    if compression_code == COMPRESSIONS["zlib"]:
+        return zlib.decompress(data)
+    if compression_code == COMPRESSIONS["zstd"]:
+        if zstandard is None:
+            raise CodecUnavailableError("zstandard is needed to read this spectrogram")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression_code == COMPRESSIONS["lz4"]:
+        if lz4_frame is None:
+            raise CodecUnavailableError("lz4 is needed to read this spectrogram")
+        return lz4_frame.decompress(data)
+    raise ValueError(f"Unknown spectrogram compression code: {compression_code}")
+
+
+def _quantize(spec: np.ndarray) -> Tuple[np.ndarray, float, float]:
+    offset = float(spec.min()) if spec.size else 0.0
+    span = float(spec.max()) - offset if spec.size else 0.0
+    scale = span / 255.0 if span > 0 else 1.0
+    quantized = np.rint((spec - offset) / scale)
+    return np.clip(quantized, 0, 255).astype(np.uint8), scale, offset
+
+
+def encode(
+    spec: np.ndarray,
+    dtype: str = "float16",
+    compression: str = "zlib",
+    level: int = 3,
+) -> bytes:
+    """
+    Encode a 2d spectrogram into the versioned blob format.
+    """
+    spec = np.asarray(spec, dtype=np.float32)
+    if spec.ndim != 2:
+        raise ValueError(f"Expected a 2d spectrogram, got shape {spec.shape}")
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported spectrogram dtype: {dtype}")
+    compression = available_compression(compression)
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported spectrogram compression: {compression}")
+
+    scale, offset = 1.0, 0.0
+    if dtype == "uint8":
+        data, scale, offset = _quantize(spec)
+    else:
+        data = spec.astype("<f2")
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        DTYPES[dtype],
+        COMPRESSIONS[compression],
+        0,
+        spec.shape[0],
+        spec.shape[1],
+        scale,
+        offset,
+    )
+    return header + _compress(np.ascontiguousarray(data).tobytes(), compression, level)
+
+
+def decode(blob: bytes) -> np.ndarray:
+    """
+    Decode a spectrogram blob (versioned or legacy `np.save`) to a float32 array.
+    """
+    blob = bytes(blob)
+    if not is_encoded(blob):
+        return np.load(io.BytesIO(blob)).astype(np.float32, copy=False)
+
+    _, version, dtype_code, compression_code, _, rows, cols, scale, offset = (
+        HEADER.unpack_from(blob)
+    )
+    if version != VERSION:
+        raise ValueError(f"Unknown spectrogram format version: {version}")
+    data = _decompress(blob[HEADER.size :], compression_code)  # noqa: E203
+    if dtype_code == DTYPES["float16"]:
+        spec = np.frombuffer(data, dtype="<f2").astype(np.float32)
+    elif dtype_code == DTYPES["uint8"]:
+        spec = np.frombuffer(data, dtype=np.uint8).astype(np.float32)
+        spec = spec * np.float32(scale) + np.float32(offset)
+    else:
+        raise ValueError(f"Unknown spectrogram dtype code: {dtype_code}")
+    return spec.reshape(rows, cols)
@@ -2,5 +2,6 @@ from .tasks import (
     flow_playlist_tracks,
     fetch_playlist_tracks,
     push_playlist_tracks,
+    playlist_tracks_workflow,
 )
 
@@ -74,10 +74,14 @@ def push_playlist_tracks(self, tracks: List[Dict[str, Any]], playlist_id: str) -
         return new_tracks
 
 
-# @celery_app.task(bind=True, task_time_limit=6, ignore_result=True, serializer="json")
-def flow_playlist_tracks(playlist_id: str, track_limit: int = 300) -> None:
-    workflow = fetch_playlist_tracks.si(
+def playlist_tracks_workflow(playlist_id: str, track_limit: int = 300) -> Any:
+    return fetch_playlist_tracks.si(
         playlist_id=playlist_id, limit=track_limit
     ) | push_playlist_tracks.s(playlist_id=playlist_id)
+
+
+# @celery_app.task(bind=True, task_time_limit=6, ignore_result=True, serializer="json")
+def flow_playlist_tracks(playlist_id: str, track_limit: int = 300) -> None:
+    workflow = playlist_tracks_workflow(playlist_id, track_limit=track_limit)
     workflow.apply_async(ignore_result=True)
     # return workflow()
@@ -0,0 +1,195 @@
+"""
+Distributed token bucket rate limiter shared by every worker through Redis.
+
+Each (credential, endpoint family) pair gets its own bucket, so one Spotify
+account (or the spapi container) is paced across all workers instead of each
+task sleeping on its own. A 429's Retry-After blocks the bucket for everyone
+until it passes.
+"""
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+import hashlib
+import time
+
+from celery.utils.log import get_task_logger
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.spotify.token_manager import token_manager
+
+
+logger = get_task_logger(__name__)
+
+# KEYS: bucket, blocked_until. ARGV: rate (tokens/sec), capacity.
+# Returns 0 when a token was taken, else the ms to wait before trying again.
+ACQUIRE_SCRIPT = """
+pcall(redis.replicate_commands)
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+
+local blocked = tonumber(redis.call('GET', KEYS[2]) or '0')
+if blocked > now then
+    return blocked - now
+end
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HMSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+return wait
+"""
+
+# KEYS: blocked_until. ARGV: block duration in ms.
+BLOCK_SCRIPT = """
+pcall(redis.replicate_commands)
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local blocked_until = now + tonumber(ARGV[1])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if blocked_until > current then
+    redis.call('SET', KEYS[1], blocked_until, 'PX', tonumber(ARGV[1]))
+end
+return blocked_until
+"""
+
+
+def endpoint_family(url: str) -> str:
+    """
+    Map a request url to the endpoint family whose budget it spends.
+    """
+    host = urlparse(url).netloc
+    if host == "api.spotify.com":
+        return "web-api"
+    if host.startswith("spclient"):
+        return "spclient"
+    if host == urlparse(str(settings.SPAPI_URL)).netloc:
+        return "spapi"
+    return "default"
+
+
+def credential_key(headers: Optional[Dict[str, str]]) -> str:
+    """
+    Identify the credential behind a request by the account its bearer token
+    was issued to, so the budget follows the account across token renewals.
+    Tokens the token manager didn't hand out fall back to a short hash.
+    """
+    auth = (headers or {}).get("Authorization")
+    if not auth:
+        return "anonymous"
+    user = token_manager.owner(auth.split(" ", 1)[-1])
+    if user is not None:
+        return f"user:{user}"
+    return hashlib.sha1(auth.encode("utf-8")).hexdigest()[:16]
+
+
+def parse_retry_after(value: Optional[str], default: float) -> float:
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        limits: Dict[str, Tuple[float, float]],
+        prefix: str = "RateLimit",
+        max_wait: float = settings.RATE_LIMIT_MAX_WAIT,
+        enabled: bool = settings.RATE_LIMIT_ENABLED,
+    ):
+        """
+        `limits` maps an endpoint family to its (tokens per second, burst capacity)
+        per credential.
+        """
+        self.limits = limits
+        self.prefix = prefix
+        self.max_wait = max_wait
+        self.enabled = enabled
+        self._acquire = None
+        self._block = None
+
+    def _scripts(self):
+        if self._acquire is None:
+            client = celery_app.backend.client
+            self._acquire = client.register_script(ACQUIRE_SCRIPT)
+            self._block = client.register_script(BLOCK_SCRIPT)
+        return self._acquire, self._block
+
+    def _keys(self, credential: str, family: str) -> Tuple[str, str]:
+        base = f"{self.prefix}::{family}::{credential}"
+        return base, f"{base}::blocked_until"
+
+    def reserve(self, credential: str, family: str) -> float:
+        """
+        Try to take a token.
+
+        Returns:
+            0 if a token was taken, else the seconds to wait before trying again.
+        """
+        if not self.enabled or family not in self.limits:
+            return 0.0
+        rate, capacity = self.limits[family]
+        try:
+            acquire, _ = self._scripts()
+            wait_ms = acquire(
+                keys=self._keys(credential, family), args=[rate, capacity]
+            )
+        except Exception as err:
+            # Fail open: a Redis hiccup shouldn't stop the scrapers.
+            logger.warning(f"Rate limiter unavailable, not throttling: {err}")
+            return 0.0
+        return int(wait_ms) / 1000
+
+    def acquire(self, credential: str, family: str) -> bool:
+        """
+        Block until a token is available, for up to max_wait seconds.
+
+        Returns:
+            False if max_wait ran out without a token (having waited it out, so
+            callers can simply call again), True otherwise.
+        """
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            wait = self.reserve(credential, family)
+            if wait <= 0:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"Rate limit wait exceeded for {family}::{credential}")
+                return False
+            time.sleep(min(wait, remaining))
+
+    def block(self, credential: str, family: str, seconds: float) -> None:
+        """
+        Stop every worker from using the bucket for `seconds` (eg, Retry-After).
+        """
+        if not self.enabled or seconds <= 0:
+            return
+        try:
+            _, block = self._scripts()
+            block(
+                keys=[self._keys(credential, family)[1]],
+                args=[int(seconds * 1000)],
+            )
+        except Exception as err:
+            logger.warning(f"Rate limiter unavailable, not blocking: {err}")
+
+
+rate_limiter = RateLimiter(
+    limits={
+        "web-api": (settings.RATE_LIMIT_WEB_API, settings.RATE_LIMIT_WEB_API_BURST),
+        "spclient": (settings.RATE_LIMIT_SPCLIENT, settings.RATE_LIMIT_SPCLIENT_BURST),
+        "spapi": (settings.RATE_LIMIT_SPAPI, settings.RATE_LIMIT_SPAPI_BURST),
+    }
+)
@@ -1,8 +1,8 @@
 from typing import Dict, Any, Optional
 
-import requests
 from celery.utils.log import get_task_logger
 from .utils import combine_date
+from . import transport
 from app.core.config import settings
 
 logger = get_task_logger(__name__)
@@ -27,7 +27,7 @@ class SpAPI(object):
     ) -> Optional[Dict[str, Any]]:
         """ Helper method to process a SpAPI request. """
         try:
-            resp = requests.get(url, timeout=(conn_timeout, read_timeout))
+            resp = transport.get(url, timeout=(conn_timeout, read_timeout))
             if resp.status_code == 200:
                 result = resp.json()
                 if result.get("success", False):
@@ -1,2 +1,10 @@
-from .tasks import download_wav, push_spectrogram, flow_spectrogram
+from .tasks import (
+    download_wav,
+    push_spectrogram,
+    push_spectrogram_from_url,
+    push_spectrogram_workflow,
+    flow_spectrogram,
+    migrate_spectrograms,
+    flow_spectrogram_batch,
+)
 
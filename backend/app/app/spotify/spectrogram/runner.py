@@ -0,0 +1,214 @@
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+import threading
+import time
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from celery.utils.log import get_task_logger
+
+from app.core.config import settings
+from app.db.session import session_scope
+
+from app import crud
+from app.spotify import parser
+
+
+logger = get_task_logger(__name__)
+
+
+class StageStats:
+    """
+    Counters and timings for one stage of the runner. `pending` is the stage's
+    current queue depth (submitted, not yet finished).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.seconds = 0.0
+        self.max_pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self.submitted - self.completed - self.failed
+
+    def submit(self, count: int = 1) -> None:
+        with self._lock:
+            self.submitted += count
+            self.max_pending = max(self.max_pending, self.pending)
+
+    def done(self, seconds: float, failed: bool = False, count: int = 1) -> None:
+        with self._lock:
+            self.seconds += seconds
+            if failed:
+                self.failed += count
+            else:
+                self.completed += count
+
+    def dict(self) -> Dict[str, Any]:
+        finished = self.completed + self.failed
+        return dict(
+            submitted=self.submitted,
+            completed=self.completed,
+            failed=self.failed,
+            pending=self.pending,
+            max_pending=self.max_pending,
+            seconds=round(self.seconds, 3),
+            avg_seconds=round(self.seconds / finished, 4) if finished else 0.0,
+        )
+
+
+class SpectrogramBatchRunner:
+    """
+    Generate spectrograms for many tracks on one box.
+
+    Previews are downloaded and decoded by a bounded thread pool (network bound)
+    while the calling thread computes the mel spectrograms (cpu bound) of the
+    finished downloads, and finished rows are bulk inserted every
+    insert_batch_size tracks. At most max_in_flight downloads are held in memory.
+
+    The mel stage runs in the caller, not a process pool: the runner is used from
+    celery tasks, where a prefork (daemonic) child can't start processes and a
+    gevent worker shouldn't. Give it a worker of its own (the spec queue) to use
+    more cores.
+    """
+
+    def __init__(
+        self,
+        download_workers: int = settings.SPECTROGRAM_DOWNLOAD_WORKERS,
+        max_in_flight: Optional[int] = None,
+        insert_batch_size: int = 200,
+        spectrogram_type: str = settings.SPECTROGRAM_TYPE,
+        hop_size: int = settings.HOP_SIZE,
+        window_size: int = settings.WINDOW_SIZE,
+        n_mels: int = settings.N_MELS,
+    ):
+        self.download_workers = download_workers
+        self.max_in_flight = max_in_flight or 2 * self.download_workers
+        self.insert_batch_size = insert_batch_size
+        self.spec_params = dict(
+            spectrogram_type=spectrogram_type,
+            hop_size=hop_size,
+            window_size=window_size,
+            n_mels=n_mels,
+        )
+        self.download = StageStats("download")
+        self.mel = StageStats("mel")
+        self.insert = StageStats("insert")
+        self.started: Optional[float] = None
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=download_workers, pool_maxsize=download_workers
+        )
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return dict(
+            seconds=round(elapsed, 3),
+            tracks_per_sec=round(self.insert.completed / elapsed, 2)
+            if elapsed
+            else 0.0,
+            download=self.download.dict(),
+            mel=self.mel.dict(),
+            insert=self.insert.dict(),
+        )
+
+    def _fetch(self, track_id: str, preview_url: str) -> Tuple[str, np.ndarray]:
+        start = time.perf_counter()
+        try:
+            audio = parser.spectrogram.download_audio(
+                track_id, preview_url, session=self._session
+            )
+            if not audio:
+                raise ValueError(f"Empty preview download: {track_id}")
+            y = parser.spectrogram.decode_audio(audio)
+        except Exception:
+            self.download.done(time.perf_counter() - start, failed=True)
+            raise
+        self.download.done(time.perf_counter() - start)
+        return track_id, y
+
+    def _mel(self, track_id: str, y: np.ndarray) -> Optional[Dict[str, Any]]:
+        self.mel.submit()
+        start = time.perf_counter()
+        try:
+            row = parser.spectrogram.audio2spec(
+                track_id, y, sr=settings.SAMPLE_RATE, **self.spec_params
+            ).dict()
+        except Exception as err:
+            self.mel.done(time.perf_counter() - start, failed=True)
+            logger.warning(f"Spectrogram failed: {track_id} ({err})")
+            return None
+        self.mel.done(time.perf_counter() - start)
+        return row
+
+    def _flush(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        self.insert.submit(len(rows))
+        start = time.perf_counter()
+        with session_scope() as db:
+            ok = crud.spectrogram.create_multi(db, objs_in=rows)
+        self.insert.done(time.perf_counter() - start, failed=not ok, count=len(rows))
+        rows.clear()
+
+    def run(
+        self,
+        tracks: List[Tuple[str, str]],
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Generate and push spectrograms for a list of (track_id, preview_url).
+        `progress` is called with the current stats after every bulk insert.
+
+        Returns:
+            The per stage stats of the run.
+        """
+        self.started = time.perf_counter()
+        tracks = iter(tracks)
+        rows: List[Dict[str, Any]] = []
+        downloads: Dict[Future, str] = {}
+        with ThreadPoolExecutor(self.download_workers) as download_pool:
+
+            def fill() -> None:
+                while len(downloads) < self.max_in_flight:
+                    track = next(tracks, None)
+                    if track is None:
+                        return
+                    self.download.submit()
+                    future = download_pool.submit(self._fetch, *track)
+                    downloads[future] = track[0]
+
+            fill()
+            while downloads:
+                done, _ = wait(list(downloads), return_when=FIRST_COMPLETED)
+                for future in done:
+                    track_id = downloads.pop(future)
+                    if future.exception() is not None:
+                        logger.warning(
+                            f"Preview download failed: {track_id} "
+                            f"({future.exception()})"
+                        )
+                        continue
+                    # Keep the download pool busy while this thread computes.
+                    fill()
+                    row = self._mel(*future.result())
+                    if row is None:
+                        continue
+                    rows.append(row)
+                    if len(rows) >= self.insert_batch_size:
+                        self._flush(rows)
+                        if progress is not None:
+                            progress(self.stats())
+                fill()
+        self._flush(rows)
+        stats = self.stats()
+        logger.info(f"Spectrogram batch complete: {stats}")
+        return stats
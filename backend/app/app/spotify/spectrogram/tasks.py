@@ -1,4 +1,4 @@
-from typing import List, Optional, Dict, Any, Union, Tuple
+from typing import List, Optional, Dict, Any, Union, Tuple, Sequence
 from pathlib import Path
 
 from celery import group, chord
@@ -12,6 +12,8 @@ from app.db.session import session_scope
 
 from app import crud, schemas
 from app.spotify import parser
+from app.spotify.parser import spectrogram_codec
+from .runner import SpectrogramBatchRunner
 
 
 logger = get_task_logger(__name__)
@@ -51,6 +53,43 @@ def push_spectrogram(
             return {"track_id": wav_path.stem, "is_corrupt": True}
 
 
+@celery_app.task(bind=True, task_time_limit=60, serializer="json", queue="spec")
+def push_spectrogram_from_url(
+    self,
+    track_id: str,
+    preview_url: str,
+    spectrogram_type: str = settings.SPECTROGRAM_TYPE,
+    hop_size: Optional[int] = settings.HOP_SIZE,
+    window_size: Optional[int] = settings.WINDOW_SIZE,
+    n_mels: Optional[int] = settings.N_MELS,
+) -> Dict[str, Any]:
+    """
+    Download a preview, convert it to a spectrogram and push it to the db in one
+    task. Audio never touches the disk, so any worker can run it.
+    """
+    spec = parser.spectrogram.url2spec(
+        track_id,
+        preview_url,
+        spectrogram_type=spectrogram_type,
+        hop_size=hop_size,
+        window_size=window_size,
+        n_mels=n_mels,
+    )
+    if not spec:
+        return {"track_id": track_id, "is_corrupt": True}
+    with session_scope() as db:
+        spec = crud.spectrogram.create(db, obj_in=spec)
+        return {"track_id": spec.track_id, "is_corrupt": spec.is_corrupt}
+
+
+def push_spectrogram_workflow(track: Sequence[str]) -> Any:
+    """
+    push_spectrogram_from_url for a (track_id, preview_url) pair.
+    """
+    track_id, preview_url = track
+    return push_spectrogram_from_url.si(track_id=track_id, preview_url=preview_url)
+
+
 @celery_app.task(bind=True, ignore_result=True, serializer="json")
 def flow_spectrogram(
     self,
@@ -82,16 +121,100 @@ def flow_spectrogram(
                     # Spectrogram already in db
                     return
 
-    workflow = download_wav.si(
-        track_id=track_id, preview_url=preview_url
-    ) | push_spectrogram.s(
+    push_spectrogram_from_url.si(
+        track_id=track_id,
+        preview_url=preview_url,
         spectrogram_type=spectrogram_type,
         hop_size=hop_size,
         window_size=window_size,
         n_mels=n_mels,
+    ).apply_async()
+
+
+@celery_app.task(bind=True, serializer="json", queue="spec")
+def migrate_spectrograms(
+    self,
+    after_id: int = 0,
+    batch_size: int = 500,
+    max_batches: Optional[int] = None,
+    dtype: str = settings.SPECTROGRAM_DTYPE,
+    compression: str = settings.SPECTROGRAM_COMPRESSION,
+) -> Dict[str, int]:
+    """
+    Rewrite spectrograms stored in the legacy `np.save` format to the compact
+    versioned format, batch_size rows at a time in id order. Unreadable rows are
+    flagged as corrupt. Runs until no legacy rows are left (or max_batches).
+
+    Returns:
+        The number of migrated and corrupt rows, and the last id processed.
+    """
+    migrated, corrupt, batches = 0, 0, 0
+    with session_scope() as db:
+        while max_batches is None or batches < max_batches:
+            rows = crud.spectrogram.get_batch_not_in_format(
+                db,
+                magic=spectrogram_codec.MAGIC,
+                after_id=after_id,
+                limit=batch_size,
+            )
+            if not rows:
+                break
+            updates, corrupt_ids = [], []
+            for row in rows:
+                spec_np = parser.spectrogram.spec2numpy(row.track_id, row.spectrogram)
+                if spec_np is None:
+                    corrupt_ids.append(row.id)
+                    continue
+                updates.append(
+                    dict(
+                        id=row.id,
+                        spectrogram=parser.spectrogram.numpy2spec(
+                            spec_np, dtype=dtype, compression=compression
+                        ),
+                    )
+                )
+            if not crud.spectrogram.update_spectrogram_multi(db, objs_in=updates):
+                break
+            crud.spectrogram.update_is_corrupt_multi(db, ids=corrupt_ids)
+            migrated += len(updates)
+            corrupt += len(corrupt_ids)
+            batches += 1
+            after_id = rows[-1].id
+            logger.info(f"Migrated spectrograms up to id {after_id} ({migrated})")
+    return {"migrated": migrated, "corrupt": corrupt, "last_id": after_id}
+
+
+@celery_app.task(bind=True, serializer="json", queue="spec")
+def flow_spectrogram_batch(
+    self,
+    rising_tracks_only: Optional[bool] = True,
+    lag_days: Optional[int] = 30,
+    skip: Optional[int] = 0,
+    limit: Optional[int] = 1_000,
+    download_workers: int = settings.SPECTROGRAM_DOWNLOAD_WORKERS,
+) -> Dict[str, Any]:
+    """
+    Generate spectrograms for the tracks missing them with a
+    SpectrogramBatchRunner on this worker, instead of one task per track.
+
+    Returns:
+        The runner's per stage stats.
+    """
+    with session_scope() as db:
+        if rising_tracks_only:
+            tracks = crud.track.get_rising_tracks_missing_spectrograms(
+                db, lag_days=lag_days, order_by="growth_rate", skip=skip, limit=limit
+            )
+        else:
+            tracks = crud.track.get_tracks_missing_spectrograms(
+                db, lag_days=lag_days, skip=skip, limit=limit
+            )
+        tracks = [(t.id, t.preview_url) for t in tracks]
+
+    runner = SpectrogramBatchRunner(download_workers=download_workers)
+    return runner.run(
+        tracks, progress=lambda stats: self.update_state(state="PROGRESS", meta=stats)
     )
-    workflow.apply_async()
-    # return workflow()
 
 
 # TODO: Write get spectrograms by track id function
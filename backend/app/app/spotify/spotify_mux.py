@@ -1,11 +1,12 @@
-import time
-from datetime import date, datetime
+from datetime import date
 from typing import Optional, Dict, Any, Union, List
 
 from celery.utils.log import get_task_logger
 
 from .config import SPOTIFY_CREDS, INFLUENTIAL_PLAYLIST_THRESH
 from .utils import chunkify
+from . import transport
+from .token_manager import token_manager
 from app.core.celery_app import celery_app
 
 from app import crud, schemas
@@ -15,7 +16,6 @@ from app import crud, schemas
 import pandas as pd
 import requests
 from requests.exceptions import ConnectTimeout, ReadTimeout
-import spotify_token as st
 
 # from celery import group
 from sqlalchemy.orm import Session
@@ -26,14 +26,6 @@ logger = get_task_logger(__name__)
 
 # Use redis queue to access spotify users across workers.
 redis = celery_app.backend
-REFRESH_TOKEN_THRESH = 120
-
-for user, data in SPOTIFY_CREDS.items():
-    expires_at = int(redis.get(f"SpotifyMux::{user}::expires_at") or b"0")
-    if datetime.now() > datetime.fromtimestamp(expires_at):
-        auth_token, expires_at = st.start_session(data["sp_dc"], data["sp_key"])
-        redis.set(f"SpotifyMux::{user}::auth_token", auth_token)
-        redis.set(f"SpotifyMux::{user}::expires_at", expires_at)
 
 
 class SpotifyMux(object):
@@ -55,21 +47,13 @@ class SpotifyMux(object):
     ) -> Union[Dict, requests.request, None]:
         result = None
         try:
-            resp = requests.get(
+            resp = transport.get(
                 url,
                 headers=headers,
                 params=params,
                 timeout=(conn_timeout, read_timeout),
+                sleep_time=sleep_time,
             )
-
-            if resp.status_code == 429:
-                time.sleep(sleep_time)
-                resp = requests.get(
-                    url,
-                    headers=headers,
-                    params=params,  # noqa: E231
-                    timeout=(conn_timeout, read_timeout),
-                )
             resp.raise_for_status()
             if resp.status_code == 200:
                 if return_as:
@@ -94,42 +78,13 @@ class SpotifyMux(object):
         self.iter_count += 1
         return self.sp_creds_list[self.iter_count % self.sp_creds_len]
 
-    def token(self, user: Optional[str] = None, tries: int = 0):
-        user, data = self.creds(user=user)
-        expires_at = int(redis.get(f"SpotifyMux::{user}::expires_at") or b"0")
-        if datetime.now() >= datetime.fromtimestamp(expires_at - REFRESH_TOKEN_THRESH):
-            try:
-                auth_token, expires_at = st.start_session(data["sp_dc"], data["sp_key"])
-            except requests.exceptions.ConnectionError as conn_err:
-                logger.warning(
-                    "Connection Error retrieving auth token w/ spotify_token \n"
-                    f"{conn_err}"
-                )
-                if tries < 2:
-                    return self.token(user=user, tries=tries + 1)
-
-            redis.set(f"SpotifyMux::{user}::auth_token", auth_token)
-            redis.set(f"SpotifyMux::{user}::expires_at", expires_at)
-            return auth_token
-
-        if redis.get(f"SpotifyMux::{user}::auth_token"):
-            return redis.get(f"SpotifyMux::{user}::auth_token").decode("utf-8")
-        else:
-            if tries < 2:
-                return self.token(user=user, tries=tries + 1)
+    def token(self, user: Optional[str] = None) -> Optional[str]:
+        user, _ = self.creds(user=user)
+        return token_manager.token(user)
 
     def username_and_token(self):
-        user, data = self.creds()
-        expires_at = int(redis.get(f"SpotifyMux::{user}::expires_at") or b"0")
-        if datetime.now() >= datetime.fromtimestamp(expires_at - REFRESH_TOKEN_THRESH):
-            auth_token, expires_at = st.start_session(data["sp_dc"], data["sp_key"])
-            redis.set(f"SpotifyMux::{user}::auth_token", auth_token)
-            redis.set(f"SpotifyMux::{user}::expires_at", expires_at)
-
-        auth_token = redis.get(f"SpotifyMux::{user}::auth_token").decode(
-            "utf-8"
-        )  # noqa: E501
-        return (user, auth_token)
+        user, _ = self.creds()
+        return (user, token_manager.token(user))
 
     def artist_discography(self, artist_id: str) -> Union[Dict, requests.request, None]:
         url = f"https://spclient.wg.spotify.com/artist/v1/{artist_id}"
@@ -225,20 +180,13 @@ class SpotifyMux(object):
             track_ids = ",".join(track_ids)
         tracks = []
         try:
-            resp = requests.get(
+            resp = transport.get(
                 f"https://api.spotify.com/v1/tracks/?ids={track_ids}",  # noqa: E501
                 headers={"Authorization": f"Bearer {self.token()}"},
                 params={"catalogue": "premium", "format": "json",},  # noqa: E231
                 timeout=(conn_timeout, read_timeout),
+                sleep_time=sleep_time,
             )
-            if resp.status_code == 429:
-                time.sleep(sleep_time)
-                resp = requests.get(
-                    f"https://api.spotify.com/v1/tracks/?ids={track_ids}",  # noqa: E501
-                    headers={"Authorization": f"Bearer {self.token()}"},
-                    params={"catalogue": "premium", "format": "json",},  # noqa: E231
-                    timeout=(conn_timeout, read_timeout),
-                )
             resp.raise_for_status()
             if resp.status_code == 200:
                 tracks += resp.json()["tracks"]
@@ -510,11 +458,8 @@ class SpotifyMux(object):
         return tracks
 
     def refresh_tokens(self):
-        # Deprecated.
-        for user, password in SPOTIFY_CREDS.items():
-            auth_token, expires_at = st.start_session(user, password)
-            redis.set(f"SpotifyMux::{user}::auth_token", auth_token)
-            redis.set(f"SpotifyMux::{user}::expires_at", expires_at)
+        for user in SPOTIFY_CREDS:
+            token_manager.refresh(user, force=True)
 
     def print_tokens(self):
         for user, password in SPOTIFY_CREDS.items():
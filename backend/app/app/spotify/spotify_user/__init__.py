@@ -3,4 +3,5 @@ from .tasks import (
     fetch_user_playlists,
     fetch_playlist_tracks,
     update_user_canidate_tracks,
+    flow_user_canidate_tracks,
 )
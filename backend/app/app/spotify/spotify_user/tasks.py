@@ -128,6 +128,27 @@ def push_canidate_track_pairs(self, canidates: List[Dict[str, Any]]) -> Any:
     return dist_tasks
 
 
+@celery_app.task(bind=True, ignore_result=False, serializer="json")
+def push_user_track_embeddings(self, spotify_ids: Union[List[str], str]) -> int:
+    """
+    Compute and store the embeddings of the users' tracks so the hit index can
+    rank recommendations for them.
+    """
+    if isinstance(spotify_ids, str):
+        spotify_ids = spotify_ids.split(",")
+    with session_scope() as db:
+        track_ids = set()
+        for spotify_id in spotify_ids:
+            track_ids.update(
+                tu.track_id
+                for tu in crud.track_user.get_multi_by_user(
+                    db, user_spotify_id=spotify_id
+                )
+            )
+        embeddings = spotify.track_embedding.get_embeddings(db, track_ids)
+        return len(embeddings)
+
+
 def build_push_user_tracks_tasks(
     spotify_id: str,
     tracks: List[Dict[str, Any]],
@@ -239,6 +260,41 @@ def build_push_user_tracks_tasks(
     return push_tracks_tasks
 
 
+def build_user_canidate_tracks_workflow(
+    spotify_id: str,
+    tracks: List[Dict[str, Any]],
+    top_track: Optional[bool] = False,
+    source: Optional[str] = None,
+) -> Any:
+    # Push user tracks to track_user table
+    # Compute the user track embeddings and push them to the db
+    return group(
+        build_push_user_tracks_tasks(
+            spotify_id=spotify_id, tracks=tracks, top_track=top_track, source=source
+        )
+    ) | push_user_track_embeddings.si(spotify_ids=[spotify_id])
+
+
+@celery_app.task(bind=True, ignore_result=False, serializer="json")
+def flow_user_canidate_tracks(
+    self,
+    spotify_id: str,
+    tracks: List[Dict[str, Any]],
+    top_track: Optional[bool] = False,
+    source: Optional[str] = None,
+) -> Any:
+    """
+    Task version of update_user_canidate_tracks, for callers that enqueue it by
+    name (the api). The task is replaced by the workflow, so its result is the
+    workflow's result.
+    """
+    return self.replace(
+        build_user_canidate_tracks_workflow(
+            spotify_id=spotify_id, tracks=tracks, top_track=top_track, source=source
+        )
+    )
+
+
 def update_user_canidate_tracks(
     spotify_id: str,
     tracks: List[Dict[str, Any]],
@@ -252,26 +308,12 @@ def update_user_canidate_tracks(
 ) -> Any:
     """
     Update a spotify user's potential hit recommendations by pushing their tracks,
-    creating spectrograms, computing missing track distance pairs, and pushing
-    results to the db.
+    creating spectrograms, and storing the embeddings of their tracks. Hits are
+    ranked against those embeddings by spotify.track_embedding.hit_index, so no
+    track distance pairs are materialized.
     """
-    # Push user tracks to track_user table
-    # Get missing canidate hit <> user track distance pairs.
-    # Compute canidate hit <> user track distances and push them to the db
-    workflow = (
-        group(
-            build_push_user_tracks_tasks(
-                spotify_id=spotify_id, tracks=tracks, top_track=top_track, source=source
-            )
-        )
-        | fetch_canidate_track_pairs_by_users.si(
-            spotify_ids=[spotify_id],
-            lag_period=lag_period,
-            days_since_release=days_since_release,
-            canidate_hit_limit=canidate_hit_limit,
-            skip=skip,
-        )
-        | push_canidate_track_pairs.s()
+    workflow = build_user_canidate_tracks_workflow(
+        spotify_id=spotify_id, tracks=tracks, top_track=top_track, source=source
     )
 
     if not wait_until_complete:
@@ -51,7 +51,9 @@ def push_track_playcount(
     self, track: schemas.TrackPlaycount
 ) -> Optional[schemas.TrackPlaycount]:
     with session_scope() as db:
-        if not crud.track_playcount.get(db, id=track.id):
+        if not crud.track_playcount.get_by_track_id_and_date(
+            db, track_id=track.track_id, date=track.date
+        ):
             crud.track_playcount.create(db, obj_in=track)
 
     return track
@@ -11,7 +11,6 @@ from app.db.session import session_scope
 
 from app import crud, schemas, models
 from app.spotify import parser
-from app.ml import spec_model
 from .utils import chunkify
 
 
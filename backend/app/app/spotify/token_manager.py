@@ -0,0 +1,174 @@
+"""
+Spotify web player tokens, cached per process and renewed by one worker at a time.
+
+Tokens and their expiry are kept in memory, so handing one out normally costs
+no Redis round trip. Within `refresh_ahead` seconds of expiry a token is still
+handed out while a background thread renews it; only a missing or (nearly)
+expired token is renewed inline. Renewals take a per credential Redis lock, so
+exactly one worker calls spotify_token and the rest pick the new token up from
+Redis.
+"""
+from typing import Dict, Optional, Tuple
+import threading
+import time
+
+from celery.utils.log import get_task_logger
+import requests
+import spotify_token as st
+
+from app.core.celery_app import celery_app
+
+from .config import SPOTIFY_CREDS
+
+
+logger = get_task_logger(__name__)
+
+
+class TokenManager:
+    def __init__(
+        self,
+        creds: Dict[str, Dict[str, str]] = SPOTIFY_CREDS,
+        refresh_thresh: int = 120,
+        refresh_ahead: int = 600,
+        lock_timeout: int = 30,
+        tries: int = 3,
+    ):
+        """
+        Args:
+            refresh_thresh: seconds before expiry a token is no longer handed out.
+            refresh_ahead: seconds before expiry a background renewal starts.
+            lock_timeout: seconds a renewal may hold the Redis lock.
+            tries: spotify_token attempts per renewal.
+        """
+        self.creds = creds
+        self.refresh_thresh = refresh_thresh
+        self.refresh_ahead = max(refresh_ahead, refresh_thresh)
+        self.lock_timeout = lock_timeout
+        self.tries = tries
+        self._tokens: Dict[str, Tuple[str, int]] = {}
+        self._owners: Dict[str, str] = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    @property
+    def redis(self):
+        return celery_app.backend.client
+
+    @staticmethod
+    def _keys(user: str) -> Tuple[str, str]:
+        return f"SpotifyMux::{user}::auth_token", f"SpotifyMux::{user}::expires_at"
+
+    def _fresh(self, expires_at: int, margin: int) -> bool:
+        return time.time() < expires_at - margin
+
+    def _remember(self, user: str, session: Tuple[str, int]) -> Tuple[str, int]:
+        self._tokens[user] = session
+        if len(self._owners) > 4 * len(self.creds):
+            # Keep the owners of the tokens still in use (and in flight).
+            current = {token for token, _ in self._tokens.values()}
+            self._owners = {t: u for t, u in self._owners.items() if t in current}
+        self._owners[session[0]] = user
+        return session
+
+    def owner(self, token: str) -> Optional[str]:
+        """
+        The user a token handed out by this process belongs to, if known.
+        """
+        return self._owners.get(token)
+
+    def token(self, user: str) -> Optional[str]:
+        """
+        A valid auth token for `user`, renewing it if needed.
+        """
+        cached = self._tokens.get(user)
+        if cached is not None and self._fresh(cached[1], self.refresh_thresh):
+            if not self._fresh(cached[1], self.refresh_ahead):
+                self._refresh_in_background(user)
+            return cached[0]
+        cached = self.refresh(user)
+        return cached[0] if cached else None
+
+    def _refresh_in_background(self, user: str) -> None:
+        with self._lock:
+            if user in self._refreshing:
+                return
+            self._refreshing.add(user)
+
+        def run():
+            try:
+                self.refresh(user, margin=self.refresh_ahead)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(user)
+
+        threading.Thread(target=run, name=f"token-refresh-{user}", daemon=True).start()
+
+    def _load(self, user: str, margin: int) -> Optional[Tuple[str, int]]:
+        """
+        Adopt the token in Redis if it's good for at least `margin` seconds.
+        """
+        auth_token, expires_at = self.redis.mget(self._keys(user))
+        if auth_token and expires_at and self._fresh(int(expires_at), margin):
+            return self._remember(user, (auth_token.decode("utf-8"), int(expires_at)))
+        return None
+
+    def _start_session(self, user: str) -> Optional[Tuple[str, int]]:
+        data = self.creds[user]
+        for attempt in range(self.tries):
+            try:
+                auth_token, expires_at = st.start_session(data["sp_dc"], data["sp_key"])
+                return auth_token, int(expires_at)
+            except requests.exceptions.ConnectionError as conn_err:
+                logger.warning(
+                    "Connection Error retrieving auth token w/ spotify_token \n"
+                    f"{conn_err}"
+                )
+        return None
+
+    def refresh(
+        self, user: str, margin: Optional[int] = None, force: bool = False
+    ) -> Optional[Tuple[str, int]]:
+        """
+        Renew `user`'s token unless Redis already holds one good for `margin`
+        seconds. Only the worker holding the credential's lock renews, the others
+        wait for it and read the result back from Redis.
+
+        Returns:
+            The (token, expires_at) now in use, None if renewal failed.
+        """
+        margin = self.refresh_thresh if margin is None else margin
+        try:
+            if not force:
+                loaded = self._load(user, margin)
+                if loaded:
+                    return loaded
+            lock = self.redis.lock(
+                f"SpotifyMux::{user}::refresh_lock",
+                timeout=self.lock_timeout,
+                blocking_timeout=self.lock_timeout,
+            )
+            if not lock.acquire():
+                logger.warning(f"Timed out waiting on the token refresh for {user}")
+                return self._load(user, self.refresh_thresh)
+            try:
+                # Another worker may have renewed it while we waited on the lock.
+                loaded = None if force else self._load(user, margin)
+                if loaded:
+                    return loaded
+                session = self._start_session(user)
+                if session is None:
+                    return self._load(user, self.refresh_thresh)
+                token_key, expires_key = self._keys(user)
+                self.redis.mset({token_key: session[0], expires_key: session[1]})
+                return self._remember(user, session)
+            finally:
+                try:
+                    lock.release()
+                except Exception:  # lock expired while renewing
+                    pass
+        except Exception as err:
+            logger.warning(f"ERROR refreshing auth token for {user} \n {err}")
+            return self._tokens.get(user)
+
+
+token_manager = TokenManager()
@@ -1,5 +1,4 @@
 from typing import List, Optional, Dict, Any, Union
-from collections import OrderedDict
 from datetime import datetime
 
 from fastapi.encoders import jsonable_encoder
@@ -12,8 +11,8 @@ from app.core.config import settings
 from app.db.session import session_scope
 
 from app import crud, schemas, models
-from app.spotify import parser
-from app.ml import spec_model
+from app.ml.distance import pair_distances
+from app.spotify.track_embedding import get_embeddings
 
 logger = get_task_logger(__name__)
 
@@ -23,17 +22,19 @@ def flow_tracks_distances(
     self,
     track_ids: Union[List[str], str, List[Dict[str, Any]]],
     distance_type: Optional[str] = settings.DISTANCE_TYPE,
+    model_id: str = settings.MODEL_ID,
     spec_type: Optional[str] = settings.SPECTROGRAM_TYPE,
     hop_size: str = settings.HOP_SIZE,
     window_size: str = settings.WINDOW_SIZE,
     n_mels: str = settings.N_MELS,
-) -> List[Dict[str, Any]]:
+) -> Dict[str, int]:
     """
     Calculate the distance between track embedding features for a list of track ids
     and push results to the db.
 
     Returns:
-        A list of json encoded (dict) track distance pairs.
+        A dict with the number of inserted, skipped and failed (not written) track
+        distance pairs.
     """
     track_ids_are_paired = False
     if isinstance(track_ids, str):
@@ -51,62 +52,60 @@ def flow_tracks_distances(
             flat_track_ids = set(track_ids)
 
     with session_scope() as db:
-        # Grab spectrograms for the track_ids
-        db_specs = crud.spectrogram.get_by_track_ids(
+        # Get the embeddings for each track, only computing the ones that are not
+        # stored yet.
+        embeddings = get_embeddings(
             db,
-            track_ids=flat_track_ids,
+            flat_track_ids,
+            model_id=model_id,
             spec_type=spec_type,
             hop_size=hop_size,
             window_size=window_size,
             n_mels=n_mels,
         )
-
-        spec_dict = OrderedDict()
-        for spec in db_specs:
-            spec_np = parser.spectrogram.spec2numpy(spec.track_id, spec.spectrogram)
-            if spec_np is not None:
-                spec_dict[spec.track_id] = spec_np
-            else:
-                logger.warning(f"Spectrogram is corrupt! ({spec.track_id})")
-                crud.spectrogram.update_is_corrupt(db, db_obj=spec, is_corrupt=True)
-        spec_batch = np.array([spec for tid, spec in spec_dict.items()])
-
-        # Get the embeddings for each track
-        emb_batch = spec_model.get_features(spec_batch)
-        emb_dict = OrderedDict()
-        for tid, emb in zip(spec_dict.keys(), emb_batch):
-            emb_dict[tid] = emb
+        if not embeddings:
+            return {"inserted": 0, "skipped": len(track_ids), "failed": 0}
+        emb_rows = {tid: row for row, tid in enumerate(embeddings.keys())}
+        emb_batch = np.stack(list(embeddings.values()))
 
         # Create track id pairs if needed
         if not track_ids_are_paired:
             pass
 
-        # Calculate track distances.
-        # TODO: efficiently compute distances between pairs using matrix multiplication
-        # tricks
-        distances = []
-        for pair in track_ids:
-            src_id = pair["src_id"]
-            tgt_id = pair["tgt_id"]
-            if src_id != tgt_id:
-                pair_dist = spec_model.calculate_distance(
-                    emb_dict[src_id], emb_dict[tgt_id], distance_type=distance_type,
-                ).item()
-                obj_pair_dist = schemas.TrackDistanceCreate(
-                    t1_id=src_id,
-                    t2_id=tgt_id,
-                    model_id=settings.MODEL_ID,
-                    distance_type=distance_type,
-                    distance=pair_dist,
-                )
-                # Push distances to the tracks_distances table.
-                # TODO: push to db using an async celery task
-                # push_track_distance.si(
-                #     track_distance=jsonable_encoder(obj_pair_dist)
-                # ).apply_async(ignore_result=True)
-                db_pair_dist = crud.track_distance.create(db, obj_in=obj_pair_dist)
-                distances.append(jsonable_encoder(db_pair_dist))
-        return distances
+        # Calculate all track distances at once. Pairs missing a valid spectrogram
+        # are skipped.
+        pairs = [
+            (pair["src_id"], pair["tgt_id"])
+            for pair in track_ids
+            if pair["src_id"] != pair["tgt_id"]
+            and pair["src_id"] in emb_rows
+            and pair["tgt_id"] in emb_rows
+        ]
+        pair_dists = pair_distances(
+            emb_batch,
+            src_index=[emb_rows[src_id] for src_id, _ in pairs],
+            tgt_index=[emb_rows[tgt_id] for _, tgt_id in pairs],
+            distance_type=distance_type,
+        ).tolist()
+
+        # Push distances to the tracks_distances table in one batch.
+        distances = [
+            dict(
+                t1_id=src_id,
+                t2_id=tgt_id,
+                model_id=model_id,
+                distance_type=distance_type,
+                distance=pair_dist,
+            )
+            for (src_id, tgt_id), pair_dist in zip(pairs, pair_dists)
+        ]
+        counts = crud.track_distance.create_multi(db, objs_in=distances)
+        if counts is None:
+            logger.warning(f"Failed to push {len(distances)} track distances")
+            return {"inserted": 0, "skipped": 0, "failed": len(distances)}
+        inserted, skipped = counts
+        logger.info(f"Track distances inserted: {inserted}, skipped: {skipped}")
+        return {"inserted": inserted, "skipped": skipped, "failed": 0}
 
 
 @celery_app.task(
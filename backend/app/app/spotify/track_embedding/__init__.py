@@ -0,0 +1,2 @@
+from .tasks import get_embeddings, flow_tracks_embeddings, queue_embeddings
+from .index import hit_index
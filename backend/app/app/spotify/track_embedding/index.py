@@ -0,0 +1,199 @@
+from typing import List, Dict, Any, Optional, Set
+from datetime import datetime
+import threading
+import time
+
+from celery.utils.log import get_task_logger
+from sqlalchemy.orm import Session
+import numpy as np
+
+from app.core.config import settings
+from app import crud
+from app.db.session import session_scope
+from app.ml.ann_index import IVFIndex
+from app.spotify.utils import chunkify
+from .tasks import get_embeddings, queue_embeddings
+
+
+logger = get_task_logger(__name__)
+
+
+class HitIndex:
+    """
+    An in-process ANN index over the embeddings of canidate hit tracks (tracks
+    with a hit probability >= min_probability).
+
+    The index is synced incrementally by a background thread (see start): each
+    sync only reads predictions made since the last one, adding new hits and
+    dropping tracks whose probability fell under the threshold. Hits without a
+    stored embedding are queued for flow_tracks_embeddings (see queue_embeddings)
+    and picked up on a later sync.
+
+    A sync updates a copy of the index and swaps it in once done, so requests only
+    read the current snapshot and never wait on a sync.
+    """
+
+    def __init__(
+        self,
+        model_id: str = settings.MODEL_ID,
+        distance_type: str = settings.DISTANCE_TYPE,
+        min_probability: float = settings.HIT_INDEX_MIN_PROBABILITY,
+        sync_interval: int = settings.HIT_INDEX_SYNC_INTERVAL,
+        n_probe: int = settings.HIT_INDEX_N_PROBE,
+    ):
+        self.model_id = model_id
+        self.distance_type = distance_type
+        self.min_probability = min_probability
+        self.sync_interval = sync_interval
+        self.n_probe = n_probe
+        self.index: Optional[IVFIndex] = None
+        self.last_sync: Optional[datetime] = None
+        self._last_sync_id: Optional[str] = None
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Start the background thread syncing the index every sync_interval seconds.
+        Calls once it runs are no-ops.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._sync_forever, name="hit-index-sync", daemon=True
+            )
+            self._thread.start()
+
+    def _sync_forever(self) -> None:
+        while True:
+            try:
+                with session_scope() as db:
+                    self.sync(db)
+            except Exception as err:
+                logger.exception(f"Hit index sync failed: {err}")
+            time.sleep(self.sync_interval)
+
+    def sync(self, db: Session) -> int:
+        """
+        Pull new predictions and embeddings into a copy of the index, then swap
+        it in.
+
+        Returns:
+            The number of hits added to the index.
+        """
+        last_sync, last_sync_id = self.last_sync, self._last_sync_id
+        hit_ids = set(self._pending)
+        stale_ids = set()
+        page_size = 100_000
+        while True:
+            predictions = crud.track_prediction.get_updated_since(
+                db,
+                model_id=self.model_id,
+                since=last_sync,
+                after_track_id=last_sync_id,
+                limit=page_size,
+            )
+            for pred in predictions:
+                if pred.probability >= self.min_probability:
+                    hit_ids.add(pred.track_id)
+                    stale_ids.discard(pred.track_id)
+                else:
+                    stale_ids.add(pred.track_id)
+                    hit_ids.discard(pred.track_id)
+            if predictions:
+                last_sync = predictions[-1].date
+                last_sync_id = predictions[-1].track_id
+            if len(predictions) < page_size:
+                break
+
+        index = self.index.copy() if self.index is not None else None
+        if index is not None and stale_ids:
+            index.remove(stale_ids)
+
+        added = 0
+        for chunk in chunkify(list(hit_ids), chunk_size=5_000):
+            embeddings = get_embeddings(
+                db, chunk, model_id=self.model_id, compute_missing=False
+            )
+            if not embeddings:
+                continue
+            if index is None:
+                dim = next(iter(embeddings.values())).size
+                index = IVFIndex(
+                    dim, distance_type=self.distance_type, n_probe=self.n_probe
+                )
+            index.add(list(embeddings.keys()), np.stack(list(embeddings.values())))
+            added += len(embeddings)
+
+        if index is not None:
+            index.build_lists()
+        self.index = index
+        self.last_sync, self._last_sync_id = last_sync, last_sync_id
+        self._pending = {tid for tid in hit_ids if index is None or tid not in index}
+        queue_embeddings(db, self._pending, model_id=self.model_id)
+        logger.info(
+            f"Hit index synced: {added} added, {len(stale_ids)} removed, "
+            f"{len(self._pending)} pending embeddings"
+        )
+        return added
+
+    def get_track_recs_for_user(
+        self,
+        db: Session,
+        *,
+        spotify_id: str,
+        lag_period: int = 7,
+        days_since_release: int = 180,
+        limit: int = 40,
+        skip: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve the canidate hit tracks closest to the user's tracks, ranked by
+        their median and then mean distance to the user's track set. Replaces
+        crud.user.get_track_recs_for_user without needing track_distance rows.
+        Returns no recs until the index's first sync is done.
+        """
+        self.start()
+        # The index can be swapped by a sync at any time, search one snapshot.
+        index = self.index
+        if index is None:
+            return []
+        canidate_ids = set(
+            crud.user.get_canidate_hits_for_user(
+                db,
+                spotify_id=spotify_id,
+                lag_period=lag_period,
+                days_since_release=days_since_release,
+            )
+        )
+        user_track_ids = [
+            tu.track_id
+            for tu in crud.track_user.get_multi_by_user(db, user_spotify_id=spotify_id)
+        ]
+        # Computing embeddings takes the model, which doesn't belong in a request;
+        # the missing ones are queued and used once stored.
+        user_embeddings = get_embeddings(
+            db, user_track_ids, model_id=self.model_id, compute_missing=False
+        )
+        queue_embeddings(
+            db,
+            [tid for tid in user_track_ids if tid not in user_embeddings],
+            model_id=self.model_id,
+        )
+        if not canidate_ids or not user_embeddings:
+            return []
+
+        recs = index.search_set(
+            np.stack(list(user_embeddings.values())),
+            k=limit + skip,
+            allowed_ids=canidate_ids,
+        )
+        return [
+            dict(id=tid, avg_distance=mean, median=median)
+            for tid, median, mean in recs[skip:]
+        ]
+
+
+hit_index = HitIndex()
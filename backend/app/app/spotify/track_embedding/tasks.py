@@ -0,0 +1,142 @@
+from typing import List, Dict, Iterable, Union
+
+from celery.utils.log import get_task_logger
+from redis import RedisError
+from sqlalchemy.orm import Session
+import numpy as np
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.db.session import session_scope
+
+from app import crud
+from app.spotify import parser
+from app.ml import get_model
+from app.ml.inference import run_batched
+from app.spotify.utils import chunkify
+
+
+logger = get_task_logger(__name__)
+
+
+def get_embeddings(
+    db: Session,
+    track_ids: Iterable[str],
+    model_id: str = settings.MODEL_ID,
+    spec_type: str = settings.SPECTROGRAM_TYPE,
+    hop_size: str = settings.HOP_SIZE,
+    window_size: str = settings.WINDOW_SIZE,
+    n_mels: str = settings.N_MELS,
+    compute_missing: bool = True,
+) -> Dict[str, np.ndarray]:
+    """
+    Get the embedding features for a list of track ids. Embeddings are read from
+    the track_embedding table, only the missing ones are computed from their
+    spectrograms (in adaptive batches, see run_batched), and those are persisted
+    for later calls. With compute_missing False only stored embeddings are
+    returned.
+
+    Returns:
+        A dict mapping track ids to their embedding. Tracks without a valid
+        spectrogram are left out.
+    """
+    track_ids = set(track_ids)
+    embeddings = {
+        emb.track_id: parser.track_embedding.bytes2numpy(emb.embedding)
+        for emb in crud.track_embedding.get_by_track_ids(
+            db, track_ids=list(track_ids), model_id=model_id
+        )
+    }
+    missing_ids = list(track_ids - embeddings.keys())
+    if not missing_ids or not compute_missing:
+        return embeddings
+
+    db_specs = crud.spectrogram.get_by_track_ids(
+        db,
+        track_ids=missing_ids,
+        spec_type=spec_type,
+        hop_size=hop_size,
+        window_size=window_size,
+        n_mels=n_mels,
+    )
+
+    def spectrograms():
+        for spec in db_specs:
+            spec_np = parser.spectrogram.spec2numpy(spec.track_id, spec.spectrogram)
+            if spec_np is not None:
+                yield spec.track_id, spec_np
+            else:
+                logger.warning(f"Spectrogram is corrupt! ({spec.track_id})")
+                crud.spectrogram.update_is_corrupt(db, db_obj=spec, is_corrupt=True)
+
+    new_embeddings = []
+    for batch_ids, emb_batch in run_batched(
+        get_model(model_id).get_features, spectrograms()
+    ):
+        for track_id, emb in zip(batch_ids, emb_batch):
+            embeddings[track_id] = emb
+            new_embeddings.append(
+                parser.track_embedding.from_numpy(
+                    track_id=track_id, model_id=model_id, embedding=emb
+                )
+            )
+    if not new_embeddings:
+        return embeddings
+
+    crud.ml_model.get_or_create(db, model_id=model_id)
+    if not crud.track_embedding.create_multi(db, objs_in=new_embeddings):
+        logger.warning(f"Failed to store {len(new_embeddings)} track embeddings")
+    return embeddings
+
+
+@celery_app.task(bind=True, serializer="json", queue="distance-queue")
+def flow_tracks_embeddings(
+    self, track_ids: Union[List[str], str], model_id: str = settings.MODEL_ID,
+) -> int:
+    """
+    Precompute and store the embeddings for a list of track ids.
+
+    Returns:
+        The number of tracks with an embedding available.
+    """
+    if isinstance(track_ids, str):
+        track_ids = track_ids.split(",")
+    with session_scope() as db:
+        return len(get_embeddings(db, track_ids, model_id=model_id))
+
+
+def queue_embeddings(
+    db: Session,
+    track_ids: Iterable[str],
+    model_id: str = settings.MODEL_ID,
+    ttl: int = settings.EMBEDDING_QUEUE_TTL,
+) -> int:
+    """
+    Queue flow_tracks_embeddings for the tracks that have a valid spectrogram (the
+    others can't get an embedding) and weren't already queued in the last `ttl`
+    seconds, so repeated syncs and requests don't queue the same tracks again.
+
+    Returns:
+        The number of tracks queued.
+    """
+    valid_ids = []
+    for chunk in chunkify(sorted(set(track_ids)), 5_000):
+        valid_ids += [
+            spec.track_id
+            for spec in crud.spectrogram.get_valid_track_ids(db, track_ids=chunk)
+        ]
+    if not valid_ids:
+        return 0
+    try:
+        pipe = celery_app.backend.client.pipeline(transaction=False)
+        for track_id in valid_ids:
+            pipe.set(f"TrackEmbedding::{model_id}::{track_id}", 1, nx=True, ex=ttl)
+        queue_ids = [tid for tid, new in zip(valid_ids, pipe.execute()) if new]
+    except RedisError as err:
+        logger.warning(f"ERROR Queueing track embeddings \n {err}")
+        return 0
+    for chunk in chunkify(queue_ids, settings.INFERENCE_PAGE_SIZE):
+        flow_tracks_embeddings.si(track_ids=chunk, model_id=model_id).apply_async(
+            ignore_result=True
+        )
+    return len(queue_ids)
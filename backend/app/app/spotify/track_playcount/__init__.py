@@ -3,4 +3,9 @@ from .tasks import (
     push_album_playcount,
     fetch_album_playcount,
     flow_album_playcount,
+    album_playcount_workflow,
+    rebuild_track_growth,
+    maintain_track_playcount,
+    compute_track_metrics,
+    schedule_rising_tracks_warm,
 )
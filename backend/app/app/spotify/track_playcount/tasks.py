@@ -1,14 +1,16 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 from fastapi.encoders import jsonable_encoder
 from celery import chord, group
 from celery.utils.log import get_task_logger
 from celery.result import AsyncResult
 
+from app.core.cache import rising_tracks_cache
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.db.session import session_scope
 
-from app import crud, schemas
+from app import analytics, crud, schemas
 from app.spotify import parser
 from app.spotify.spapi import spapi
 from app.spotify import track, album
@@ -16,6 +18,19 @@ from app.spotify import track, album
 logger = get_task_logger(__name__)
 
 
+def schedule_rising_tracks_warm() -> None:
+    """
+    Re-warm the rising tracks cache RISING_TRACKS_CACHE_WARM_DELAY seconds from
+    now, unless that's already scheduled, so the cached responses follow
+    ingestion once a scrape's pushes have landed.
+    """
+    delay = settings.RISING_TRACKS_CACHE_WARM_DELAY
+    if rising_tracks_cache.claim_warm(delay):
+        celery_app.send_task(
+            "app.spotify.flow.warm_rising_tracks_cache", countdown=delay
+        )
+
+
 @celery_app.task(bind=True, task_time_limit=10, ignore_result=False, serializer="json")
 def fetch_album_playcount(self, album_id: str):
     return spapi.album_playcount(album_id)
@@ -49,7 +64,12 @@ def push_album_playcount(self, album_playcount: Dict[str, Any]) -> List[Dict[str
             if pcnt_obj.track_id not in db_pcnt_track_ids
         ]
         # Bulk insert missing playcounts to db
-        _ = crud.track_playcount.create_multi(db, objs_in=missing_playcounts)
+        if crud.track_playcount.create_multi(db, objs_in=missing_playcounts):
+            # Keep the rising tracks in step with ingestion.
+            crud.track_growth.update_tracks(
+                db, track_ids=[p["track_id"] for p in missing_playcounts]
+            )
+            schedule_rising_tracks_warm()
         return missing_playcounts
 
 
@@ -59,12 +79,82 @@ def push_album_playcount(self, album_playcount: Dict[str, Any]) -> List[Dict[str
 def push_track_playcount(self, track_playcount: Dict[str, Any]) -> Dict[str, Any]:
     with session_scope() as db:
         tp_obj = schemas.TrackPlaycount(**track_playcount)
-        # if not crud.track_playcount.get(db, id=tp_obj.id):
         db_tp = crud.track_playcount.create(db, obj_in=tp_obj)
+        crud.track_growth.update_tracks(db, track_ids=[tp_obj.track_id])
+        schedule_rising_tracks_warm()
         return jsonable_encoder(db_tp)
 
 
+@celery_app.task(bind=True, serializer="json")
+def maintain_track_playcount(
+    self,
+    months_ahead: int = settings.TRACK_PLAYCOUNT_PARTITIONS_AHEAD,
+    retention_days: int = settings.TRACK_PLAYCOUNT_RETENTION_DAYS,
+    lookback_days: Optional[int] = 14,
+) -> Dict[str, Any]:
+    """
+    Create the upcoming track_playcount partitions and downsample playcounts
+    older than retention_days to weekly points (only the last lookback_days of
+    them, None for the whole table).
+    """
+    with session_scope() as db:
+        partitions = crud.track_playcount.ensure_partitions(
+            db, months_ahead=months_ahead
+        )
+        compacted = crud.track_playcount.compact(
+            db, older_than_days=retention_days, lookback_days=lookback_days
+        )
+    return dict(partitions=partitions, compacted=compacted)
+
+
+@celery_app.task(bind=True, serializer="json")
+def rebuild_track_growth(self) -> int:
+    """
+    Recompute the whole track_growth table from track_playcount (eg, to backfill
+    it). Day to day it's kept up to date by the push tasks.
+    """
+    with session_scope() as db:
+        return crud.track_growth.rebuild(db)
+
+
+@celery_app.task(bind=True, serializer="json")
+def compute_track_metrics(
+    self,
+    lag_days: Optional[List[int]] = None,
+    shards: int = settings.TRACK_METRIC_SHARDS,
+) -> Dict[int, int]:
+    """
+    Compute the growth of every track over each of the lag_days windows (default:
+    TRACK_METRIC_LAG_DAYS) and write them to track_metric. Each shard of the
+    tracks loads its playcounts once, for the longest window, and computes all
+    the windows from that one matrix.
+
+    Returns:
+        The number of rows written per lag_days.
+    """
+    lag_days = sorted(set(lag_days or settings.TRACK_METRIC_LAG_DAYS))
+    written = {lag: 0 for lag in lag_days}
+    with session_scope() as db:
+        for shard in range(shards):
+            matrix = analytics.load_matrix(
+                db, max(lag_days) + 1, shard=shard, shards=shards
+            )
+            for lag, metrics in matrix.windows(lag_days).items():
+                written[lag] += crud.track_metric.upsert_multi(
+                    db, objs_in=matrix.records(metrics)
+                )
+            logger.info(
+                f"Track metrics shard {shard + 1}/{shards}: "
+                f"{len(matrix.track_ids)} tracks x {matrix.days} days"
+            )
+    return written
+
+
+def album_playcount_workflow(album_id: str) -> Any:
+    return fetch_album_playcount.si(album_id) | push_album_playcount.s()
+
+
 # @celery_app.task(bind=True, serializer="json")
 def flow_album_playcount(album_id: str) -> Any:
-    workflow = fetch_album_playcount.si(album_id) | push_album_playcount.s()
+    workflow = album_playcount_workflow(album_id)
     workflow.apply_async(ignore_result=True)
@@ -1 +1 @@
-from .tasks import predict_tracks, push_track_prediction
+from .tasks import predict_tracks, predict_tracks_stream, push_track_prediction
@@ -12,7 +12,8 @@ from app.db.session import session_scope
 
 from app import crud, schemas, models
 from app.spotify import parser
-from app.ml import spec_model
+from app.ml import get_model
+from app.ml.inference import run_batched, to_numpy, InferenceStats
 from app.spotify.utils import chunkify
 
 
@@ -28,10 +29,12 @@ def predict_tracks(
     hop_size: str = settings.HOP_SIZE,
     window_size: str = settings.WINDOW_SIZE,
     n_mels: str = settings.N_MELS,
+    store_embeddings: bool = True,
 ) -> List[Dict[str, Any]]:
     """
     Calculate the hit probability for the given track_id and push results to
-    the db.
+    the db. The embeddings come out of the same forward pass and are stored too
+    (store_embeddings), so computing distances later doesn't rerun the model.
 
     Returns:
         A list of json encoded (dict) track predictions.
@@ -41,22 +44,7 @@ def predict_tracks(
 
     # Grab spectrograms for the track_ids
     with session_scope() as db:
-        if not crud.ml_model.get(db, id=model_id):
-            model_config = model_id.split("_")
-            model_type = model_config[0]
-            date_trained = datetime.fromisoformat(model_config[1])
-            epochs = int(model_config[2])
-            extra_metadata = model_config[-1] if len(model_config) > 3 else None
-            crud.ml_model.create(
-                db,
-                obj_in=schemas.MLModel(
-                    id=model_id,
-                    model_type=model_type,
-                    date_trained=date_trained,
-                    epochs=epochs,
-                    extra_metadata=extra_metadata,
-                ),
-            )
+        crud.ml_model.get_or_create(db, model_id=model_id)
 
         db_specs = crud.spectrogram.get_by_track_ids(
             db,
@@ -77,50 +65,136 @@ def predict_tracks(
             else:
                 logger.warning(f"Spectrogram is corrupt! ({spec.track_id})")
                 crud.spectrogram.update_is_corrupt(db, db_obj=spec, is_corrupt=True)
+        if not track_ids:
+            return []
         spectrograms = np.array(spectrograms)
 
-    # Make hit predictions
-    track_preds = []
-    probs = (
-        spec_model.get_predictions(spectrograms)
-        .view(-1)
-        .detach()
-        .cpu()
-        .numpy()
-        .tolist()
-    )
-    for tid, prob in zip(track_ids, probs):
-        pred = 0.0 if prob < 0.5 else 1.0
-        # TODO: update this to bulk insert/update track predictions
-        track_pred = schemas.TrackPrediction(
-            track_id=tid,
-            model_id=spec_model.model_id,
-            date=datetime.now(),
-            prediction=pred,
-            probability=prob,
-        )
-        push_track_prediction.si(
-            track_prediction=jsonable_encoder(track_pred)
-        ).apply_async(ignore_result=True)
-        track_preds.append(jsonable_encoder(track_pred))
-    return track_preds
+        # Make hit predictions and embeddings in one forward pass
+        spec_model = get_model(model_id)
+        track_preds = []
+        probs, features = spec_model.get_scores(spectrograms)
+        probs = to_numpy(probs).reshape(-1).tolist()
+        features = to_numpy(features)
+        for tid, prob in zip(track_ids, probs):
+            pred = 0.0 if prob < 0.5 else 1.0
+            track_preds.append(
+                schemas.TrackPrediction(
+                    track_id=tid,
+                    model_id=spec_model.model_id,
+                    date=datetime.now(),
+                    prediction=pred,
+                    probability=prob,
+                )
+            )
+
+        # Push the whole batch to the track_prediction table at once.
+        crud.track_prediction.upsert_multi(db, objs_in=track_preds)
+        if store_embeddings:
+            crud.track_embedding.create_multi(
+                db,
+                objs_in=[
+                    parser.track_embedding.from_numpy(
+                        track_id=tid, model_id=model_id, embedding=emb
+                    )
+                    for tid, emb in zip(track_ids, features)
+                ],
+            )
+    return jsonable_encoder(track_preds)
+
+
+@celery_app.task(bind=True, serializer="json")
+def predict_tracks_stream(
+    self,
+    track_ids: Union[List[str], str],
+    model_id: str = settings.MODEL_ID,
+    page_size: int = settings.INFERENCE_PAGE_SIZE,
+    spec_type: str = settings.SPECTROGRAM_TYPE,
+    hop_size: str = settings.HOP_SIZE,
+    window_size: str = settings.WINDOW_SIZE,
+    n_mels: str = settings.N_MELS,
+    store_embeddings: bool = True,
+) -> Dict[str, Any]:
+    """
+    Calculate the hit probability for a large set of track ids in one run.
+    Spectrograms are streamed from the db a page at a time and scored in
+    adaptive-size batches, then all predictions are written in one bulk upsert.
+    The embeddings from the same forward passes are stored with them
+    (store_embeddings).
+
+    Returns:
+        The run stats (tracks, batches, seconds, tracks_per_sec, ...).
+    """
+    if isinstance(track_ids, str):
+        track_ids = track_ids.split(",")
+
+    stats = InferenceStats()
+    with session_scope() as db:
+        crud.ml_model.get_or_create(db, model_id=model_id)
+        corrupt_ids = []
+
+        def spectrograms():
+            for spec in crud.spectrogram.iter_by_track_ids(
+                db,
+                track_ids=track_ids,
+                page_size=page_size,
+                spec_type=spec_type,
+                hop_size=hop_size,
+                window_size=window_size,
+                n_mels=n_mels,
+            ):
+                spec_np = parser.spectrogram.spec2numpy(spec.track_id, spec.spectrogram)
+                if spec_np is not None:
+                    yield spec.track_id, spec_np
+                else:
+                    logger.warning(f"Spectrogram is corrupt! ({spec.track_id})")
+                    corrupt_ids.append(spec.id)
+
+        track_preds, track_embeddings = [], []
+        for batch_ids, (probs, features) in run_batched(
+            get_model(model_id).get_scores, spectrograms(), stats=stats
+        ):
+            now = datetime.now()
+            if store_embeddings:
+                track_embeddings += [
+                    dict(
+                        track_id=tid,
+                        model_id=model_id,
+                        date=now,
+                        embedding=parser.track_embedding.numpy2bytes(emb),
+                    )
+                    for tid, emb in zip(batch_ids, features)
+                ]
+            for tid, prob in zip(batch_ids, probs.reshape(-1).tolist()):
+                track_preds.append(
+                    dict(
+                        track_id=tid,
+                        model_id=model_id,
+                        date=now,
+                        prediction=0.0 if prob < 0.5 else 1.0,
+                        probability=prob,
+                    )
+                )
+
+        crud.spectrogram.update_is_corrupt_multi(db, ids=corrupt_ids)
+        written = crud.track_prediction.upsert_multi(db, objs_in=track_preds)
+        if not crud.track_embedding.create_multi(db, objs_in=track_embeddings):
+            logger.warning(f"Failed to store {len(track_embeddings)} track embeddings")
+
+    run_stats = dict(stats.dict(), requested=len(track_ids), written=written)
+    logger.info(f"Track predictions stream complete: {run_stats}")
+    return run_stats
 
 
 @celery_app.task(
     bind=True, task_time_limit=6, serializer="json", queue="short-queue",
 )
 def push_track_prediction(self, track_prediction: Dict[str, Any],) -> Dict[str, Any]:
+    """
+    Push a single track prediction to the db. predict_tracks writes its batches
+    with crud.track_prediction.upsert_multi, this is kept for one-off pushes.
+    """
     track_prediction = schemas.TrackPrediction(**track_prediction)
     with session_scope() as db:
-        db_obj = crud.track_prediction.get(
-            db, track_id=track_prediction.track_id, model_id=track_prediction.model_id
-        )
-        if not db_obj:
-            db_obj = crud.track_prediction.create(db, obj_in=track_prediction)
-
-        if db_obj.prediction != track_prediction.prediction:
-            db_obj = crud.track_prediction.update(
-                db, db_obj=db_obj, obj_in=track_prediction
-            )
+        crud.track_prediction.upsert_multi(db, objs_in=[track_prediction])
 
     return jsonable_encoder(track_prediction)
@@ -0,0 +1,85 @@
+"""
+Shared HTTP transport for SpotifyMux and SpAPI.
+
+Requests go through one pooled requests.Session per process, so connections to
+api.spotify.com, spclient and the spapi container are kept alive and reused
+instead of being opened for every call.
+
+Every request first takes a token from the shared rate limiter for its
+credential and endpoint family, and a 429 blocks that bucket for all workers
+until its Retry-After has passed.
+"""
+from typing import Any, Dict, Optional, Tuple
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from celery.utils.log import get_task_logger
+
+from app.core.config import settings
+from app.spotify.rate_limit import (
+    rate_limiter,
+    endpoint_family,
+    credential_key,
+    parse_retry_after,
+)
+
+
+logger = get_task_logger(__name__)
+
+RETRY_STATUS = 429
+
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    The process wide pooled session. A forked child builds its own, since pooled
+    sockets can't be shared across processes.
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=settings.HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session, _session_pid = session, os.getpid()
+    return _session
+
+
+def get(
+    url: str,
+    *,
+    headers: Optional[Dict[str, Any]] = None,
+    params: Optional[Dict[str, Any]] = None,
+    timeout: Tuple[float, float] = (3, 10),
+    sleep_time: float = 0.4,
+) -> requests.Response:
+    """
+    Rate limited GET through the pooled session. On a 429 the request is retried
+    once, after the response's Retry-After (or sleep_time if it has none).
+
+    The request waits for as long as its bucket is exhausted or blocked, it's
+    never sent past the limiter.
+    """
+    session = get_session()
+    family, credential = endpoint_family(url), credential_key(headers)
+    for attempt in range(2):
+        while not rate_limiter.acquire(credential, family):
+            logger.info(f"Still waiting on the {family} rate limit for {url}")
+        resp = session.get(url, headers=headers, params=params, timeout=timeout)
+        if resp.status_code != RETRY_STATUS or attempt > 0:
+            break
+        retry_after = parse_retry_after(resp.headers.get("Retry-After"), sleep_time)
+        rate_limiter.block(credential, family, retry_after)
+        time.sleep(retry_after)
+    return resp
@@ -0,0 +1,73 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from app.analytics import PlaycountMatrix
+
+
+END = datetime.date(2020, 1, 10)
+
+
+def _matrix() -> PlaycountMatrix:
+    return PlaycountMatrix.from_rows(
+        ["a", "a", "a", "b", "c", "c"],
+        [0, 2, 7, 6, 7, 9],
+        [100, 130, 200, 50, 10, 99],
+        end=END,
+        days=8,
+    )
+
+
+def test_from_rows() -> None:
+    matrix = _matrix()
+    assert matrix.track_ids == ["a", "b", "c"]
+    assert matrix.start == datetime.date(2020, 1, 3)
+    assert matrix.values.dtype == np.int64
+    assert matrix.mask.sum() == 5  # the offset past the end is dropped
+    assert matrix.values[0].tolist() == [100, 0, 130, 0, 0, 0, 0, 200]
+
+
+def test_filled_carries_playcounts_forward() -> None:
+    values, seen = _matrix().filled()
+    assert values[0].tolist() == [100, 100, 130, 130, 130, 130, 130, 200]
+    assert values[1].tolist() == [0, 0, 0, 0, 0, 0, 50, 50]
+    assert seen[1].tolist() == [False] * 6 + [True] * 2
+
+
+def test_deltas() -> None:
+    delta, valid = _matrix().deltas(2)
+    assert delta[0].tolist() == [30, 30, 0, 0, 0, 70]
+    assert valid[0].all()
+    assert not valid[1].any()
+
+
+def test_window() -> None:
+    metrics = _matrix().window(7)
+    assert metrics.has_data.tolist() == [True, False, False]
+    assert metrics.start_playcount[0] == 100
+    assert metrics.playcount[0] == 200
+    assert metrics.chg[0] == 100
+    assert metrics.days[0] == 7
+    assert metrics.growth_rate[0] == pytest.approx(1.0)
+    assert metrics.avg_chg[0] == pytest.approx(100 / 7)
+    # (200 - 130) / 4 days - (130 - 100) / 3 days
+    assert metrics.acceleration[0] == pytest.approx(7.5)
+    assert np.isnan(metrics.growth_rate[1])
+
+
+def test_windows_share_the_matrix() -> None:
+    matrix = _matrix()
+    windows = matrix.windows([2, 7])
+    assert not windows[2].has_data.any()  # a single playcount in the last 3 days
+    records = matrix.records(windows[7])
+    assert len(records) == 1
+    assert records[0]["track_id"] == "a"
+    assert records[0]["lag_days"] == 7
+    assert records[0]["date"] == END
+    assert records[0]["acceleration"] == pytest.approx(7.5)
+
+
+def test_window_must_fit_the_matrix() -> None:
+    with pytest.raises(ValueError):
+        _matrix().window(8)
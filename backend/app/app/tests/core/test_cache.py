@@ -0,0 +1,43 @@
+from app.core.cache import ResponseCache
+from app import schemas
+
+
+def test_normalize_sorts_keys_and_whole_floats() -> None:
+    a = ResponseCache.normalize({"limit": 100, "max_playcount": 1e10})
+    b = ResponseCache.normalize({"max_playcount": 10_000_000_000, "limit": 100.0})
+    assert a == b
+
+
+def test_key_is_versioned_by_generation() -> None:
+    cache = ResponseCache("Test", ttl=60)
+    filters = schemas.TrackRisingFilter().dict()
+    assert cache.key(filters, 1) == cache.key(dict(filters), 1)
+    assert cache.key(filters, 1) != cache.key(filters, 2)
+    assert cache.key(filters, 1) != cache.key({**filters, "lag_days": 14}, 1)
+
+
+def test_filters_coerce_the_endpoint_defaults() -> None:
+    # The endpoint's max_playcount default is the float 1e10, the warmer's the int.
+    endpoint = schemas.TrackRisingFilter(max_playcount=1e10).dict()
+    assert endpoint == schemas.TrackRisingFilter().dict()
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.values = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+
+def test_claim_warm_once_per_burst(monkeypatch) -> None:
+    redis = FakeRedis()
+    monkeypatch.setattr(ResponseCache, "redis", redis)
+    cache = ResponseCache("Test", ttl=60)
+    assert cache.claim_warm(300)
+    assert not cache.claim_warm(300)
+    assert not ResponseCache("Test", ttl=60).claim_warm(300)
+    assert ResponseCache("Other", ttl=60).claim_warm(300)
@@ -0,0 +1,31 @@
+from app.crud.crud_materialized_view import MaterializedView, materialized_view
+
+
+def _view(name, *depends_on, unique=True) -> MaterializedView:
+    return MaterializedView(
+        name=name, populated=True, has_unique_index=unique, depends_on=list(depends_on)
+    )
+
+
+def test_refresh_levels_follow_dependencies() -> None:
+    views = {
+        v.name: v
+        for v in [
+            _view("track_rising_rolling_7", "track_growth"),
+            _view("track_rising_rolling_30", "track_growth"),
+            _view("track_growth"),
+            _view("artist_rising", "track_rising_rolling_7"),
+            _view("genre_counts"),
+        ]
+    }
+    assert materialized_view.refresh_levels(views) == [
+        ["genre_counts", "track_growth"],
+        ["track_rising_rolling_30", "track_rising_rolling_7"],
+        ["artist_rising"],
+    ]
+
+
+def test_concurrently_needs_a_unique_index_and_data() -> None:
+    assert _view("a").concurrently
+    assert not _view("a", unique=False).concurrently
+    assert not _view("a")._replace(populated=False).concurrently
@@ -0,0 +1,21 @@
+from app.crud.base import CRUDBase
+
+
+def test_seek_without_cursor_or_shards_adds_nothing() -> None:
+    assert CRUDBase.seek("a.id") == ("", {})
+
+
+def test_seek_conditions_and_params() -> None:
+    conditions, params = CRUDBase.seek("a.id", "abc", shard=1, shards=4)
+    assert conditions == (
+        " and a.id > :after_id"
+        " and mod(abs(hashtext(a.id)::bigint), :shards) = :shard"
+    )
+    assert params == dict(after_id="abc", shard=1, shards=4)
+
+
+def test_seek_start_of_keyset() -> None:
+    # An empty after_id still switches to keyset pagination.
+    conditions, params = CRUDBase.seek("al.id", "")
+    assert conditions == " and al.id > :after_id"
+    assert params == dict(after_id="")
@@ -0,0 +1,60 @@
+import datetime
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas
+from app.tests.utils.utils import random_lower_string
+
+
+@contextmanager
+def count_queries(db: Session) -> Iterator[List[str]]:
+    statements: List[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, *args) -> None:
+        statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def create_random_tracks(db: Session, n: int) -> List[models.Track]:
+    tracks = []
+    for _ in range(n):
+        album = models.Album(
+            id=random_lower_string(), release_date=datetime.date(2020, 1, 1)
+        )
+        artists = [models.Artist(id=random_lower_string()) for _ in range(2)]
+        tracks.append(
+            models.Track(id=random_lower_string(), album=album, artists=artists)
+        )
+    db.add_all(tracks)
+    db.commit()
+    return tracks
+
+
+def test_hydrate_rising_tracks_in_a_fixed_number_of_queries(db: Session) -> None:
+    track_ids = [t.id for t in create_random_tracks(db, 20)]
+    tracks_rising_base = [
+        schemas.TrackRisingBase(
+            id=track_id, playcount=1e5, chg=1e3, growth_rate=0.01, period_days=7
+        )
+        for track_id in reversed(track_ids)
+    ]
+    db.expire_all()
+
+    with count_queries(db) as statements:
+        tracks_rising = crud.track.hydrate_rising_tracks(
+            db, tracks_rising_base=tracks_rising_base
+        )
+    # The tracks joined to their albums, and the artists of all the tracks.
+    assert len(statements) == 2
+    assert [t.id for t in tracks_rising] == list(reversed(track_ids))
+    assert all(len(t.artists) == 2 for t in tracks_rising)
+    assert all(t.album.id == t.track.album_id for t in tracks_rising)
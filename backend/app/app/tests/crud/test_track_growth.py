@@ -0,0 +1,21 @@
+import pytest
+
+from app.crud.crud_track_growth import WINDOWS, track_growth
+
+
+def test_rising_sql_reads_kept_windows_from_the_row() -> None:
+    for days in WINDOWS:
+        sql = track_growth.rising_sql(days)
+        assert f"g.playcount_{days}" in sql
+        assert "track_playcount" not in sql
+
+
+def test_rising_sql_supports_any_lag_days() -> None:
+    sql = track_growth.rising_sql(45)
+    assert "p.date <= g.date - 45" in sql
+    assert "CURRENT_DATE - 45" in sql
+
+
+def test_rising_sql_rejects_empty_windows() -> None:
+    with pytest.raises(ValueError):
+        track_growth.rising_sql(0)
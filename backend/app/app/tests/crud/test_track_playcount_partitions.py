@@ -0,0 +1,15 @@
+import datetime
+
+from app.crud.crud_track_playcount import _month_start, track_playcount
+
+
+def test_month_start_rolls_over_years() -> None:
+    day = datetime.date(2020, 11, 17)
+    assert _month_start(day) == datetime.date(2020, 11, 1)
+    assert _month_start(day, 2) == datetime.date(2021, 1, 1)
+    assert _month_start(day, -11) == datetime.date(2019, 12, 1)
+
+
+def test_partition_name() -> None:
+    month = datetime.date(2021, 3, 1)
+    assert track_playcount.partition_name(month) == "track_playcount_p202103"
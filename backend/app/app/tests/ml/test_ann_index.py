@@ -0,0 +1,49 @@
+import numpy as np
+
+from app.ml.ann_index import IVFIndex
+
+
+def _exact_recs(vectors: np.ndarray, queries: np.ndarray, k: int) -> list:
+    dists = ((vectors[:, None, :] - queries[None, :, :]) ** 2).sum(-1)
+    median = np.median(dists, axis=1)
+    return list(np.lexsort((dists.mean(axis=1), median))[:k])
+
+
+def test_search_set_matches_exact_before_training() -> None:
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, 16)).astype(np.float32)
+    queries = rng.normal(size=(5, 16)).astype(np.float32)
+    index = IVFIndex(16, min_train_size=1_000)
+    index.add([str(i) for i in range(200)], vectors)
+    assert not index.is_trained
+    recs = index.search_set(queries, k=10)
+    assert [int(tid) for tid, _, _ in recs] == _exact_recs(vectors, queries, 10)
+
+
+def test_search_set_recall_after_training() -> None:
+    rng = np.random.default_rng(1)
+    centers = rng.normal(scale=10.0, size=(20, 16))
+    vectors = centers[rng.integers(20, size=4_000)] + rng.normal(size=(4_000, 16))
+    vectors = vectors.astype(np.float32)
+    queries = vectors[:3] + 0.1
+    index = IVFIndex(16, min_train_size=1_000, n_probe=4)
+    index.add([str(i) for i in range(4_000)], vectors)
+    assert index.is_trained
+    recs = {int(tid) for tid, _, _ in index.search_set(queries, k=20)}
+    assert len(recs & set(_exact_recs(vectors, queries, 20))) >= 18
+
+
+def test_add_remove_and_filters() -> None:
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(50, 8)).astype(np.float32)
+    index = IVFIndex(8, distance_type="cosine")
+    index.add([str(i) for i in range(50)], vectors)
+    assert index.remove(["0", "1", "missing"]) == 2
+    assert len(index) == 48 and "0" not in index
+
+    recs = index.search_set(vectors[2:3], k=5, allowed_ids={"2", "3", "4"})
+    assert {tid for tid, _, _ in recs} == {"2", "3", "4"}
+    assert recs[0][0] == "2" and abs(recs[0][1]) < 1e-5
+
+    recs = index.search_set(vectors[2:3], k=5, exclude_ids={"2"})
+    assert "2" not in {tid for tid, _, _ in recs}
@@ -0,0 +1,60 @@
+import subprocess
+import sys
+
+import pytest
+
+from app.ml.registry import ModelRegistry
+
+
+def _run(code: str) -> None:
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_api_import_does_not_load_torch() -> None:
+    _run(
+        "import sys\n"
+        "import app.main\n"
+        "from app import ml\n"
+        "assert 'torch' not in sys.modules, 'app.main imported torch'\n"
+        "assert not ml.model_registry.loaded, 'app.main loaded the model'\n"
+    )
+
+
+def test_task_modules_import_does_not_load_torch() -> None:
+    _run(
+        "import importlib, sys\n"
+        "import app.worker\n"
+        "from app import ml\n"
+        "from app.spotify import TASK_MODULES\n"
+        "for module in TASK_MODULES:\n"
+        "    importlib.import_module(module)\n"
+        "assert 'torch' not in sys.modules, 'a task module imported torch'\n"
+        "assert not ml.model_registry.loaded, 'a task module loaded the model'\n"
+    )
+
+
+def test_registry_keeps_most_recently_used(tmp_path) -> None:
+    for model_id in ["b", "c"]:
+        (tmp_path / f"{model_id}.pt").touch()
+    loads = []
+
+    def loader(path: str) -> str:
+        loads.append(path)
+        return path
+
+    registry = ModelRegistry(
+        default_model_id="a",
+        default_weights=str(tmp_path / "a.pt"),
+        max_models=2,
+        loader=loader,
+    )
+    assert registry.get() == str(tmp_path / "a.pt")
+    registry.get("b")
+    registry.get("a")  # a is now the most recently used
+    registry.get("c")  # evicts b
+    assert registry.loaded == ["a", "c"]
+    registry.get("a")
+    assert len(loads) == 3
+
+    with pytest.raises(FileNotFoundError):
+        registry.get("missing")
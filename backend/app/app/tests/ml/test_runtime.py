@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+import torch
+
+from app.ml import runtime
+from app.ml.models import CNN_SpectrogramV2
+
+
+@pytest.fixture(scope="module")
+def model() -> CNN_SpectrogramV2:
+    torch.manual_seed(0)
+    model = CNN_SpectrogramV2(output_dims=1)
+    # Non trivial running stats, so folding the batch norms actually matters.
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm1d):
+            module.running_mean.uniform_(-0.5, 0.5)
+            module.running_var.uniform_(0.5, 2.0)
+            module.weight.data.uniform_(0.5, 1.5)
+            module.bias.data.uniform_(-0.5, 0.5)
+    return model.eval()
+
+
+@pytest.fixture(scope="module")
+def batch() -> torch.Tensor:
+    rng = np.random.RandomState(0)
+    return torch.from_numpy(rng.randn(3, 96, 1765).astype(np.float32))
+
+
+def test_compiled_matches_eager(model, batch) -> None:
+    compiled = runtime.CompiledModel(model)
+    with torch.no_grad():
+        np.testing.assert_allclose(
+            compiled.features(batch).numpy(),
+            model.output_features(batch).numpy(),
+            rtol=1e-3,
+            atol=1e-4,
+        )
+        np.testing.assert_allclose(
+            compiled.probabilities(batch).numpy(),
+            model.output_probabilities(batch).numpy(),
+            atol=1e-4,
+        )
+
+
+def test_quantized_is_close_to_eager(model, batch) -> None:
+    compiled = runtime.CompiledModel(model, quantize=True)
+    with torch.no_grad():
+        np.testing.assert_allclose(
+            compiled.probabilities(batch).numpy(),
+            model.output_probabilities(batch).numpy(),
+            atol=1e-2,
+        )
+
+
+def test_fold_batch_norm_removes_batch_norms(model) -> None:
+    head = runtime.fold_batch_norm(runtime.FeatureHead(model))
+    assert not any(isinstance(m, torch.nn.BatchNorm1d) for m in head.modules())
+
+
+def test_scores_match_separate_heads(model, batch) -> None:
+    compiled = runtime.CompiledModel(model)
+    with torch.no_grad():
+        probabilities, features = compiled.scores(batch)
+        np.testing.assert_allclose(
+            probabilities.numpy(), compiled.probabilities(batch).numpy(), atol=1e-6
+        )
+        np.testing.assert_allclose(
+            features.numpy(), compiled.features(batch).numpy(), atol=1e-6
+        )
@@ -0,0 +1,93 @@
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+from app.ml import server
+
+
+class FakeModel:
+    def get_scores(self, data: np.ndarray):
+        flat = data.reshape(len(data), -1)
+        return flat.mean(axis=1, keepdims=True), flat[:, :4]
+
+
+class BrokenModel:
+    def get_scores(self, data: np.ndarray):
+        raise RuntimeError("broken model")
+
+
+def _start_server(tmp_path, monkeypatch, model) -> server.InferenceClient:
+    monkeypatch.setattr(server.model_registry, "get", lambda model_id: model)
+    monkeypatch.setattr(server.model_registry, "preload", lambda model_ids: None)
+    socket_path = str(tmp_path / "inference.sock")
+    inference_server = server.InferenceServer(
+        socket_path=socket_path, max_batch_size=64, max_latency_ms=200, authkey=b"k"
+    )
+    threading.Thread(target=inference_server.serve_forever, daemon=True).start()
+    client = server.InferenceClient(socket_path=socket_path, authkey=b"k", timeout=5)
+    for _ in range(50):  # wait for the server to start listening
+        if client.available():
+            return client
+        client._down_until = 0.0
+        threading.Event().wait(0.05)
+    raise AssertionError("Inference server didn't start")
+
+
+def test_server_micro_batches_requests(tmp_path, monkeypatch) -> None:
+    client = _start_server(tmp_path, monkeypatch, FakeModel())
+    rng = np.random.RandomState(0)
+    specs = [rng.rand(2, 8, 8).astype(np.float32) for _ in range(4)]
+    results = [None] * len(specs)
+
+    def request(i: int) -> None:
+        results[i] = client.run("scores", specs[i], model_id="test")
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(len(specs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for spec, (probs, features) in zip(specs, results):
+        expected_probs, expected_features = FakeModel().get_scores(spec)
+        np.testing.assert_allclose(probs, expected_probs)
+        np.testing.assert_allclose(features, expected_features)
+    metrics = client.metrics()
+    assert metrics["tracks"] == 8
+    assert metrics["batches"] < len(specs)
+
+
+def test_failed_batches_fail_their_requests(tmp_path, monkeypatch) -> None:
+    client = _start_server(tmp_path, monkeypatch, BrokenModel())
+    spec = np.zeros((1, 8, 8), dtype=np.float32)
+    for _ in range(2):  # the batcher survives the failure
+        with pytest.raises(server.ServerError, match="broken model"):
+            client.run("scores", spec, model_id="test")
+    assert client.metrics()["errors"] == 2
+
+
+def test_get_model_falls_back_without_a_server(tmp_path, monkeypatch) -> None:
+    local = FakeModel()
+    monkeypatch.setattr(server.model_registry, "get", lambda model_id: local)
+    monkeypatch.setattr(
+        server.settings, "INFERENCE_SERVER_SOCKET", str(tmp_path / "missing.sock")
+    )
+    monkeypatch.setattr(server, "_client", None)
+    assert server.get_model("test") is local
+
+
+def test_remote_model_falls_back_when_the_server_hangs(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(server.model_registry, "get", lambda model_id: FakeModel())
+    socket_path = str(tmp_path / "hung.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as hung:
+        hung.bind(socket_path)
+        hung.listen(1)  # accepts connections, never answers
+        client = server.InferenceClient(
+            socket_path=socket_path, authkey=b"k", timeout=0.2
+        )
+        spec = np.ones((1, 8, 8), dtype=np.float32)
+        probs, _ = server.RemoteModel(client, "test").get_scores(spec)
+    np.testing.assert_allclose(probs, [[1.0]])
+    assert not client.available()
@@ -0,0 +1,141 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pytest
+
+from app.spotify import dispatch as dispatch_module
+from app.spotify.dispatch import chunked, dispatch, dispatch_key, publish_batch
+
+
+def test_chunked_is_lazy_and_keeps_the_remainder() -> None:
+    consumed = []
+
+    def ids():
+        for i in range(7):
+            consumed.append(i)
+            yield str(i)
+
+    chunks = chunked(ids(), 3)
+    assert next(chunks) == ["0", "1", "2"]
+    assert consumed == [0, 1, 2]
+    assert list(chunks) == [["3", "4", "5"], ["6"]]
+
+
+def test_dispatch_key_includes_params() -> None:
+    assert dispatch_key("flow", skip=0, limit=10) == "flow::skip=0::limit=10"
+    assert dispatch_key("flow", skip=0) != dispatch_key("flow", skip=10)
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.sets = {}
+
+    def smembers(self, key):
+        return {member.encode("utf-8") for member in self.sets.get(key, ())}
+
+    def sadd(self, key, *members) -> None:
+        self.sets.setdefault(key, set()).update(members)
+
+    def delete(self, key) -> None:
+        self.sets.pop(key, None)
+
+    def expire(self, key, ttl) -> None:
+        pass
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self) -> None:
+        pass
+
+
+class FakeSignature:
+    def __init__(self, item, published, subtask_type=None):
+        self.item = item
+        self.published = published
+        self.subtask_type = subtask_type
+
+    def apply_async(self, **options) -> None:
+        self.published.append((self.item, options))
+
+
+def fake_workflow(item, published):
+    return FakeSignature(item, published, "chain" if item == "chain" else None)
+
+
+class FakeBatchTask:
+    def __init__(self) -> None:
+        self.batches = []
+        self.fail_on = None
+
+    def si(self, workflow, items, workflow_kwargs):
+        if self.fail_on in items:
+            raise ConnectionError("broker went away")
+        return FakeSignature((workflow, items, workflow_kwargs), self.batches)
+
+
+@pytest.fixture
+def redis(monkeypatch) -> FakeRedis:
+    redis = FakeRedis()
+    app = SimpleNamespace(
+        backend=SimpleNamespace(client=redis),
+        producer_or_acquire=lambda producer=None: nullcontext("producer"),
+    )
+    monkeypatch.setattr(dispatch_module, "celery_app", app)
+    return redis
+
+
+@pytest.fixture
+def batch_task(monkeypatch) -> FakeBatchTask:
+    batch_task = FakeBatchTask()
+    monkeypatch.setattr(dispatch_module, "publish_batch", batch_task)
+    return batch_task
+
+
+def test_dispatch_publishes_one_message_per_batch(redis, batch_task) -> None:
+    items = [str(i) for i in range(1_000)]
+    assert dispatch("flow", items, fake_workflow, batch_size=100) == 1_000
+
+    assert len(batch_task.batches) == 10
+    for (workflow, batch, kwargs), options in batch_task.batches:
+        assert workflow == "app.tests.spotify.test_dispatch.fake_workflow"
+        assert len(batch) == 100
+        assert options == {"producer": "producer"}
+    assert [i for (_, batch, _), _ in batch_task.batches for i in batch] == items
+    assert redis.sets == {}  # a completed dispatch drops its progress
+
+
+def test_dispatch_needs_an_importable_workflow(redis, batch_task) -> None:
+    with pytest.raises(ValueError):
+        dispatch("flow", ["a"], lambda item: fake_workflow(item, []))
+
+
+def test_publish_batch_publishes_each_items_workflow(redis) -> None:
+    published = []
+    publish_batch(
+        "app.tests.spotify.test_dispatch.fake_workflow",
+        ["a", "chain"],
+        dict(published=published),
+    )
+    # Canvases publish their steps themselves, plain tasks share the producer.
+    assert published == [("a", {"producer": "producer"}), ("chain", {})]
+
+
+def test_interrupted_dispatch_resumes_after_the_sent_batches(redis, batch_task) -> None:
+    items = [str(i) for i in range(5)]
+    batch_task.fail_on = "3"
+    with pytest.raises(ConnectionError):
+        dispatch("flow", items, fake_workflow, batch_size=2)
+    assert redis.sets == {"Dispatch::flow::dispatched": {"0", "1"}}
+
+    batch_task.fail_on = None
+    assert dispatch("flow", items, fake_workflow, batch_size=2) == 3
+    batches = [batch for (_, batch, _), _ in batch_task.batches]
+    assert batches == [["0", "1"], ["2", "3"], ["4"]]
+    assert redis.sets == {}
+
+
+def test_dispatch_without_resume_starts_over(redis, batch_task) -> None:
+    redis.sadd("Dispatch::flow::dispatched", "0", "1")
+    assert dispatch("flow", ["0", "1", "2"], fake_workflow, resume=False) == 3
+    assert [batch for (_, batch, _), _ in batch_task.batches] == [["0", "1", "2"]]
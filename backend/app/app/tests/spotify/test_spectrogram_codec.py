@@ -0,0 +1,35 @@
+import io
+
+import numpy as np
+
+from app.spotify.parser import spectrogram_codec
+
+
+def _spec() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.uniform(0.0, 4.0, size=(96, 1765)).astype(np.float32)
+
+
+def test_float16_round_trip() -> None:
+    spec = _spec()
+    blob = spectrogram_codec.encode(spec, dtype="float16", compression="zlib")
+    assert spectrogram_codec.is_encoded(blob)
+    decoded = spectrogram_codec.decode(blob)
+    assert decoded.shape == spec.shape and decoded.dtype == np.float32
+    assert np.allclose(decoded, spec, atol=4e-3)
+
+
+def test_uint8_round_trip() -> None:
+    spec = _spec()
+    blob = spectrogram_codec.encode(spec, dtype="uint8", compression="zstd")
+    assert len(blob) < spec.nbytes // 3
+    assert np.abs(spectrogram_codec.decode(blob) - spec).max() <= 4.0 / 255
+
+
+def test_decode_legacy_np_save() -> None:
+    spec = _spec().astype(np.float64)
+    output = io.BytesIO()
+    np.save(output, spec)
+    blob = output.getvalue()
+    assert not spectrogram_codec.is_encoded(blob)
+    assert np.allclose(spectrogram_codec.decode(blob), spec)
@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.spotify.track_embedding import index, tasks
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.values = {}
+        self.results = []
+
+    def pipeline(self, transaction=True):
+        self.results = []
+        return self
+
+    def set(self, key, value, nx=False, ex=None) -> None:
+        new = key not in self.values
+        self.values.setdefault(key, value)
+        self.results.append(True if new else None)
+
+    def execute(self):
+        return self.results
+
+
+def test_queue_embeddings_skips_queued_tracks_and_missing_spectrograms(
+    monkeypatch,
+) -> None:
+    redis = FakeRedis()
+    monkeypatch.setattr(
+        tasks, "celery_app", SimpleNamespace(backend=SimpleNamespace(client=redis))
+    )
+    monkeypatch.setattr(
+        tasks.crud.spectrogram,
+        "get_valid_track_ids",
+        lambda db, track_ids: [
+            SimpleNamespace(track_id=tid) for tid in track_ids if tid != "no-spec"
+        ],
+    )
+    queued = []
+    monkeypatch.setattr(
+        tasks.flow_tracks_embeddings,
+        "si",
+        lambda track_ids, model_id: SimpleNamespace(
+            apply_async=lambda **options: queued.append(track_ids)
+        ),
+    )
+
+    assert tasks.queue_embeddings(None, ["a", "b", "no-spec"], model_id="m") == 2
+    assert queued == [["a", "b"]]
+    assert tasks.queue_embeddings(None, ["a", "b", "c"], model_id="m") == 1
+    assert queued == [["a", "b"], ["c"]]
+
+
+def test_hit_index_sync_swaps_in_a_new_snapshot(monkeypatch) -> None:
+    rng = np.random.default_rng(0)
+    vectors = {tid: rng.normal(size=4) for tid in ["a", "b", "c"]}
+    predictions = [
+        SimpleNamespace(track_id="a", probability=0.9, date=1),
+        SimpleNamespace(track_id="b", probability=0.9, date=1),
+    ]
+    monkeypatch.setattr(
+        index.crud.track_prediction,
+        "get_updated_since",
+        lambda db, since, after_track_id, **kwargs: predictions
+        if since is None
+        else [SimpleNamespace(track_id="c", probability=0.9, date=2)],
+    )
+    monkeypatch.setattr(
+        index,
+        "get_embeddings",
+        lambda db, track_ids, **kwargs: {tid: vectors[tid] for tid in track_ids},
+    )
+    monkeypatch.setattr(index, "queue_embeddings", lambda db, track_ids, **kwargs: 0)
+
+    hit_index = index.HitIndex(model_id="m")
+    assert hit_index.sync(None) == 2
+    snapshot = hit_index.index
+    assert hit_index.sync(None) == 1
+    assert hit_index.index is not snapshot
+    assert len(snapshot) == 2 and "c" not in snapshot
+    assert len(hit_index.index) == 3
+
+
+def test_hit_index_recs_wait_for_the_first_sync(monkeypatch) -> None:
+    hit_index = index.HitIndex(model_id="m")
+    monkeypatch.setattr(hit_index, "start", lambda: None)
+    monkeypatch.setattr(
+        hit_index, "sync", lambda db: pytest.fail("requests must not sync")
+    )
+    assert hit_index.get_track_recs_for_user(None, spotify_id="user") == []
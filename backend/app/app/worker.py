@@ -1,11 +1,22 @@
+from celery.signals import worker_init
 from raven import Client
 
 from app.core.celery_app import celery_app
 from app.core.config import settings
+from app.ml import model_registry
 
 client_sentry = Client(settings.SENTRY_DSN)
 
 
+@worker_init.connect
+def preload_models(**kwargs) -> None:
+    # Runs in the parent before the pool forks, so prefork children share the
+    # weights copy-on-write instead of each loading their own. With an inference
+    # server the models live there, and are only loaded here as a fallback.
+    if settings.MODEL_PRELOAD and not settings.INFERENCE_SERVER_SOCKET:
+        model_registry.preload(settings.MODEL_PRELOAD)
+
+
 @celery_app.task(acks_late=True)
 def test_celery(word: str) -> str:
     # Use acks_late == True to test a celery task (sequential execution).
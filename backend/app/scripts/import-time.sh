@@ -0,0 +1,23 @@
+#!/usr/bin/env bash
+
+# Import cost per entry point: wall time, whether torch got loaded, and the slowest
+# top level imports (cumulative microseconds, from python -X importtime).
+# Usage: bash scripts/import-time.sh [module ...]  (defaults to app.main app.worker)
+
+set -e
+
+modules=${@:-app.main app.worker}
+for module in $modules; do
+    echo "== $module"
+    python -c "
+import sys, time
+start = time.perf_counter()
+import $module
+print(f'wall: {time.perf_counter() - start:.3f}s')
+print(f'torch imported: {\"torch\" in sys.modules}')
+"
+    python -X importtime -c "import $module" 2>&1 >/dev/null \
+        | awk -F'|' '$2 ~ /[0-9]/ && $3 ~ /^ [^ ]/ {print $2 "|" $3}' \
+        | sort -t'|' -k1 -rn \
+        | head -n 15
+done
@@ -0,0 +1,87 @@
+-- One-off migration of track_playcount to the layout of
+-- app/models/track_playcount.py: range partitioned by month on date, keyed by
+-- (track_id, date) instead of the "<track_id>_<date>" string id, with a BRIN
+-- index on date. Run it in a maintenance window (scrapes paused):
+--
+--     psql "$DATABASE_URL" -f scripts/partition-track-playcount.sql
+--
+-- Views reading track_playcount are dropped (see below). Afterwards the
+-- maintain_track_playcount task keeps partitions ahead of time.
+
+begin;
+
+-- The track_rising_rolling_{N} materialized views (and any view built on them)
+-- read track_playcount and would stay bound to track_playcount_old, blocking
+-- its drop. They were replaced by track_growth (crud.track_growth.rising_sql)
+-- and aren't read anymore, so they're dropped rather than recreated.
+do $$
+declare
+    dependent record;
+begin
+    for dependent in
+        select distinct c.oid::regclass::text view_name, c.relkind
+        from pg_depend d
+        join pg_rewrite r on r.oid = d.objid
+        join pg_class c on c.oid = r.ev_class
+        where d.classid = 'pg_rewrite'::regclass
+            and d.refobjid = 'track_playcount'::regclass
+            and c.oid <> 'track_playcount'::regclass
+    loop
+        raise notice 'Dropping % and its dependents', dependent.view_name;
+        execute format(
+            'drop %s if exists %s cascade',
+            case dependent.relkind
+                when 'm' then 'materialized view' else 'view'
+            end,
+            dependent.view_name
+        );
+    end loop;
+end $$;
+
+alter table track_playcount rename to track_playcount_old;
+alter index track_playcount_pkey rename to track_playcount_old_pkey;
+
+create table track_playcount (
+    track_id varchar not null references track (id),
+    date date not null,
+    playcount bigint not null,
+    popularity integer,
+    constraint track_playcount_pkey primary key (track_id, date)
+) partition by range (date);
+
+create index ix_track_playcount_date_brin on track_playcount using brin (date);
+
+-- Monthly partitions from the oldest playcount through two months from now,
+-- named like crud.track_playcount.partition_name.
+do $$
+declare
+    month date;
+begin
+    for month in
+        select generate_series(
+            date_trunc('month', coalesce(min(date), current_date)),
+            date_trunc('month', current_date) + interval '2 months',
+            interval '1 month'
+        )::date
+        from track_playcount_old
+    loop
+        execute format(
+            'create table if not exists %I partition of track_playcount '
+            'for values from (%L) to (%L)',
+            'track_playcount_p' || to_char(month, 'YYYYMM'),
+            month,
+            (month + interval '1 month')::date
+        );
+    end loop;
+end $$;
+
+insert into track_playcount (track_id, date, playcount, popularity)
+select track_id, date, playcount, popularity
+from track_playcount_old
+on conflict do nothing;
+
+drop table track_playcount_old;
+
+commit;
+
+analyze track_playcount;
@@ -3,4 +3,22 @@ set -e
 
 python /app/app/celeryworker_pre_start.py
 
+# One inference server per host, shared by every worker process (app/ml/server.py).
+# It's restarted whenever it exits, and the worker waits (up to a minute) for it
+# to load its models and listen before taking tasks. Until it does, workers run
+# inference in process.
+if [ -n "${INFERENCE_SERVER_SOCKET}" ]; then
+    rm -f "${INFERENCE_SERVER_SOCKET}"
+    (
+        while true; do
+            python -m app.ml.server || echo "Inference server exited with $?" >&2
+            sleep 1
+        done
+    ) &
+    for _ in $(seq 60); do
+        [ -S "${INFERENCE_SERVER_SOCKET}" ] && break
+        sleep 1
+    done
+fi
+
 celery worker -A app.worker -l info -Q main-queue,spec,short-queue,distance-queue,web-queue -P ${POOL} -c ${CONCURRENCY}
\ No newline at end of file